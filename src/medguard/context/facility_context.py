@@ -4,16 +4,18 @@ The purpose is to seperate each facility's data in the system so it never shows
 """
 
 from datetime import datetime, timedelta
-from typing import Dict
+from pathlib import Path
+from typing import Dict, Optional
 from medguard.db.database import get_connection_to_db
 
 
-def get_facility_context(facility_id: str) -> Dict:
+def get_facility_context(facility_id: str, db_path: Optional[Path] = None) -> Dict:
     """
     Returns context for a facility.
 
     Args:
         facility_id:
+        db_path: database file, defaults to the project database
 
     #TODO: TEST, design web interface based on this for each facility
     Intended Output shape:
@@ -39,7 +41,7 @@ def get_facility_context(facility_id: str) -> Dict:
     if not facility_id:
         raise ValueError("facility_id is required")
 
-    conn = get_connection_to_db()
+    conn = get_connection_to_db(db_path)
     cursor = conn.cursor()
 
     # get facility info
@@ -153,6 +155,10 @@ def _get_facility_transfers(cursor, facility_id: str) -> Dict:
     """Get transfers involving this facility."""
     # Request flow: Request fac requests -> Pending -> Sender approves -> Completed.
 
+    # schema.sql has no transfers table yet, show no transfers until it does
+    if not _has_table(cursor, "transfers"):
+        return {"pending_incoming": [], "pending_outgoing": [], "recent_completed": []}
+
     cursor.execute(
         """
         SELECT
@@ -229,6 +235,13 @@ def _get_facility_transfers(cursor, facility_id: str) -> Dict:
     }
 
 
+def _has_table(cursor, name: str) -> bool:
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    )
+    return cursor.fetchone() is not None
+
+
 def _get_facility_alerts(cursor, facility_id: str) -> Dict:
     """Get alerts specific to this facility."""
 
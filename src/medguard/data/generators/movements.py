@@ -1,6 +1,40 @@
 import random
 from datetime import datetime, timedelta
 from collections import defaultdict
+import numpy as np
+
+from medguard.utils.ids import IdSequence, run_id
+
+# movement_id is the primary key of the movements table: MOV_<run id>_<n>, see
+# utils/ids.py, so runs writing to one database never reuse an id
+_movement_ids = IdSequence()
+
+MOVEMENT_ID_PREFIX = "MOV_"
+DISPENSE_REFERENCE_PREFIX = "DIS_"
+
+
+def movement_id_prefix() -> str:
+    """the part of the current run's movement ids before the number."""
+    return f"{MOVEMENT_ID_PREFIX}{run_id()}_"
+
+
+def next_movement_id() -> str:
+    return f"{movement_id_prefix()}{_movement_ids.next()}"
+
+
+def reserve_movement_ids(count: int) -> int:
+    """take count consecutive movement id numbers at once, returns the first."""
+    return _movement_ids.take(count)
+
+
+def set_movement_id_start(start: int):
+    """continue the current run's movement ids from start, e.g. after a checkpoint."""
+    _movement_ids.set_position(start)
+
+
+def movement_id_position() -> int:
+    """number the next movement id will get, for checkpoints."""
+    return _movement_ids.position()
 
 
 def dispense(
@@ -9,21 +43,52 @@ def dispense(
     timestamp,
     source="UNKNOWN",
     reason="UNSPECIFIED",
+    generator=None,
 ):
     """
     for recording that medicine was dispensed from a batch simulating real-life dispense.
+    generator (a numpy Generator, as in bulk_dispense) draws the reference number,
+    the random module when not given.
     """
+    if generator is None:
+        reference_number = random.randint(10000, 999999)
+    else:
+        reference_number = int(generator.integers(10000, 1000000))
     return _record_movement(
         inventory=inventory,
         movement_type="DISPENSE",
         quantity_change=-abs(quantity),
         timestamp=timestamp,
-        reference_id=f"DIS_{random.randint(10000, 999999)}",
+        reference_id=f"{DISPENSE_REFERENCE_PREFIX}{reference_number}",
         source=source,
         reason=reason,
     )
 
 
+def bulk_dispense(quantity_before, quantities, generator):
+    """
+    dispense from many inventory rows at once, as numpy columns instead of dicts.
+
+    takes the stock of each row before dispensing and the quantities dispensed,
+    and returns the numeric columns of the movements (see
+    MovementLog.append_columns): movement and reference id numbers, to go with
+    movement_id_prefix() and the DIS_ prefix dispense() uses, and the three
+    quantities.
+    generator draws the reference numbers. updating the inventory is left to
+    the caller.
+    """
+    count = len(quantities)
+    quantity_change = -np.abs(quantities)
+    first_id = reserve_movement_ids(count)
+    return {
+        "movement_id_number": np.arange(first_id, first_id + count, dtype=np.int64),
+        "reference_id_number": generator.integers(10000, 1000000, count),
+        "quantity_before": quantity_before,
+        "quantity_change": quantity_change,
+        "quantity_after": np.maximum(0, quantity_before + quantity_change),
+    }
+
+
 def restock(inventory, quantity, timestamp, source="UNKNOWN"):
     """
     for recording the movement restock of a batch of med
@@ -127,7 +192,7 @@ def _record_movement(
     new_quantity = max(0, previous_quantity + quantity_change)
 
     movement = {
-        "movement_id": f"MOV_{random.randint(100000, 999999)}",
+        "movement_id": next_movement_id(),
         "inventory_id": inventory["inventory_id"],
         "facility_id": inventory["facility_id"],
         "batch_id": inventory["batch_id"],
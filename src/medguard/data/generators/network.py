@@ -0,0 +1,559 @@
+"""
+Parametric synthetic networks for load testing.
+
+The other generators reproduce the fixed lists in data/seed/. generate_network
+builds a network of any size with the same shape, sampling everything with
+numpy in bulk and only building the record dicts at the end:
+
+- facilities clustered around the city centroids of the seed facilities, with
+  the seed's facility type mix, tier mix per type and cold storage rate per type
+- medications cycling through the seed medications (repeats get a suffixed
+  name and a perturbed base demand)
+- brands per medication from the seed manufacturers, with a counterfeit risk mix
+- batches per brand, importers and rare duplicate batch numbers following the
+  same rules as generate_batches
+- inventory following the same stocking rules as generate_inventory
+"""
+
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from medguard.data.generators.companies import generate_companies, authorized_importers
+from medguard.data.generators.inventory import (
+    tier_multipliers,
+    buffer_days,
+    stock_level_range,
+)
+from medguard.data.seed.brands_data import brands_data
+from medguard.data.seed.facilities_data import facilities_data
+from medguard.data.seed.medications_data import medications_data, stocking_rule
+
+FACILITY_TYPES = list(stocking_rule)
+TIERS = list(tier_multipliers)
+
+# same reference date as generate_batches
+REFERENCE_DATE = np.datetime64("2025-01-15")
+
+# degrees of jitter around a city centroid (~3 km)
+CITY_SPREAD = 0.03
+
+TYPE_LABELS = {
+    "TEACHING_HOSPITAL": "Teaching Hospital",
+    "GENERAL_HOSPITAL": "General Hospital",
+    "COMMUNITY_PHARMACY": "Pharmacy",
+    "PRIMARY_HEALTH_CENTER": "Primary Health Centre",
+}
+
+
+def _mix(values) -> Dict:
+    counts = Counter(values)
+    total = sum(counts.values())
+    return {value: count / total for value, count in counts.items()}
+
+
+# mixes measured on the seed data
+FACILITY_TYPE_MIX = _mix(f[1] for f in facilities_data)
+TIER_MIX_BY_TYPE = {
+    facility_type: _mix(f[4] for f in facilities_data if f[1] == facility_type)
+    for facility_type in FACILITY_TYPES
+}
+COLD_STORAGE_RATE_BY_TYPE = {
+    facility_type: float(
+        np.mean([f[5] for f in facilities_data if f[1] == facility_type])
+    )
+    for facility_type in FACILITY_TYPES
+}
+COUNTERFEIT_RISK_MIX = _mix(
+    brand[5] for brand_list in brands_data.values() for brand in brand_list
+)
+
+
+def _city_centroids() -> Tuple[List[Tuple[str, str]], np.ndarray, np.ndarray]:
+    """(city, state) list, centroid coordinates and weights from the seed facilities."""
+    points = defaultdict(list)
+    for f in facilities_data:
+        points[(f[2], f[3])].append((f[6], f[7]))
+
+    cities = list(points)
+    centroids = np.array([np.mean(points[c], axis=0) for c in cities])
+    weights = np.array([len(points[c]) for c in cities], dtype=np.float64)
+    return cities, centroids, weights / weights.sum()
+
+
+def _choice(rng: np.random.Generator, mix: Dict, size: int) -> np.ndarray:
+    """indexes into list(mix) sampled with the mix probabilities."""
+    p = np.array(list(mix.values()), dtype=np.float64)
+    return rng.choice(len(p), size=size, p=p / p.sum())
+
+
+def _group_positions(counts: np.ndarray) -> np.ndarray:
+    """[2, 3] -> [0, 1, 0, 1, 2]: position of every element inside its group."""
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.arange(counts.sum()) - starts
+
+
+def _id_width(n: int, minimum: int) -> int:
+    return max(minimum, len(str(n)))
+
+
+# facilities
+def generate_synthetic_facilities(
+    n_facilities: int,
+    rng: np.random.Generator,
+    type_mix: Dict = FACILITY_TYPE_MIX,
+) -> List[Dict]:
+    cities, centroids, city_weights = _city_centroids()
+    city_idx = rng.choice(len(cities), size=n_facilities, p=city_weights)
+    coords = centroids[city_idx] + rng.normal(0, CITY_SPREAD, size=(n_facilities, 2))
+
+    type_names = list(type_mix)
+    type_idx = _choice(rng, type_mix, n_facilities)
+
+    tiers = np.empty(n_facilities, dtype=object)
+    cold = np.zeros(n_facilities, dtype=bool)
+    for t, facility_type in enumerate(type_names):
+        members = np.flatnonzero(type_idx == t)
+        tier_mix = TIER_MIX_BY_TYPE.get(facility_type) or {"SECONDARY": 1.0}
+        tiers[members] = np.array(list(tier_mix), dtype=object)[
+            _choice(rng, tier_mix, len(members))
+        ]
+        cold[members] = rng.random(len(members)) < COLD_STORAGE_RATE_BY_TYPE.get(
+            facility_type, 0.5
+        )
+
+    width = _id_width(n_facilities, 3)
+    return [
+        {
+            "facility_id": f"FAC_{i + 1:0{width}d}",
+            "name": f"{cities[c][0]} {TYPE_LABELS.get(type_names[t], type_names[t])} {i + 1}",
+            "facility_type": type_names[t],
+            "city": cities[c][0],
+            "state": cities[c][1],
+            "tier": tier,
+            "has_cold_storage": has_cold,
+            "latitude": round(lat, 4),
+            "longitude": round(lon, 4),
+        }
+        for i, (c, t, tier, has_cold, (lat, lon)) in enumerate(
+            zip(
+                city_idx.tolist(),
+                type_idx.tolist(),
+                tiers.tolist(),
+                cold.tolist(),
+                coords.tolist(),
+            )
+        )
+    ]
+
+
+# medications
+def generate_synthetic_medications(
+    n_medications: int, rng: np.random.Generator
+) -> List[Dict]:
+    n_templates = len(medications_data)
+    template_idx = np.arange(n_medications) % n_templates
+    variant = np.arange(n_medications) // n_templates
+
+    base = np.array([m[4] for m in medications_data], dtype=np.float64)[template_idx]
+    # repeats of a template get a perturbed demand
+    perturbed = np.maximum(1, np.rint(base * rng.lognormal(0, 0.3, n_medications)))
+    base_demand = np.where(variant == 0, base, perturbed).astype(np.int64)
+
+    nrn_prefix = rng.choice(["A4", "B4", "C4", "04"], size=n_medications)
+    nrn_number = rng.integers(1000, 101000, size=n_medications)
+
+    medications = []
+    for i, (t, v, demand, prefix, number) in enumerate(
+        zip(
+            template_idx.tolist(),
+            variant.tolist(),
+            base_demand.tolist(),
+            nrn_prefix.tolist(),
+            nrn_number.tolist(),
+        )
+    ):
+        (
+            generic_name,
+            therapeutic_class,
+            stocking_level,
+            is_cold_chain,
+            _,
+            form,
+            category,
+            strength,
+        ) = medications_data[t]
+        medications.append(
+            {
+                "med_id": f"MED_{i + 1:0{_id_width(n_medications, 3)}d}",
+                "generic_name": generic_name if v == 0 else f"{generic_name} #{v + 1}",
+                "therapeutic_class": therapeutic_class,
+                "stocking_level": stocking_level,
+                "form": form,
+                "strength": strength,
+                "base_demand": demand,
+                "category": category,
+                "is_cold_chain": is_cold_chain,
+                "nrn": f"{prefix}-{number}",
+            }
+        )
+    return medications
+
+
+# brands
+def generate_synthetic_brands(
+    medications: List[Dict],
+    companies: List[Dict],
+    rng: np.random.Generator,
+    brands_per_med: Tuple[int, int] = (1, 5),
+    risk_mix: Dict = COUNTERFEIT_RISK_MIX,
+) -> List[Dict]:
+    manufacturers = [c for c in companies if c["is_manufacturer"]]
+
+    # reference price per seed generic name, repeats share their template's price
+    seed_prices = {
+        generic: float(np.mean([b[3] for b in brand_list]))
+        for generic, brand_list in brands_data.items()
+    }
+    med_price = np.array(
+        [seed_prices.get(m["generic_name"].split(" #")[0], 1000.0) for m in medications]
+    )
+
+    counts = rng.integers(brands_per_med[0], brands_per_med[1] + 1, size=len(medications))
+    med_idx = np.repeat(np.arange(len(medications)), counts)
+    position = _group_positions(counts)
+    n_brands = len(med_idx)
+
+    manufacturer_idx = rng.integers(0, len(manufacturers), size=n_brands)
+    is_foreign = np.array([m["country"] != "Nigeria" for m in manufacturers])[
+        manufacturer_idx
+    ]
+    # the first brand of a medication from a foreign manufacturer is the innovator
+    is_innovator = (position == 0) & is_foreign
+
+    risk_names = list(risk_mix)
+    risk_idx = _choice(rng, risk_mix, n_brands)
+    price = med_price[med_idx] * rng.lognormal(0, 0.35, n_brands)
+    price = np.rint(np.where(is_innovator, price * 1.8, price)).astype(np.int64)
+
+    width = _id_width(n_brands, 3)
+    brands = []
+    for i, (m, k, c, innovator, r, unit_price) in enumerate(
+        zip(
+            med_idx.tolist(),
+            position.tolist(),
+            manufacturer_idx.tolist(),
+            is_innovator.tolist(),
+            risk_idx.tolist(),
+            price.tolist(),
+        )
+    ):
+        med = medications[m]
+        manufacturer = manufacturers[c]
+        brands.append(
+            {
+                "brand_id": f"BRD_{i + 1:0{width}d}",
+                "brand_name": f"{manufacturer['name'].split()[0]} {med['generic_name']} {k + 1}",
+                "med_id": med["med_id"],
+                "generic_name": med["generic_name"],
+                "manufacturer": manufacturer["name"],
+                "country": manufacturer["country"],
+                "unit_price": unit_price,
+                "is_innovator": innovator,
+                "counterfeit_risk": risk_names[r],
+            }
+        )
+    return brands
+
+
+# batches
+def generate_synthetic_batches(
+    brands: List[Dict],
+    companies: List[Dict],
+    rng: np.random.Generator,
+    batches_per_brand: Tuple[int, int] = (2, 5),
+) -> List[Dict]:
+    company_lookup = {c["name"]: c for c in companies}
+    nigerian_importers = [
+        c for c in companies if c["country"] == "Nigeria" and c["is_importer"]
+    ]
+
+    # batch counts per counterfeit risk, as in generate_batches
+    count_range = {
+        "HIGH": (3, batches_per_brand[1]),
+        "MEDIUM": (2, 4),
+        "LOW": (batches_per_brand[0], 3),
+    }
+    low = np.array([count_range[b["counterfeit_risk"]][0] for b in brands])
+    high = np.array([count_range[b["counterfeit_risk"]][1] for b in brands])
+    counts = rng.integers(low, high + 1)
+
+    brand_idx = np.repeat(np.arange(len(brands)), counts)
+    n_batches = len(brand_idx)
+
+    manufacturing = REFERENCE_DATE - rng.integers(30, 541, size=n_batches).astype(
+        "timedelta64[D]"
+    )
+    expiry = manufacturing + rng.integers(730, 1096, size=n_batches).astype(
+        "timedelta64[D]"
+    )
+
+    high_risk = np.array([b["counterfeit_risk"] == "HIGH" for b in brands])[brand_idx]
+    initial_quantity = np.where(
+        high_risk,
+        rng.integers(5000, 20001, size=n_batches),
+        rng.integers(2000, 10001, size=n_batches),
+    )
+
+    # importer: nigerian manufacturers self-import, foreign ones go through an
+    # authorized importer except for 5% (unauthorized importer anomaly)
+    importer = np.empty(n_batches, dtype=object)
+    manufacturer_names = np.array([b["manufacturer"] for b in brands], dtype=object)[
+        brand_idx
+    ]
+    for name in set(manufacturer_names.tolist()):
+        members = np.flatnonzero(manufacturer_names == name)
+        manufacturer = company_lookup[name]
+        if manufacturer["country"] == "Nigeria":
+            importer[members] = manufacturer["company_id"]
+            continue
+
+        authorized = np.array(
+            [company_lookup[n]["company_id"] for n in authorized_importers.get(name, [])],
+            dtype=object,
+        )
+        fallback = np.array([c["company_id"] for c in nigerian_importers], dtype=object)
+        unauthorized = rng.random(len(members)) < 0.05
+        if len(authorized) == 0:
+            unauthorized[:] = True
+
+        importer[members[unauthorized]] = fallback[
+            rng.integers(0, len(fallback), size=int(unauthorized.sum()))
+        ]
+        if len(authorized):
+            importer[members[~unauthorized]] = authorized[
+                rng.integers(0, len(authorized), size=int((~unauthorized).sum()))
+            ]
+
+    # batch numbers, 2% reuse an earlier batch's number (duplicate anomaly)
+    width = _id_width(n_batches, 4)
+    years = manufacturing.astype("datetime64[Y]").astype(int) + 1970
+    batch_numbers = [
+        f"{name[:3].upper()}-{year}-{i + 1:0{width}d}"
+        for i, (name, year) in enumerate(zip(manufacturer_names.tolist(), years.tolist()))
+    ]
+    duplicates = np.flatnonzero(rng.random(n_batches) < 0.02)
+    duplicates = duplicates[duplicates > 0]
+    sources = rng.integers(0, duplicates)
+    for i, source in zip(duplicates.tolist(), sources.tolist()):
+        batch_numbers[i] = batch_numbers[source]
+
+    company_names = {c["company_id"]: c["name"] for c in companies}
+    batches = []
+    for i, (b, made, expires, quantity, importer_id) in enumerate(
+        zip(
+            brand_idx.tolist(),
+            manufacturing.astype(str).tolist(),
+            expiry.astype(str).tolist(),
+            initial_quantity.tolist(),
+            importer.tolist(),
+        )
+    ):
+        brand = brands[b]
+        manufacturer = company_lookup[brand["manufacturer"]]
+        batches.append(
+            {
+                "batch_id": f"BAT_{i + 1:0{width}d}",
+                "brand_id": brand["brand_id"],
+                "brand_name": brand["brand_name"],
+                "med_id": brand["med_id"],
+                "generic_name": brand["generic_name"],
+                "manufacturer_id": manufacturer["company_id"],
+                "manufacturer_name": manufacturer["name"],
+                "importer_id": importer_id,
+                "importer_name": company_names[importer_id],
+                "batch_number": batch_numbers[i],
+                "manufacturing_date": made,
+                "expiry_date": expires,
+                "initial_quantity": quantity,
+                "counterfeit_risk": brand["counterfeit_risk"],
+                "is_verified": True,
+                "is_flagged": False,
+            }
+        )
+    return batches
+
+
+# inventory
+def generate_synthetic_inventory(
+    facilities: List[Dict],
+    batches: List[Dict],
+    medications: List[Dict],
+    brands: List[Dict],
+    rng: np.random.Generator,
+) -> List[Dict]:
+    """same stocking rules as generate_inventory, for all facility/medication pairs at once."""
+    med_pos = {m["med_id"]: i for i, m in enumerate(medications)}
+    type_pos = {t: i for i, t in enumerate(FACILITY_TYPES)}
+    tier_pos = {t: i for i, t in enumerate(TIERS)}
+
+    # allowed[type, med]: stocking level permitted at that facility type
+    stocking_level = np.array([m["stocking_level"] for m in medications])
+    allowed = np.array(
+        [np.isin(stocking_level, stocking_rule[t]) for t in FACILITY_TYPES]
+    )
+    med_cold = np.array([m["is_cold_chain"] for m in medications])
+    base_demand = np.array([m["base_demand"] for m in medications], dtype=np.float64)
+
+    fac_type = np.array([type_pos[f["facility_type"]] for f in facilities])
+    fac_tier = np.array([tier_pos.get(f["tier"], -1) for f in facilities])
+    fac_cold = np.array([f["has_cold_storage"] for f in facilities])
+
+    # batches of each medication, as a contiguous slice of a sorted index
+    batch_med = np.array([med_pos[b["med_id"]] for b in batches])
+    batch_order = np.argsort(batch_med, kind="stable")
+    batches_per_med = np.bincount(batch_med, minlength=len(medications))
+    batch_start = np.cumsum(batches_per_med) - batches_per_med
+
+    # eligible (facility, medication) pairs
+    eligible = allowed[fac_type] & ~(med_cold[None, :] & ~fac_cold[:, None])
+    eligible &= batches_per_med[None, :] > 0
+    pair_fac, pair_med = np.nonzero(eligible)
+    n_pairs = len(pair_fac)
+
+    tier_mult = np.array([tier_multipliers[t] for t in TIERS] + [1.0])[fac_tier]
+    buffer = np.array([buffer_days[t] for t in FACILITY_TYPES], dtype=np.float64)
+    reorder_point = np.maximum(
+        10,
+        (
+            base_demand[pair_med] * tier_mult[pair_fac] * (buffer[fac_type[pair_fac]] / 30)
+        ).astype(np.int64),
+    )
+
+    low = np.array([stock_level_range[t][0] for t in FACILITY_TYPES])[fac_type[pair_fac]]
+    high = np.array([stock_level_range[t][1] for t in FACILITY_TYPES])[fac_type[pair_fac]]
+    target = (reorder_point * rng.uniform(low, high)).astype(np.int64)
+
+    # 1-3 distinct batches per pair: consecutive batches of the medication from a random offset
+    available = batches_per_med[pair_med]
+    num_batches = rng.integers(1, np.minimum(3, available) + 1)
+    offset = rng.integers(0, available)
+
+    row_pair = np.repeat(np.arange(n_pairs), num_batches)
+    position = _group_positions(num_batches)
+    row_batch = batch_order[
+        batch_start[pair_med[row_pair]] + (offset[row_pair] + position) % available[row_pair]
+    ]
+
+    # split the target over the batches, the last one takes the remainder
+    weights = rng.uniform(0.5, 1.5, size=len(row_pair))
+    group_total = np.bincount(row_pair, weights=weights, minlength=n_pairs)
+    quantity = np.floor(target[row_pair] * weights / group_total[row_pair]).astype(np.int64)
+    is_last = position == num_batches[row_pair] - 1
+    assigned = np.bincount(row_pair, weights=np.where(is_last, 0, quantity), minlength=n_pairs)
+    quantity = np.where(is_last, target[row_pair] - assigned[row_pair].astype(np.int64), quantity)
+
+    # 1% suspiciously low prices (counterfeit indicator)
+    brand_lookup = {b["brand_id"]: b for b in brands}
+    price_multiplier = np.where(
+        rng.random(len(row_pair)) < 0.01,
+        rng.uniform(0.4, 0.6, size=len(row_pair)),
+        rng.uniform(0.9, 1.1, size=len(row_pair)),
+    )
+
+    keep = np.flatnonzero(quantity > 0)
+    width = _id_width(len(keep), 5)
+    inventory = []
+    for i, (p, b, qty, multiplier) in enumerate(
+        zip(
+            row_pair[keep].tolist(),
+            row_batch[keep].tolist(),
+            quantity[keep].tolist(),
+            price_multiplier[keep].tolist(),
+        )
+    ):
+        facility = facilities[pair_fac[p]]
+        med = medications[pair_med[p]]
+        batch = batches[b]
+        brand = brand_lookup[batch["brand_id"]]
+        inventory.append(
+            {
+                "inventory_id": f"INV_{i + 1:0{width}d}",
+                "facility_id": facility["facility_id"],
+                "batch_id": batch["batch_id"],
+                "brand_id": batch["brand_id"],
+                "med_id": med["med_id"],
+                "generic_name": med["generic_name"],
+                "brand_name": batch["brand_name"],
+                "facility_name": facility["name"],
+                "quantity": qty,
+                "reorder_point": int(reorder_point[p]),
+                "expiry_date": batch["expiry_date"],
+                "unit_price": int(brand["unit_price"] * multiplier),
+                "expected_price": brand["unit_price"],
+                "counterfeit_risk": batch["counterfeit_risk"],
+            }
+        )
+    return inventory
+
+
+def generate_network(
+    n_facilities: int = 5000,
+    n_medications: int = 500,
+    *,
+    brands_per_med: Tuple[int, int] = (1, 5),
+    batches_per_brand: Tuple[int, int] = (2, 5),
+    type_mix: Dict = FACILITY_TYPE_MIX,
+    risk_mix: Dict = COUNTERFEIT_RISK_MIX,
+    seed: int = 42,
+) -> Dict:
+    """
+    Build a synthetic network of any size.
+
+    Args:
+        n_facilities: facilities to place around the seed city centroids
+        n_medications: medications, cycling through the seed medications
+        brands_per_med: (min, max) brands per medication
+        batches_per_brand: (min, max) batches per brand, narrowed by counterfeit risk
+        type_mix: facility_type -> share, defaults to the seed mix
+        risk_mix: counterfeit_risk -> share of brands, defaults to the seed mix
+        seed: numpy seed, the same arguments always give the same network
+
+    Returns:
+        {"medications", "companies", "brands", "batches", "facilities", "inventory"}
+    """
+    rng = np.random.default_rng(seed)
+
+    companies = generate_companies()
+    medications = generate_synthetic_medications(n_medications, rng)
+    brands = generate_synthetic_brands(
+        medications, companies, rng, brands_per_med=brands_per_med, risk_mix=risk_mix
+    )
+    batches = generate_synthetic_batches(
+        brands, companies, rng, batches_per_brand=batches_per_brand
+    )
+    facilities = generate_synthetic_facilities(n_facilities, rng, type_mix=type_mix)
+    inventory = generate_synthetic_inventory(facilities, batches, medications, brands, rng)
+
+    return {
+        "medications": medications,
+        "companies": companies,
+        "brands": brands,
+        "batches": batches,
+        "facilities": facilities,
+        "inventory": inventory,
+    }
+
+
+if __name__ == "__main__":
+    import time
+
+    started = time.perf_counter()
+    network = generate_network(n_facilities=5000, n_medications=500)
+    print(
+        f"Generated {len(network['facilities'])} facilities, "
+        f"{len(network['medications'])} medications, {len(network['brands'])} brands, "
+        f"{len(network['batches'])} batches, {len(network['inventory'])} inventory rows "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
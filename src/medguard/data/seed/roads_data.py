@@ -0,0 +1,58 @@
+# (city, city, typical travel hours by road)
+# cities are the facility cities of facilities_data, hours include usual traffic
+# and road condition, not distance alone
+
+roads_data = [
+    # Lagos
+    ("Idi-Araba", "Surulere", 0.4),
+    ("Idi-Araba", "Mushin", 0.3),
+    ("Idi-Araba", "Yaba", 0.4),
+    ("Surulere", "Yaba", 0.4),
+    ("Surulere", "Victoria Island", 0.8),
+    ("Yaba", "Victoria Island", 0.7),
+    ("Yaba", "Gbagada", 0.5),
+    ("Mushin", "Ikeja", 0.6),
+    ("Mushin", "Agege", 0.7),
+    ("Gbagada", "Ikeja", 0.6),
+    ("Gbagada", "Ikorodu", 1.2),
+    ("Ikeja", "Agege", 0.5),
+    ("Ikeja", "Ikorodu", 1.5),
+    # South West
+    ("Ikeja", "Ibadan", 2.5),
+    ("Ibadan", "Ogbomoso", 1.8),
+    ("Ibadan", "Benin City", 5.0),
+    ("Ikorodu", "Benin City", 5.0),
+    # Ogbomoso - Ilorin - Jebba - Bida - Abuja
+    ("Ogbomoso", "Gwagwalada", 7.0),
+    # Ogbomoso - Ilorin - Jebba - Mokwa - Kaduna
+    ("Ogbomoso", "Kaduna", 9.0),
+    # South South
+    ("Benin City", "Oghara", 1.3),
+    ("Benin City", "Warri", 2.0),
+    ("Benin City", "Asaba", 2.0),
+    ("Oghara", "Warri", 0.9),
+    ("Warri", "Ughelli", 0.6),
+    ("Ughelli", "Asaba", 2.5),
+    # East-West road
+    ("Ughelli", "Port Harcourt", 4.5),
+    # Onitsha - Owerri - Port Harcourt
+    ("Asaba", "Port Harcourt", 4.0),
+    ("Port Harcourt", "Eleme", 0.6),
+    # Benin - Auchi - Okene - Lokoja - Abuja
+    ("Benin City", "Gwagwalada", 7.5),
+    # FCT
+    ("Gwagwalada", "Garki", 0.7),
+    ("Gwagwalada", "Kubwa", 0.8),
+    ("Garki", "Wuse", 0.2),
+    ("Garki", "Asokoro", 0.2),
+    ("Wuse", "Asokoro", 0.3),
+    ("Wuse", "Gwarimpa", 0.4),
+    ("Gwarimpa", "Kubwa", 0.3),
+    ("Asokoro", "Nyanya", 0.4),
+    # North
+    ("Kubwa", "Kaduna", 3.0),
+    ("Nyanya", "Kafanchan", 3.5),
+    ("Kafanchan", "Kaduna", 3.5),
+    ("Kaduna", "Zaria", 1.3),
+    ("Zaria", "Kano", 2.0),
+]
@@ -17,6 +17,13 @@ path_to_schema = BASE_DIR / "schema.sql"
 # cur = conn.cursor()
 
 
+def _to_json(value):
+    """dict/list columns (event data, anomaly evidence) are stored as JSON text."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
 def get_connection_to_db(db_path: Optional[Path] = None) -> sqlite3.Connection:
     path = db_path or path_to_db
     conn = sqlite3.connect(path)
@@ -25,19 +32,37 @@ def get_connection_to_db(db_path: Optional[Path] = None) -> sqlite3.Connection:
     return conn
 
 
+# columns added to existing tables after they first shipped, CREATE TABLE IF NOT
+# EXISTS leaves older databases without them: (table, column, type)
+ADDED_COLUMNS = [
+    ("events", "resolved_at", "TEXT"),
+]
+
+
 def init_database(db_path: Optional[Path] = None) -> None:
     conn = get_connection_to_db(db_path)
     with open(path_to_schema) as f:
         conn.executescript(f.read())
+    _add_missing_columns(conn)
     conn.commit()
     conn.close()
 
 
+def _add_missing_columns(conn: sqlite3.Connection) -> None:
+    """bring a database created by an older schema.sql up to date."""
+    for table, column, column_type in ADDED_COLUMNS:
+        columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
 def clear_database(db_path: Optional[Path] = None) -> None:
     """Clear all data (keeps schema)."""
     conn = get_connection_to_db(db_path)
     # list tables in order of no dependency to dependency order
     tables = [
+        "batch_stock",
+        "batch_ledger",
         "anomalies",
         "events",
         "movements",
@@ -329,9 +354,10 @@ def insert_events(events: List[Dict], conn: sqlite3.Connection) -> None:
             details,
             data,
             source,
-            is_active
+            is_active,
+            resolved_at
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
 
     values = [
@@ -344,9 +370,10 @@ def insert_events(events: List[Dict], conn: sqlite3.Connection) -> None:
             event.get("timestamp"),
             event.get("detected_at"),
             event.get("details"),
-            event.get("data"),
+            _to_json(event.get("data")),
             event.get("source"),
             int(bool(event.get("is_active", True))),
+            event.get("resolved_at"),
         )
         for event in events
     ]
@@ -384,7 +411,7 @@ def insert_anomalies(anomalies: List[Dict], conn: sqlite3.Connection) -> None:
             anomaly.get("batch_id"),
             anomaly.get("timestamp"),
             anomaly.get("details"),
-            anomaly.get("evidence"),
+            _to_json(anomaly.get("evidence")),
             anomaly.get("source"),
             int(bool(anomaly.get("is_active", True))),
         )
@@ -395,6 +422,74 @@ def insert_anomalies(anomalies: List[Dict], conn: sqlite3.Connection) -> None:
         conn.executemany(sql, values)
 
 
+def insert_batch_ledger(ledger: List[Dict], conn: sqlite3.Connection) -> None:
+    if not ledger:
+        return
+
+    sql = """
+        INSERT OR REPLACE INTO batch_ledger (
+            batch_id,
+            received,
+            dispensed,
+            transferred_in,
+            transferred_out,
+            withdrawn
+        )
+        VALUES (?, ?, ?, ?, ?, ?)
+    """
+
+    values = [
+        (
+            row["batch_id"],
+            row["received"],
+            row["dispensed"],
+            row["transferred_in"],
+            row["transferred_out"],
+            row["withdrawn"],
+        )
+        for row in ledger
+    ]
+
+    with conn:
+        conn.executemany(sql, values)
+
+
+def insert_batch_stock(stock: List[Dict], conn: sqlite3.Connection) -> None:
+    if not stock:
+        return
+
+    sql = """
+        INSERT OR REPLACE INTO batch_stock (
+            batch_id,
+            facility_id,
+            quantity
+        )
+        VALUES (?, ?, ?)
+    """
+
+    values = [(row["batch_id"], row["facility_id"], row["quantity"]) for row in stock]
+
+    with conn:
+        conn.executemany(sql, values)
+
+
+def get_batch_locations(batch_id: str, conn) -> Dict[str, int]:
+    """facility_id -> units of the batch it holds, from the batch_stock table."""
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT facility_id, quantity FROM batch_stock WHERE batch_id = ? AND quantity > 0",
+        (batch_id,),
+    )
+    return {row["facility_id"]: row["quantity"] for row in cursor.fetchall()}
+
+
+def get_batches_by_number(batch_number: str, conn) -> List[Dict]:
+    """batches sharing a batch number, looked up through idx_batches_number."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM batches WHERE batch_number = ?", (batch_number,))
+    return [dict(row) for row in cursor.fetchall()]
+
+
 def get_snapshot_details(snapshot_id: str, conn) -> Dict:
     cursor = conn.cursor()
 
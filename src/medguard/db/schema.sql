@@ -102,7 +102,8 @@ CREATE TABLE IF NOT EXISTS events (
             details TEXT,
             data TEXT,  
             source TEXT,
-            is_active INTEGER
+            is_active INTEGER,
+            resolved_at TEXT
         );
 
 CREATE TABLE IF NOT EXISTS anomalies (
@@ -118,7 +119,7 @@ CREATE TABLE IF NOT EXISTS anomalies (
             is_active INTEGER
         );
 
-CREATE TABLE agent_snapshots (
+CREATE TABLE IF NOT EXISTS agent_snapshots (
     snapshot_id TEXT PRIMARY KEY,
     cycle_time TEXT,
     low_stock_count INTEGER,
@@ -132,8 +133,30 @@ CREATE TABLE agent_snapshots (
     reasoning_summary TEXT      -- Brief explanation
 );
 
+CREATE TABLE IF NOT EXISTS batch_ledger (
+            batch_id TEXT PRIMARY KEY,
+            received INTEGER,
+            dispensed INTEGER,
+            transferred_in INTEGER,
+            transferred_out INTEGER,
+            withdrawn INTEGER,
+
+            FOREIGN KEY (batch_id) REFERENCES batches(batch_id)
+        );
+
+CREATE TABLE IF NOT EXISTS batch_stock (
+            batch_id TEXT,
+            facility_id TEXT,
+            quantity INTEGER,
+
+            PRIMARY KEY (batch_id, facility_id),
+            FOREIGN KEY (batch_id) REFERENCES batches(batch_id),
+            FOREIGN KEY (facility_id) REFERENCES facilities(facility_id)
+        );
+
 CREATE INDEX IF NOT EXISTS idx_brands_med ON brands(med_id);
 CREATE INDEX IF NOT EXISTS idx_batches_brand ON batches(brand_id);
+CREATE INDEX IF NOT EXISTS idx_batches_number ON batches(batch_number);
 CREATE INDEX IF NOT EXISTS idx_inventory_facility ON inventory(facility_id);
 CREATE INDEX IF NOT EXISTS idx_inventory_batch ON inventory(batch_id);
 CREATE INDEX IF NOT EXISTS idx_movements_facility ON movements(facility_id);
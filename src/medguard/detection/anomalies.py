@@ -1,10 +1,16 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
 from typing import List, Dict
-import uuid
+import bisect
+import math
 
 from medguard.data.generators.companies import authorized_importers
-from medguard.utils.geo import haversine_distance
+from medguard.detection.batch_registry import BatchRegistry
+from medguard.detection.ledger import BatchLedger
+from medguard.detection.records import Anomaly
+from medguard.utils.geo import FacilityDistances, facility_distances
+from medguard.utils.movements import movement_rows
+from medguard.utils.roads import TravelTimes, facility_travel_times
 
 ANOMALY_TYPES = [
     "IMPOSSIBLE_QUANTITY",
@@ -16,9 +22,13 @@ ANOMALY_TYPES = [
 ]
 
 DEFAULT_THRESHOLDS = {
-    "IMPOSSIBLE_QUANTITY_MULTIPLIER": 10,
+    # outflow (dispensed + withdrawn) above this x supply (opening stock plus
+    # restocks, see detection/ledger.py), 1 = any excess
+    "IMPOSSIBLE_QUANTITY_MULTIPLIER": 1,
     "GEOGRAPHIC_IMPOSSIBLE_KM": 300,
     "GEOGRAPHIC_IMPOSSIBLE_HOURS": 6,
+    # road model: pairs closer than this by road are never flagged
+    "GEOGRAPHIC_MIN_TRAVEL_HOURS": 1.0,
     "PRICE_ANOMALY_LOW_THRESHOLD": 0.7,
 }
 
@@ -31,22 +41,22 @@ def create_anomaly(
     med_id: str | None,
     timestamp: datetime,
     details: str,
+    details_args: tuple | None = None,
     batch_id: str | None = None,
     evidence: Dict | None = None,
-) -> Dict:
-    return {
-        "anomaly_id": f"ANOM_{uuid.uuid4().hex[:10].upper()}",
-        "anomaly_type": anomaly_type,
-        "severity": severity,
-        "facility_id": facility_id,
-        "med_id": med_id,
-        "batch_id": batch_id,
-        "timestamp": timestamp.isoformat(),
-        "details": details,
-        "evidence": evidence or {},
-        "source": "SIMULATION",
-        "is_active": True,
-    }
+) -> Anomaly:
+    """details is rendered as details.format(*details_args) when read, if given."""
+    return Anomaly(
+        anomaly_type,
+        severity,
+        facility_id,
+        med_id,
+        batch_id,
+        timestamp,
+        details,
+        details_args,
+        evidence,
+    )
 
 
 # anomalies based on movements
@@ -57,40 +67,47 @@ def detect_impossible_quantity(
     current_time: datetime,
     thresholds=DEFAULT_THRESHOLDS,
 ) -> List[Dict]:
-    anomalies = []
+    """batches that left the network (dispensed + withdrawn) in larger numbers than were supplied."""
+    ledger = BatchLedger(batches)
+    ledger.update(movements)
 
-    initial_qty_by_batch = {b["batch_id"]: b["initial_quantity"] for b in batches}
+    return [
+        _impossible_quantity_anomaly(ledger, batch_id, current_time)
+        for batch_id in ledger.over_supply(thresholds["IMPOSSIBLE_QUANTITY_MULTIPLIER"])
+    ]
 
-    dispensed_by_batch = defaultdict(int)
-    # get the amount dispensed already per batch
-    for mov in movements:
-        if mov["movement_type"] == "DISPENSE":
-            dispensed_by_batch[mov["batch_id"]] += abs(mov["quantity_change"])
 
-    for batch_id, dispensed in dispensed_by_batch.items():
-        initial = initial_qty_by_batch.get(batch_id)
-        if not initial:
-            continue
+def _impossible_quantity_anomaly(
+    ledger: BatchLedger, batch_id: str, current_time: datetime
+) -> Dict:
+    initial = ledger.initial_quantity[batch_id]
+    restocked = ledger.restocked.get(batch_id, 0)
+    supply = ledger.supply(batch_id)
+    balance = ledger.balance(batch_id)
+    outflow = balance["dispensed"] + balance["withdrawn"]
+    return create_anomaly(
+        anomaly_type="IMPOSSIBLE_QUANTITY",
+        severity="CRITICAL",
+        facility_id=None,
+        med_id=None,
+        batch_id=batch_id,
+        timestamp=current_time,
+        details="Dispensed and withdrew {} units but only {} were supplied",
+        details_args=(outflow, supply),
+        evidence={
+            "initial_quantity": initial,
+            "opening_quantity": ledger.opening.get(batch_id, 0),
+            "restocked_quantity": restocked,
+            "supply_quantity": supply,
+            "dispensed_quantity": balance["dispensed"],
+            "withdrawn_quantity": balance["withdrawn"],
+            "outflow_quantity": outflow,
+            "ratio": round(outflow / supply, 2),
+        },
+    )
 
-        if dispensed > initial * thresholds["IMPOSSIBLE_QUANTITY_MULTIPLIER"]:
-            anomalies.append(
-                create_anomaly(
-                    anomaly_type="IMPOSSIBLE_QUANTITY",
-                    severity="CRITICAL",
-                    facility_id=None,
-                    med_id=None,
-                    batch_id=batch_id,
-                    timestamp=current_time,
-                    details=f"Dispensed {dispensed} units but initial was {initial}",
-                    evidence={
-                        "initial_quantity": initial,
-                        "dispensed_quantity": dispensed,
-                        "ratio": round(dispensed / initial, 2),
-                    },
-                )
-            )
 
-    return anomalies
+_RESTOCK_FIELDS = ("batch_id", "facility_id", "med_id", "source", "timestamp")
 
 
 def detect_geographic_impossibility(
@@ -99,73 +116,114 @@ def detect_geographic_impossibility(
     current_time: datetime,
     thresholds=DEFAULT_THRESHOLDS,
 ) -> List[Dict]:
-    """detect when same batch appears at distant locations in an unrealistic short period."""
+    """
+    detect when same batch appears at distant locations in an unrealistic short period.
+
+    Facilities on the road graph (utils/roads.py) are compared with the typical
+    travel time between them, others with the straight-line thresholds.
+    """
     anomalies = []
 
-    facility_lookup = {f["facility_id"]: f for f in facilities}
+    distances = facility_distances(facilities)
+    travel = facility_travel_times(facilities)
     movements_by_batch = defaultdict(list)
 
-    for mov in movements:
+    for batch_id, facility_id, med_id, source, ts in movement_rows(
+        movements, _RESTOCK_FIELDS, movement_types=("RESTOCK",)
+    ):
         # skip initial seed
-        if mov.get("source") == "INITIAL_SEED":
+        if source == "INITIAL_SEED":
             continue
-        #  check restock  movements only
-        if mov["movement_type"] != "RESTOCK":
-            continue
-        movements_by_batch[mov["batch_id"]].append(mov)
+        movements_by_batch[batch_id].append((ts, facility_id, med_id))
 
     for batch_id, batch_moves in movements_by_batch.items():
         # sort batch movements with time
-        batch_moves.sort(key=lambda movement: movement["timestamp"])
+        batch_moves.sort(key=lambda movement: movement[0])
 
         for i in range(len(batch_moves) - 1):
-            former_movement = batch_moves[i]
-            latter_movement = batch_moves[i + 1]
-
-            former_fac = facility_lookup.get(former_movement["facility_id"])
-            latter_fac = facility_lookup.get(latter_movement["facility_id"])
-
-            if not former_fac or not latter_fac:
-                continue
-
-            # skip same facility
-            if former_fac["facility_id"] == latter_fac["facility_id"]:
-                continue
+            former_time, former_facility_id, med_id = batch_moves[i]
+            latter_time, latter_facility_id, _ = batch_moves[i + 1]
+
+            anomaly = _check_restock_pair(
+                distances,
+                travel,
+                batch_id,
+                med_id,
+                former_facility_id,
+                former_time,
+                latter_facility_id,
+                latter_time,
+                current_time,
+                thresholds,
+            )
+            if anomaly:
+                anomalies.append(anomaly)
 
-            former_time = datetime.fromisoformat(former_movement["timestamp"])
-            latter_time = datetime.fromisoformat(latter_movement["timestamp"])
-            hours_between = abs((latter_time - former_time).total_seconds()) / 3600
+    return anomalies
 
-            distance_in_km = haversine_distance(
-                former_fac["latitude"],
-                former_fac["longitude"],
-                latter_fac["latitude"],
-                latter_fac["longitude"],
-            )
 
-            if (
-                distance_in_km > thresholds["GEOGRAPHIC_IMPOSSIBLE_KM"]
-                and hours_between < thresholds["GEOGRAPHIC_IMPOSSIBLE_HOURS"]
-            ):
-                anomalies.append(
-                    create_anomaly(
-                        anomaly_type="GEOGRAPHIC_IMPOSSIBILITY",
-                        severity="CRITICAL",
-                        facility_id=None,
-                        med_id=former_movement["med_id"],
-                        batch_id=batch_id,
-                        timestamp=current_time,
-                        details=f"Batch appeared at two distant locations ({round(distance_in_km, 1)} km apart) within {round(hours_between, 2)} hours",
-                        evidence={
-                            "first_facility": former_fac["facility_id"],
-                            "second_facility": latter_fac["facility_id"],
-                            "distance_km": round(distance_in_km, 1),
-                            "hours_between": round(hours_between, 2),
-                        },
-                    )
-                )
+def _check_restock_pair(
+    distances: FacilityDistances,
+    travel: TravelTimes,
+    batch_id: str,
+    med_id: str,
+    former_facility_id: str,
+    former_time: datetime,
+    latter_facility_id: str,
+    latter_time: datetime,
+    current_time: datetime,
+    thresholds=DEFAULT_THRESHOLDS,
+) -> Dict | None:
+    """anomaly if two consecutive restocks of a batch are too far apart for the time between them."""
+    # skip same facility
+    if former_facility_id == latter_facility_id:
+        return None
+
+    distance_in_km = distances.distance(former_facility_id, latter_facility_id)
+    if distance_in_km is None:
+        return None
+
+    hours_between = abs((latter_time - former_time).total_seconds()) / 3600
+    evidence = {
+        "first_facility": former_facility_id,
+        "second_facility": latter_facility_id,
+        "distance_km": round(distance_in_km, 1),
+        "hours_between": round(hours_between, 2),
+    }
 
-    return anomalies
+    # no road between the two (inf) is judged on the straight-line thresholds
+    travel_hours = travel.hours(former_facility_id, latter_facility_id)
+    if travel_hours is not None and math.isfinite(travel_hours):
+        if (
+            travel_hours < thresholds["GEOGRAPHIC_MIN_TRAVEL_HOURS"]
+            or hours_between >= travel_hours
+        ):
+            return None
+        evidence["travel_hours"] = round(travel_hours, 2)
+        details = "Batch appeared at two locations {} hours apart by road within {} hours"
+        details_args = (round(travel_hours, 2), round(hours_between, 2))
+
+    elif (
+        distance_in_km > thresholds["GEOGRAPHIC_IMPOSSIBLE_KM"]
+        and hours_between < thresholds["GEOGRAPHIC_IMPOSSIBLE_HOURS"]
+    ):
+        details = "Batch appeared at two distant locations ({} km apart) within {} hours"
+        details_args = (round(distance_in_km, 1), round(hours_between, 2))
+
+    else:
+        return None
+
+    return create_anomaly(
+        anomaly_type="GEOGRAPHIC_IMPOSSIBILITY",
+        severity="CRITICAL",
+        facility_id=None,
+        med_id=med_id,
+        batch_id=batch_id,
+        timestamp=current_time,
+        details=details,
+        details_args=details_args,
+        evidence=evidence,
+    )
 
 
 def detect_ghost_stock(
@@ -174,13 +232,19 @@ def detect_ghost_stock(
     current_time: datetime,
 ) -> List[Dict]:
     """Detect inventory that exists without any movement at that facility."""
-    anomalies = []
-
     received_at_facility = set()
-    for mov in movements:
-        if mov["movement_type"] in ("RESTOCK", "TRANSFER_IN"):
-            key = (mov["facility_id"], mov["batch_id"])
-            received_at_facility.add(key)
+    for key in movement_rows(
+        movements, ("facility_id", "batch_id"), movement_types=("RESTOCK", "TRANSFER_IN")
+    ):
+        received_at_facility.add(key)
+
+    return _ghost_stock_anomalies(inventory, received_at_facility, current_time)
+
+
+def _ghost_stock_anomalies(
+    inventory: List[Dict], received_at_facility: set, current_time: datetime
+) -> List[Dict]:
+    anomalies = []
 
     for inv in inventory:
         if inv["quantity"] <= 0:
@@ -238,7 +302,8 @@ def detect_unauthorized_importer(
                     med_id=batch["med_id"],
                     batch_id=batch["batch_id"],
                     timestamp=current_time,
-                    details=f"Batch imported by unauthorized importer: {importer_name}",
+                    details="Batch imported by unauthorized importer: {}",
+                    details_args=(importer_name,),
                     evidence={
                         "manufacturer": manufacturer_name,
                         "importer": importer_name,
@@ -264,29 +329,36 @@ def detect_duplicate_batch_number(
 
     for batch_number, batch_list in by_batch_number.items():
         if len(batch_list) > 1:
-            batch_ids = [b["batch_id"] for b in batch_list]
-            manufacturers = list(set(b["manufacturer_name"] for b in batch_list))
-
             anomalies.append(
-                create_anomaly(
-                    anomaly_type="DUPLICATE_BATCH_NUMBER",
-                    severity="CRITICAL",
-                    facility_id=None,
-                    med_id=batch_list[0]["med_id"],
-                    batch_id=batch_ids[0],
-                    timestamp=current_time,
-                    details=f"Batch number {batch_number} appears on {len(batch_list)} different batches",
-                    evidence={
-                        "batch_number": batch_number,
-                        "duplicate_batch_ids": batch_ids,
-                        "manufacturers": manufacturers,
-                    },
-                )
+                _duplicate_batch_number_anomaly(batch_number, batch_list, current_time)
             )
 
     return anomalies
 
 
+def _duplicate_batch_number_anomaly(
+    batch_number: str, batch_list: List[Dict], current_time: datetime
+) -> Dict:
+    batch_ids = [b["batch_id"] for b in batch_list]
+    manufacturers = list(set(b["manufacturer_name"] for b in batch_list))
+
+    return create_anomaly(
+        anomaly_type="DUPLICATE_BATCH_NUMBER",
+        severity="CRITICAL",
+        facility_id=None,
+        med_id=batch_list[0]["med_id"],
+        batch_id=batch_ids[0],
+        timestamp=current_time,
+        details="Batch number {} appears on {} different batches",
+        details_args=(batch_number, len(batch_list)),
+        evidence={
+            "batch_number": batch_number,
+            "duplicate_batch_ids": batch_ids,
+            "manufacturers": manufacturers,
+        },
+    )
+
+
 def detect_price_anomaly(
     inventory: List[Dict],
     current_time: datetime,
@@ -313,7 +385,8 @@ def detect_price_anomaly(
                     med_id=inv["med_id"],
                     batch_id=inv["batch_id"],
                     timestamp=current_time,
-                    details=f"Suspiciously low price: {actual_price} vs expected {expected_price}",
+                    details="Suspiciously low price: {} vs expected {}",
+                    details_args=(actual_price, expected_price),
                     evidence={
                         "actual_price": actual_price,
                         "expected_price": expected_price,
@@ -327,6 +400,16 @@ def detect_price_anomaly(
     return anomalies
 
 
+def anomaly_signature(anomaly: Dict) -> tuple:
+    """dedupe key of an anomaly."""
+    return (
+        anomaly["anomaly_type"],
+        anomaly.get("facility_id"),
+        anomaly.get("batch_id"),
+        anomaly.get("med_id"),
+    )
+
+
 def generate_anomalies(
     *,
     inventory: List[Dict],
@@ -344,13 +427,7 @@ def generate_anomalies(
     # Create signatures of already-detected anomalies
     existing_signatures = set()
     for a in existing_anomalies:
-        sig = (
-            a["anomaly_type"],
-            a.get("facility_id"),
-            a.get("batch_id"),
-            a.get("med_id"),
-        )
-        existing_signatures.add(sig)
+        existing_signatures.add(anomaly_signature(a))
 
     all_detected = []
     all_detected.extend(
@@ -369,12 +446,7 @@ def generate_anomalies(
     # fulter duplicates
     new_anomalies = []
     for anomaly in all_detected:
-        sig = (
-            anomaly["anomaly_type"],
-            anomaly.get("facility_id"),
-            anomaly.get("batch_id"),
-            anomaly.get("med_id"),
-        )
+        sig = anomaly_signature(anomaly)
         if sig not in existing_signatures:
             new_anomalies.append(anomaly)
             existing_signatures.add(sig)
@@ -382,6 +454,236 @@ def generate_anomalies(
     return new_anomalies
 
 
+class AnomalyEngine:
+    """
+    Streaming version of generate_anomalies for a running simulation.
+
+    Movement-based aggregates (the batch ledger, the time-ordered
+    restocks of each batch and the set of (facility, batch) receipts) are kept
+    between calls and updated from the movements appended since the last
+    watermark, so a cycle costs O(new movements) instead of a rescan of the log.
+    Restocks older than the longest time a pair can be flagged over (road travel
+    time or GEOGRAPHIC_IMPOSSIBLE_HOURS) are dropped from the timelines on every
+    detect(), so they only hold recent restocks however long the run.
+    The batch-level detectors (unauthorized importer, duplicate batch number)
+    only check the batches added or updated through add_batches() since their
+    last run, against the batch_number index of the batch registry.
+    """
+
+    def __init__(
+        self,
+        facilities: List[Dict],
+        batches: List[Dict],
+        thresholds=DEFAULT_THRESHOLDS,
+    ):
+        self.thresholds = thresholds
+        self.facilities = facilities
+        self.registry = BatchRegistry(batches)
+        self.batch_version = 0  # registry version the batch detectors last checked
+        self.distances = facility_distances(facilities)
+        self.travel = facility_travel_times(facilities)
+
+        self.watermark = 0  # number of movements already consumed
+        self.signatures = set()
+
+        # running aggregates
+        self.ledger = BatchLedger(batches)
+        self.restocks_by_batch = defaultdict(list)  # sorted (timestamp, facility_id, med_id)
+        self.restock_horizon = timedelta(
+            hours=max(thresholds["GEOGRAPHIC_IMPOSSIBLE_HOURS"], self.travel.max_hours())
+        )
+        self.received_at_facility = set()
+
+        # found while consuming, emitted on the next detect()
+        self.pending_restock_pairs = []
+
+        # optional SimulationMetrics, times every detector
+        self.metrics = None
+
+    def __getstate__(self):
+        # the distance matrix and road travel table derive from the facilities
+        # table, rebuilt on load instead of pickled into every checkpoint
+        state = dict(self.__dict__)
+        del state["distances"]
+        del state["travel"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.distances = facility_distances(self.facilities)
+        self.travel = facility_travel_times(self.facilities)
+
+    def _run(self, name: str, detector, *args):
+        if self.metrics is None:
+            return detector(*args)
+        return self.metrics.time_detector(f"anomalies.{name}", detector, *args)
+
+    def update(self, movements: List[Dict]) -> None:
+        """consume the movements appended since the last call."""
+        self.ledger.update(movements, self.watermark)
+
+        for facility_id, batch_id in movement_rows(
+            movements,
+            ("facility_id", "batch_id"),
+            self.watermark,
+            ("RESTOCK", "TRANSFER_IN"),
+        ):
+            self.received_at_facility.add((facility_id, batch_id))
+
+        for batch_id, facility_id, med_id, source, ts in movement_rows(
+            movements, _RESTOCK_FIELDS, self.watermark, ("RESTOCK",)
+        ):
+            if source != "INITIAL_SEED":
+                self._add_restock(batch_id, (ts, facility_id, med_id))
+
+        self.watermark = len(movements)
+
+    def _add_restock(self, batch_id: str, entry: tuple) -> None:
+        """insert a (timestamp, facility_id, med_id) restock into its batch timeline and queue the consecutive pairs it forms."""
+        timeline = self.restocks_by_batch[batch_id]
+
+        position = bisect.bisect_right(timeline, entry)
+        timeline.insert(position, entry)
+
+        if position > 0:
+            self.pending_restock_pairs.append((batch_id, timeline[position - 1], entry))
+        if position + 1 < len(timeline):
+            self.pending_restock_pairs.append((batch_id, entry, timeline[position + 1]))
+
+    def _prune_restocks(self, cutoff: datetime) -> None:
+        """
+        drop restocks before cutoff. Movements consumed later are stamped at or
+        after the current detect() time, a pair with a dropped restock is longer
+        apart than restock_horizon and would never be flagged.
+        """
+        stale = []
+        for batch_id, timeline in self.restocks_by_batch.items():
+            if timeline[-1][0] < cutoff:
+                stale.append(batch_id)
+            elif timeline[0][0] < cutoff:
+                del timeline[: bisect.bisect_left(timeline, (cutoff,))]
+        for batch_id in stale:
+            del self.restocks_by_batch[batch_id]
+
+    def add_batches(self, batches: List[Dict]) -> None:
+        """batches inserted or updated, checked by the batch detectors on the next detect()."""
+        self.registry.upsert(batches)
+        for batch in batches:
+            self.ledger.initial_quantity[batch["batch_id"]] = batch["initial_quantity"]
+
+    def _detect_duplicate_batch_number(
+        self, changed: List[Dict], current_time: datetime
+    ) -> List[Dict]:
+        anomalies = []
+        for batch_number in dict.fromkeys(b["batch_number"] for b in changed):
+            batch_list = self.registry.with_batch_number(batch_number)
+            if len(batch_list) > 1:
+                anomalies.append(
+                    _duplicate_batch_number_anomaly(batch_number, batch_list, current_time)
+                )
+        return anomalies
+
+    def _detect_impossible_quantity(self, current_time: datetime) -> List[Dict]:
+        multiplier = self.thresholds["IMPOSSIBLE_QUANTITY_MULTIPLIER"]
+        return [
+            _impossible_quantity_anomaly(self.ledger, batch_id, current_time)
+            for batch_id in self.ledger.over_supply(multiplier)
+        ]
+
+    def _detect_geographic_impossibility(self, current_time: datetime) -> List[Dict]:
+        anomalies = []
+        for batch_id, former, latter in self.pending_restock_pairs:
+            anomaly = _check_restock_pair(
+                self.distances,
+                self.travel,
+                batch_id,
+                former[2],
+                former[1],
+                former[0],
+                latter[1],
+                latter[0],
+                current_time,
+                self.thresholds,
+            )
+            if anomaly:
+                anomalies.append(anomaly)
+        self.pending_restock_pairs.clear()
+        return anomalies
+
+    def detect(
+        self,
+        *,
+        inventory: List[Dict],
+        movements: List[Dict],
+        current_time: datetime,
+    ) -> List[Dict]:
+        """same anomalies as generate_anomalies, using the running state."""
+        self._run("update", self.update, movements)
+
+        all_detected = []
+        all_detected.extend(
+            self._run(
+                "impossible_quantity", self._detect_impossible_quantity, current_time
+            )
+        )
+        all_detected.extend(
+            self._run(
+                "geographic_impossibility",
+                self._detect_geographic_impossibility,
+                current_time,
+            )
+        )
+        self._prune_restocks(current_time - self.restock_horizon)
+        all_detected.extend(
+            self._run(
+                "ghost_stock",
+                _ghost_stock_anomalies,
+                inventory,
+                self.received_at_facility,
+                current_time,
+            )
+        )
+
+        # batches only change on ingest, nothing to check otherwise
+        if self.batch_version != self.registry.version:
+            changed = self.registry.changed_since(self.batch_version)
+            self.batch_version = self.registry.version
+            all_detected.extend(
+                self._run(
+                    "unauthorized_importer",
+                    detect_unauthorized_importer,
+                    changed,
+                    current_time,
+                )
+            )
+            all_detected.extend(
+                self._run(
+                    "duplicate_batch_number",
+                    self._detect_duplicate_batch_number,
+                    changed,
+                    current_time,
+                )
+            )
+        all_detected.extend(
+            self._run(
+                "price_anomaly",
+                detect_price_anomaly,
+                inventory,
+                current_time,
+                self.thresholds,
+            )
+        )
+
+        new_anomalies = []
+        for anomaly in all_detected:
+            sig = anomaly_signature(anomaly)
+            if sig not in self.signatures:
+                new_anomalies.append(anomaly)
+                self.signatures.add(sig)
+
+        return new_anomalies
+
+
 if __name__ == "__main__":
     from medguard.data.generators.medications import generate_medications
     from medguard.data.generators.brands import generate_brands
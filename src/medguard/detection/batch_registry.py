@@ -0,0 +1,60 @@
+"""
+Versioned registry of batches for the batch-level detectors.
+
+UNAUTHORIZED_IMPORTER and DUPLICATE_BATCH_NUMBER only depend on the batches
+(and the static authorized_importers table), so running them every agent cycle
+only finds repeats for dedupe to throw away. BatchRegistry holds the batches
+with a batch_number -> batch_ids hash index and a version that goes up on every
+insert or update. A detector remembers the version it last checked and looks
+only at the batches changed since, a cycle without batch ingest costs nothing.
+
+    registry = BatchRegistry(batches)
+    version = registry.version
+    registry.upsert(new_batches)
+    registry.changed_since(version)  # new_batches
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+
+class BatchRegistry:
+    """batches by id, a batch_number index and a change log versioning both."""
+
+    def __init__(self, batches: Iterable[Dict] = ()):
+        self.batches: Dict[str, Dict] = {}
+        self.by_batch_number: Dict[str, List[str]] = defaultdict(list)
+        self.changes: List[str] = []  # batch ids in the order they were inserted / updated
+        self.upsert(batches)
+
+    def __len__(self):
+        return len(self.batches)
+
+    @property
+    def version(self) -> int:
+        return len(self.changes)
+
+    def upsert(self, batches: Iterable[Dict]) -> int:
+        """insert or replace batches, returns the new version."""
+        for batch in batches:
+            batch_id = batch["batch_id"]
+            batch_number = batch.get("batch_number")
+
+            old = self.batches.get(batch_id)
+            if old is None:
+                self.by_batch_number[batch_number].append(batch_id)
+            elif old.get("batch_number") != batch_number:
+                self.by_batch_number[old.get("batch_number")].remove(batch_id)
+                self.by_batch_number[batch_number].append(batch_id)
+
+            self.batches[batch_id] = batch
+            self.changes.append(batch_id)
+        return self.version
+
+    def changed_since(self, version: int) -> List[Dict]:
+        """batches inserted or updated after version, each once, in change order."""
+        return [self.batches[batch_id] for batch_id in dict.fromkeys(self.changes[version:])]
+
+    def with_batch_number(self, batch_number: str) -> List[Dict]:
+        """batches sharing a batch number, in insertion order."""
+        return [self.batches[batch_id] for batch_id in self.by_batch_number.get(batch_number, ())]
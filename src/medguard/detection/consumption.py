@@ -0,0 +1,120 @@
+"""
+Rolling dispense totals per (facility, med) pair.
+
+ConsumptionWindows keeps one hourly ring buffer per pair (a numpy matrix of
+hour slot x pair) and a running total per window length, so "dispensed in the
+last N hours" is one array lookup however many movements fell in the window.
+Moving the clock forward subtracts the hour that leaves each window and clears
+the slot it reuses, a cost per simulated hour rather than per movement.
+
+Windows follow detect_rapid_consumption: a window of N hours at current_time
+counts dispenses from current_time - N hours to current_time, both inclusive,
+at hour resolution (N + 1 hourly slots when current_time is on the hour).
+"""
+
+from datetime import datetime
+from typing import Dict, Hashable, Iterable
+
+import numpy as np
+
+CONSUMPTION_WINDOWS_HOURS = (24, 72, 168)
+
+_INITIAL_PAIRS = 256
+
+
+def _hour(ts: datetime) -> int:
+    """hours since 0001-01-01, the ring slot of a timestamp."""
+    return ts.toordinal() * 24 + ts.hour
+
+
+class ConsumptionWindows:
+    """dispensed quantity per (facility, med) pair over several rolling windows."""
+
+    def __init__(self, windows: Iterable[int] = CONSUMPTION_WINDOWS_HOURS):
+        self.windows = tuple(sorted(set(windows)))
+        self.slots = self.windows[-1] + 1
+
+        self.pair_index: Dict[Hashable, int] = {}
+        self.pairs = []
+
+        # hour slot x pair, slot = hour % slots. One hour of one pair's dispenses
+        # fits int32, half the memory of int64; the window totals stay int64
+        self.buckets = np.zeros((self.slots, _INITIAL_PAIRS), dtype=np.int32)
+        self.totals = {
+            hours: np.zeros(_INITIAL_PAIRS, dtype=np.int64) for hours in self.windows
+        }
+        self.hour = None  # newest hour the ring holds
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def _pair(self, key: Hashable) -> int:
+        index = self.pair_index.get(key)
+        if index is not None:
+            return index
+
+        index = len(self.pairs)
+        if index == self.buckets.shape[1]:
+            # grow the pair axis by doubling
+            self.buckets = np.pad(self.buckets, ((0, 0), (0, index)))
+            for hours in self.windows:
+                self.totals[hours] = np.pad(self.totals[hours], (0, index))
+
+        self.pair_index[key] = index
+        self.pairs.append(key)
+        return index
+
+    def advance(self, current_time: datetime) -> None:
+        """move the windows forward to end at current_time."""
+        hour = _hour(current_time)
+        if self.hour is None:
+            self.hour = hour
+            return
+        if hour <= self.hour:
+            return
+
+        if hour - self.hour >= self.slots:
+            # every window has moved past everything recorded
+            self.buckets[:] = 0
+            for totals in self.totals.values():
+                totals[:] = 0
+            self.hour = hour
+            return
+
+        for new_hour in range(self.hour + 1, hour + 1):
+            for hours in self.windows:
+                self.totals[hours] -= self.buckets[(new_hour - hours - 1) % self.slots]
+            # the slot reused by new_hour held the hour that just left the largest window
+            self.buckets[new_hour % self.slots] = 0
+        self.hour = hour
+
+    def add(self, key: Hashable, ts: datetime, quantity: int) -> None:
+        """record a dispense of quantity units at ts."""
+        hour = _hour(ts)
+        if self.hour is None or hour > self.hour:
+            self.advance(ts)
+
+        age = self.hour - hour
+        if age >= self.slots:
+            return  # older than the largest window
+
+        index = self._pair(key)
+        self.buckets[hour % self.slots, index] += quantity
+        for hours in self.windows:
+            if age <= hours:
+                self.totals[hours][index] += quantity
+
+    def dispensed(self, key: Hashable, hours: int) -> int:
+        """units dispensed for key in the window of hours ending at the current hour."""
+        index = self.pair_index.get(key)
+        if index is None:
+            return 0
+        return int(self.totals[hours][index])
+
+    def nonzero(self, hours: int) -> Dict[Hashable, int]:
+        """{pair: dispensed} for every pair that dispensed in the window."""
+        totals = self.totals[hours][: len(self.pairs)]
+        indexes = np.flatnonzero(totals)
+        return {
+            self.pairs[i]: qty for i, qty in zip(indexes.tolist(), totals[indexes].tolist())
+        }
@@ -1,7 +1,13 @@
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from collections import defaultdict
 from typing import List, Dict
-import uuid
+
+import numpy as np
+
+from medguard.detection.consumption import CONSUMPTION_WINDOWS_HOURS, ConsumptionWindows
+from medguard.detection.records import Event
+from medguard.utils.expiry import NO_EXPIRY
+from medguard.utils.movements import movement_rows
 
 SEVERITY_LEVELS = {
     "INFO": 1,
@@ -34,26 +40,88 @@ def create_event(
     med_id: str,
     timestamp: datetime,
     details: str,
+    details_args: tuple | None = None,
     batch_id: str | None = None,
     data: Dict | None = None,
-) -> Dict:
+) -> Event:
     """
     creates the structure all events should follow and uses * to ensure keyword paramaters usage only
+
+    details is rendered as details.format(*details_args) when read, if given.
     """
-    return {
-        "event_id": f"EVT_{uuid.uuid4().hex[:10].upper()}",
-        "event_type": event_type,
-        "severity": severity,
-        "facility_id": facility_id,
-        "med_id": med_id,
-        "batch_id": batch_id,
-        "timestamp": timestamp.isoformat(),  # when event occured
-        "detected_at": datetime.now().isoformat(),  # when the agent wakes up and detects the event
-        "details": details,
-        "data": data or {},
-        "source": "SIMULATION",
-        "is_active": True,
-    }
+    return Event(
+        event_type,
+        severity,
+        facility_id,
+        med_id,
+        batch_id,
+        timestamp,
+        details,
+        details_args,
+        data,
+    )
+
+
+def _low_stock_event(
+    inv: Dict, quantity: int, reorder_point: int, current_time: datetime
+) -> Dict:
+    return create_event(
+        event_type="LOW_STOCK",
+        severity="MEDIUM",
+        facility_id=inv["facility_id"],
+        med_id=inv["med_id"],
+        batch_id=inv["batch_id"],
+        timestamp=current_time,
+        details="Stock is low: quantity={}, reorder_point={}",
+        details_args=(quantity, reorder_point),
+        data={
+            "quantity": quantity,
+            "reorder_point": reorder_point,
+        },
+    )
+
+
+def _stockout_event(inv: Dict, current_time: datetime) -> Dict:
+    return create_event(
+        event_type="STOCKOUT",
+        severity="CRITICAL",
+        facility_id=inv["facility_id"],
+        med_id=inv["med_id"],
+        batch_id=inv["batch_id"],
+        timestamp=current_time,
+        details="Stockout detected: quantity is zero",
+    )
+
+
+def _near_expiry_event(
+    inv: Dict, days_to_expiry: int, current_time: datetime, thresholds
+) -> Dict:
+    severity = (
+        "HIGH" if days_to_expiry <= thresholds["URGENT_EXPIRY_DAYS"] else "MEDIUM"
+    )
+    return create_event(
+        event_type="NEAR_EXPIRY",
+        severity=severity,
+        facility_id=inv["facility_id"],
+        med_id=inv["med_id"],
+        batch_id=inv["batch_id"],
+        timestamp=current_time,
+        details="Batch expires in {} days",
+        details_args=(days_to_expiry,),
+        data={"days_to_expiry": days_to_expiry},
+    )
+
+
+def _expired_in_stock_event(inv: Dict, current_time: datetime) -> Dict:
+    return create_event(
+        event_type="EXPIRED_IN_STOCK",
+        severity="HIGH",
+        facility_id=inv["facility_id"],
+        med_id=inv["med_id"],
+        batch_id=inv["batch_id"],
+        timestamp=current_time,
+        details="Expired stock still present in inventory",
+    )
 
 
 # events
@@ -65,24 +133,7 @@ def detect_low_stock(inventory: List[Dict], current_time: datetime) -> List[Dict
         reorder_point = inv["reorder_point"]
 
         if 0 < quantity <= reorder_point:
-            events.append(
-                create_event(
-                    event_type="LOW_STOCK",
-                    severity="MEDIUM",
-                    facility_id=inv["facility_id"],
-                    med_id=inv["med_id"],
-                    batch_id=inv["batch_id"],
-                    timestamp=current_time,
-                    details=(
-                        f"Stock is low: quantity={quantity}, "
-                        f"reorder_point={reorder_point}"
-                    ),
-                    data={
-                        "quantity": quantity,
-                        "reorder_point": reorder_point,
-                    },
-                )
-            )
+            events.append(_low_stock_event(inv, quantity, reorder_point, current_time))
 
     return events
 
@@ -92,17 +143,7 @@ def detect_stockout(inventory: List[Dict], current_time: datetime) -> List[Dict]
 
     for inv in inventory:
         if inv["quantity"] == 0:
-            events.append(
-                create_event(
-                    event_type="STOCKOUT",
-                    severity="CRITICAL",
-                    facility_id=inv["facility_id"],
-                    med_id=inv["med_id"],
-                    batch_id=inv["batch_id"],
-                    timestamp=current_time,
-                    details="Stockout detected: quantity is zero",
-                )
-            )
+            events.append(_stockout_event(inv, current_time))
 
     return events
 
@@ -126,23 +167,8 @@ def detect_near_expiry(
         days_to_expiry = (expiry_date - current_time).days
 
         if 0 < days_to_expiry <= thresholds["NEAR_EXPIRY_DAYS"]:
-            severity = (
-                "HIGH"
-                if days_to_expiry <= thresholds["URGENT_EXPIRY_DAYS"]
-                else "MEDIUM"
-            )
-
             events.append(
-                create_event(
-                    event_type="NEAR_EXPIRY",
-                    severity=severity,
-                    facility_id=inv["facility_id"],
-                    med_id=inv["med_id"],
-                    batch_id=inv["batch_id"],
-                    timestamp=current_time,
-                    details=f"Batch expires in {days_to_expiry} days",
-                    data={"days_to_expiry": days_to_expiry},
-                )
+                _near_expiry_event(inv, days_to_expiry, current_time, thresholds)
             )
 
     return events
@@ -164,21 +190,66 @@ def detect_expired_in_stock(
             continue
 
         if current_time >= expiry_date:
-            events.append(
-                create_event(
-                    event_type="EXPIRED_IN_STOCK",
-                    severity="HIGH",
-                    facility_id=inv["facility_id"],
-                    med_id=inv["med_id"],
-                    batch_id=inv["batch_id"],
-                    timestamp=current_time,
-                    details="Expired stock still present in inventory",
-                )
-            )
+            events.append(_expired_in_stock_event(inv, current_time))
+
+    return events
+
+
+def detect_inventory_state(
+    arrays,
+    inventory: List[Dict],
+    current_time: datetime,
+    thresholds=DEFAULT_THRESHOLDS,
+) -> List[Dict]:
+    """
+    detect_low_stock + detect_stockout + detect_near_expiry + detect_expired_in_stock
+    in one pass of numpy masks over columnar inventory.
+
+    Args:
+        arrays: InventoryArrays (quantity, reorder_point, expiry ordinal) kept in
+            sync with inventory, row i belongs to inventory[i]
+
+    Returns:
+        the same events, in the same order, as the four detectors in sequence
+    """
+    quantity = arrays.quantity
+    reorder_point = arrays.reorder_point
+    expiry = arrays.expiry
 
+    today = current_time.toordinal()
+    # (expiry midnight - current_time).days loses a day once past midnight
+    days_to_expiry = expiry - today - (current_time.time() != time.min)
+
+    in_stock = quantity > 0
+    dated = in_stock & (expiry != NO_EXPIRY)
+
+    low = np.flatnonzero(in_stock & (quantity <= reorder_point))
+    out = np.flatnonzero(quantity == 0)
+    near = np.flatnonzero(
+        dated & (days_to_expiry > 0) & (days_to_expiry <= thresholds["NEAR_EXPIRY_DAYS"])
+    )
+    expired = np.flatnonzero(dated & (expiry <= today))
+
+    events = [
+        _low_stock_event(inventory[i], q, r, current_time)
+        for i, q, r in zip(
+            low.tolist(), quantity[low].tolist(), reorder_point[low].tolist()
+        )
+    ]
+    events.extend(_stockout_event(inventory[i], current_time) for i in out.tolist())
+    events.extend(
+        _near_expiry_event(inventory[i], days, current_time, thresholds)
+        for i, days in zip(near.tolist(), days_to_expiry[near].tolist())
+    )
+    events.extend(
+        _expired_in_stock_event(inventory[i], current_time) for i in expired.tolist()
+    )
     return events
 
 
+_DISPENSE_FIELDS = ("facility_id", "med_id", "quantity_change", "timestamp")
+
+
 def detect_rapid_consumption(
     movements: List[Dict],
     inventory: List[Dict],
@@ -186,24 +257,19 @@ def detect_rapid_consumption(
     current_time: datetime,
     thresholds=DEFAULT_THRESHOLDS,
 ) -> List[Dict]:
-    events = []
-
     window_start = current_time - timedelta(
         hours=thresholds["RAPID_CONSUMPTION_WINDOW_HOURS"]
     )
 
     dispensed = defaultdict(int)
 
-    for m in movements:
-        if m["movement_type"] != "DISPENSE":
-            continue
-
-        ts = datetime.fromisoformat(m["timestamp"])
+    for facility_id, med_id, quantity_change, ts in movement_rows(
+        movements, _DISPENSE_FIELDS, movement_types=("DISPENSE",)
+    ):
         if ts < window_start:
             continue
 
-        key = (m["facility_id"], m["med_id"])
-        dispensed[key] += abs(m["quantity_change"])
+        dispensed[(facility_id, med_id)] += abs(quantity_change)
 
     # Expected demand
     """base_demand_by_med = {}
@@ -212,6 +278,18 @@ def detect_rapid_consumption(
 
     med_lookup = {m["med_id"]: m["base_demand"] for m in medications}
 
+    return _rapid_consumption_events(dispensed, med_lookup, current_time, thresholds)
+
+
+def _rapid_consumption_events(
+    dispensed: Dict,
+    med_lookup: Dict,
+    current_time: datetime,
+    thresholds=DEFAULT_THRESHOLDS,
+) -> List[Dict]:
+    """turn windowed dispense totals per (facility, med) into RAPID_CONSUMPTION events."""
+    events = []
+
     for (facility_id, med_id), qty in dispensed.items():
         expected = med_lookup.get(med_id)
         if not expected:
@@ -226,10 +304,11 @@ def detect_rapid_consumption(
                     med_id=med_id,
                     batch_id=None,
                     timestamp=current_time,
-                    details=(
-                        f"Dispensed {qty} units in "
-                        f"{thresholds['RAPID_CONSUMPTION_WINDOW_HOURS']}h "
-                        f"(expected ~{expected})"
+                    details="Dispensed {} units in {}h (expected ~{})",
+                    details_args=(
+                        qty,
+                        thresholds["RAPID_CONSUMPTION_WINDOW_HOURS"],
+                        expected,
                     ),
                     data={
                         "dispensed_quantity": qty,
@@ -241,6 +320,82 @@ def detect_rapid_consumption(
     return events
 
 
+def event_signature(event: Dict) -> tuple:
+    """dedupe key of an event: one active event per type, facility, med and batch."""
+    return (
+        event["event_type"],
+        event["facility_id"],
+        event["med_id"],
+        event.get("batch_id"),
+    )
+
+
+class EventStore:
+    """
+    Open events indexed by event type and signature.
+
+    sync() opens an event for every detected signature that is not open yet and
+    resolves, in bulk, the open events whose condition was checked and no longer
+    holds (is_active False, resolved_at set). Dedupe is one dict lookup per
+    candidate and only currently open conditions are held.
+
+    The store owns the events it holds: resolving updates those dicts in place,
+    which is how EventDetector's events in the engine's log get resolved. Pass
+    copies to keep events of your own unchanged.
+    """
+
+    def __init__(self, events: List[Dict] = ()):
+        # event type -> signature -> open event
+        self.active = defaultdict(dict)
+        for event in events:
+            if event.get("is_active", True):
+                self.active[event["event_type"]][event_signature(event)] = event
+
+    def __len__(self):
+        return sum(len(events) for events in self.active.values())
+
+    def __contains__(self, signature: tuple) -> bool:
+        return signature in self.active.get(signature[0], ())
+
+    def sync(
+        self,
+        detected: List[Dict],
+        current_time: datetime,
+        event_types: List[str] = EVENT_TYPES,
+    ) -> tuple:
+        """
+        Args:
+            detected: every event whose condition holds at current_time
+            event_types: the types detected covers, open events of other types
+                are left alone
+
+        Returns:
+            (opened, resolved) events
+        """
+        opened = []
+        seen = defaultdict(set)
+        for event in detected:
+            sig = event_signature(event)
+            seen[sig[0]].add(sig)
+            if sig not in self.active[sig[0]]:
+                self.active[sig[0]][sig] = event
+                opened.append(event)
+
+        resolved = []
+        resolved_at = current_time.isoformat()
+        for event_type in event_types:
+            active = self.active.get(event_type)
+            if not active:
+                continue
+            for sig in active.keys() - seen[event_type]:
+                event = active.pop(sig)
+                event["is_active"] = False
+                event["resolved_at"] = resolved_at
+                resolved.append(event)
+
+        return opened, resolved
+
+
 # event generator
 def generate_events(
     *,
@@ -251,16 +406,12 @@ def generate_events(
     existing_events: List[Dict] = None,
     thresholds=DEFAULT_THRESHOLDS,
 ) -> List[Dict]:
-
+    """
+    Events whose condition holds at current_time and that are not among the
+    active existing_events. existing_events are left unchanged.
+    """
     existing_events = existing_events or []
 
-    # create signatures of active events
-    existing_signatures = set()
-    for e in existing_events:
-        if e.get("is_active", True):
-            sig = (e["event_type"], e["facility_id"], e["med_id"], e.get("batch_id"))
-            existing_signatures.add(sig)
-
     # detect all events
     all_detected = []
     all_detected.extend(detect_low_stock(inventory, current_time))
@@ -273,17 +424,140 @@ def generate_events(
         )
     )
 
-    # filter duplicates
-    new_events = []
-    for event in all_detected:
-        sig = (
-            event["event_type"],
-            event["facility_id"],
-            event["med_id"],
-            event.get("batch_id"),
+    # the store resolves the events that cleared in place, give it copies
+    store = EventStore([dict(e) for e in existing_events if e.get("is_active", True)])
+    new_events, _ = store.sync(all_detected, current_time)
+    return new_events
+
+
+class EventDetector:
+    """
+    Stateful version of generate_events for a running simulation.
+
+    Keeps a watermark into the movement log and only reads movements appended
+    since the last call, so the cost of a cycle follows the new data rather than
+    the whole history. Dispense totals for the rapid consumption window (hourly
+    ring buffers, see detection/consumption.py) and the open events (EventStore)
+    are kept between calls instead of rebuilt; events whose condition cleared
+    are resolved and collected until take_resolved().
+    """
+
+    def __init__(self, medications: List[Dict], thresholds=DEFAULT_THRESHOLDS):
+        self.thresholds = thresholds
+        self.med_lookup = {m["med_id"]: m["base_demand"] for m in medications}
+
+        self.watermark = 0  # number of movements already consumed
+        self.store = EventStore()
+        self.resolved: List[Dict] = []
+
+        # rolling dispense totals per (facility, med), also for longer windows
+        self.consumption = ConsumptionWindows(
+            CONSUMPTION_WINDOWS_HOURS + (thresholds["RAPID_CONSUMPTION_WINDOW_HOURS"],)
         )
-        if sig not in existing_signatures:
-            new_events.append(event)
-            existing_signatures.add(sig)
 
-    return new_events
+        # optional SimulationMetrics, times every detector
+        self.metrics = None
+
+    def _run(self, name: str, detector, *args):
+        if self.metrics is None:
+            return detector(*args)
+        return self.metrics.time_detector(f"events.{name}", detector, *args)
+
+    def update(self, movements: List[Dict]) -> None:
+        """consume the movements appended since the last call."""
+        for facility_id, med_id, quantity_change, ts in movement_rows(
+            movements, _DISPENSE_FIELDS, self.watermark, ("DISPENSE",)
+        ):
+            self.consumption.add((facility_id, med_id), ts, abs(quantity_change))
+
+        self.watermark = len(movements)
+
+    def _rapid_consumption(self, current_time: datetime) -> List[Dict]:
+        self.consumption.advance(current_time)
+        return _rapid_consumption_events(
+            self.consumption.nonzero(self.thresholds["RAPID_CONSUMPTION_WINDOW_HOURS"]),
+            self.med_lookup,
+            current_time,
+            self.thresholds,
+        )
+
+    def _sync(
+        self,
+        detected: List[Dict],
+        current_time: datetime,
+        event_types: List[str] = EVENT_TYPES,
+    ) -> List[Dict]:
+        opened, resolved = self.store.sync(detected, current_time, event_types)
+        self.resolved.extend(resolved)
+        return opened
+
+    def take_resolved(self) -> List[Dict]:
+        """events resolved since the last call."""
+        resolved, self.resolved = self.resolved, []
+        return resolved
+
+    def detect(
+        self,
+        *,
+        inventory: List[Dict],
+        movements: List[Dict],
+        current_time: datetime,
+        arrays=None,
+    ) -> List[Dict]:
+        """
+        same events as generate_events, using the running state.
+
+        arrays: InventoryArrays mirroring inventory, switches the four inventory
+        state detectors to detect_inventory_state
+        """
+        self._run("update", self.update, movements)
+
+        all_detected = []
+        if arrays is not None:
+            all_detected.extend(
+                self._run(
+                    "inventory_state",
+                    detect_inventory_state,
+                    arrays,
+                    inventory,
+                    current_time,
+                    self.thresholds,
+                )
+            )
+        else:
+            all_detected.extend(
+                self._run("low_stock", detect_low_stock, inventory, current_time)
+            )
+            all_detected.extend(
+                self._run("stockout", detect_stockout, inventory, current_time)
+            )
+            all_detected.extend(
+                self._run(
+                    "near_expiry",
+                    detect_near_expiry,
+                    inventory,
+                    current_time,
+                    self.thresholds,
+                )
+            )
+            all_detected.extend(
+                self._run(
+                    "expired_in_stock", detect_expired_in_stock, inventory, current_time
+                )
+            )
+        all_detected.extend(
+            self._run("rapid_consumption", self._rapid_consumption, current_time)
+        )
+
+        return self._sync(all_detected, current_time)
+
+    def detect_consumption(
+        self, *, movements: List[Dict], current_time: datetime
+    ) -> List[Dict]:
+        """only the RAPID_CONSUMPTION check, cheap enough to run every tick."""
+        self._run("update", self.update, movements)
+        return self._sync(
+            self._run("rapid_consumption", self._rapid_consumption, current_time),
+            current_time,
+            ["RAPID_CONSUMPTION"],
+        )
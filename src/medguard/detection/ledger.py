@@ -0,0 +1,164 @@
+"""
+Per-batch quantity conservation ledger.
+
+BatchLedger keeps, for every batch, network-wide totals of what was received,
+dispensed, transferred in / out and withdrawn, plus the stock each facility
+holds of it. Every movement is one O(1) update, so the ledger can be fed from
+the movement log as it grows and answers
+
+- how much of a batch has left the network (dispensed + withdrawn) compared to
+  its supply, which is what IMPOSSIBLE_QUANTITY checks: the batch's opening
+  stock (initial_quantity, or what the initial seed receipts left on hand if
+  that is more) plus what was restocked under the batch afterwards
+- where a batch's stock is right now, without scanning inventory or movements
+
+Changed batches are collected until take_dirty(), the rows for the batch_ledger
+and batch_stock tables (db/schema.sql) come from ledger_rows()/stock_rows().
+"""
+
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from medguard.utils.movements import movement_rows
+
+LEDGER_FIELDS = ("received", "dispensed", "transferred_in", "transferred_out", "withdrawn")
+
+# movement type -> ledger field
+MOVEMENT_FIELDS = {
+    "RESTOCK": "received",
+    "DISPENSE": "dispensed",
+    "TRANSFER_IN": "transferred_in",
+    "TRANSFER_OUT": "transferred_out",
+    "EXPIRY_WITHDRAW": "withdrawn",
+}
+
+_FIELD_INDEX = {
+    movement_type: LEDGER_FIELDS.index(field)
+    for movement_type, field in MOVEMENT_FIELDS.items()
+}
+_RECEIVED = LEDGER_FIELDS.index("received")
+_DISPENSED = LEDGER_FIELDS.index("dispensed")
+_WITHDRAWN = LEDGER_FIELDS.index("withdrawn")
+
+# receipts of the opening stock, not new supply
+SEED_SOURCE = "INITIAL_SEED"
+
+_MOVEMENT_FIELDS = (
+    "batch_id",
+    "facility_id",
+    "movement_type",
+    "quantity_change",
+    "source",
+    "quantity_after",
+)
+
+
+def _zero_totals() -> List[int]:
+    return [0] * len(LEDGER_FIELDS)
+
+
+class BatchLedger:
+    """received / dispensed / transferred / withdrawn totals and stock locations per batch."""
+
+    def __init__(self, batches: List[Dict]):
+        self.initial_quantity = {b["batch_id"]: b["initial_quantity"] for b in batches}
+
+        self.totals: Dict[str, List[int]] = defaultdict(_zero_totals)  # picklable
+        self.stock: Dict[str, Dict[str, int]] = defaultdict(dict)  # batch -> facility -> qty
+        self.opening: Dict[str, int] = defaultdict(int)  # on hand after the seed receipts
+        self.restocked: Dict[str, int] = defaultdict(int)  # received after the initial seed
+
+        self.outflow_changed: Set[str] = set()  # batches to check against their supply
+        self.dirty: Set[str] = set()  # batches changed since the last take_dirty()
+
+    def record(
+        self,
+        batch_id: str,
+        facility_id: str,
+        movement_type: str,
+        quantity_change: int,
+        source: str | None = None,
+        quantity_after: int | None = None,
+    ) -> None:
+        """apply one movement."""
+        index = _FIELD_INDEX.get(movement_type)
+        if index is None:
+            return
+
+        self.totals[batch_id][index] += abs(quantity_change)
+        stock = self.stock[batch_id]
+        stock[facility_id] = stock.get(facility_id, 0) + quantity_change
+
+        if index == _DISPENSED or index == _WITHDRAWN:
+            self.outflow_changed.add(batch_id)
+        elif index == _RECEIVED and source == SEED_SOURCE:
+            # the engine books seed receipts on top of the rows' opening
+            # quantity, what is on hand afterwards is the opening stock
+            self.opening[batch_id] += (
+                quantity_after if quantity_after is not None else abs(quantity_change)
+            )
+        elif index == _RECEIVED:
+            self.restocked[batch_id] += abs(quantity_change)
+        self.dirty.add(batch_id)
+
+    def update(self, movements, start: int = 0) -> None:
+        """apply the movements from position start on."""
+        for row in movement_rows(movements, _MOVEMENT_FIELDS, start, tuple(MOVEMENT_FIELDS)):
+            self.record(*row)
+
+    def balance(self, batch_id: str) -> Dict[str, int]:
+        """the ledger totals of a batch by field name."""
+        return dict(zip(LEDGER_FIELDS, self.totals.get(batch_id) or _zero_totals()))
+
+    def outflow(self, batch_id: str) -> int:
+        """units of the batch that left the network (dispensed + withdrawn)."""
+        totals = self.totals.get(batch_id)
+        if totals is None:
+            return 0
+        return totals[_DISPENSED] + totals[_WITHDRAWN]
+
+    def supply(self, batch_id: str) -> int:
+        """units of the batch that entered the network: opening stock plus later restocks."""
+        opening = max(self.initial_quantity.get(batch_id, 0), self.opening.get(batch_id, 0))
+        return opening + self.restocked.get(batch_id, 0)
+
+    def where(self, batch_id: str) -> Dict[str, int]:
+        """facility_id -> units of the batch it holds, facilities with stock only."""
+        return {
+            facility_id: quantity
+            for facility_id, quantity in self.stock.get(batch_id, {}).items()
+            if quantity > 0
+        }
+
+    def over_supply(self, multiplier: float = 1) -> List[str]:
+        """
+        Batches whose outflow exceeds multiplier x their supply, among those
+        whose outflow changed since the last call.
+        """
+        found = []
+        for batch_id in sorted(self.outflow_changed):
+            initial = self.initial_quantity.get(batch_id)
+            if initial and self.outflow(batch_id) > self.supply(batch_id) * multiplier:
+                found.append(batch_id)
+        self.outflow_changed.clear()
+        return found
+
+    def take_dirty(self) -> Set[str]:
+        """batches changed since the last call."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def ledger_rows(self, batch_ids: Iterable[str]) -> List[Dict]:
+        """batch_ledger rows of the given batches."""
+        return [
+            {"batch_id": batch_id, **dict(zip(LEDGER_FIELDS, self.totals[batch_id]))}
+            for batch_id in batch_ids
+        ]
+
+    def stock_rows(self, batch_ids: Iterable[str]) -> List[Dict]:
+        """batch_stock rows of the given batches."""
+        return [
+            {"batch_id": batch_id, "facility_id": facility_id, "quantity": quantity}
+            for batch_id in batch_ids
+            for facility_id, quantity in self.stock[batch_id].items()
+        ]
@@ -0,0 +1,232 @@
+"""
+Compact event and anomaly records.
+
+Detectors build many candidates that dedupe then throws away, so a record only
+stores what it was created from: its run id and sequence number, datetimes and
+a details template with its arguments. The id string, ISO timestamps and details text are
+rendered when the record is read, serialized or shown to the agent.
+
+Records keep the dict interface of the original event / anomaly dicts
+(record["event_type"], .get(), dict(record), inserting into SQLite), to_dict()
+gives a plain dict for JSON.
+"""
+
+from abc import abstractmethod
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Dict
+import time
+
+from medguard.utils.ids import IdSequence, run_id
+
+# ids are the primary keys of the events and anomalies tables: EVT_<run id>_<n>
+# and ANOM_<run id>_<n> from one sequence, see utils/ids.py
+_record_ids = IdSequence()
+
+
+def set_record_id_start(start: int):
+    """continue the current run's record ids from start, e.g. after a checkpoint."""
+    _record_ids.set_position(start)
+
+
+def record_id_position() -> int:
+    """number the next record id will get, for checkpoints."""
+    return _record_ids.position()
+
+
+class _Record(MutableMapping):
+    """
+    shared storage of Event and Anomaly, keys are renamed by the subclasses.
+    MutableMapping makes this an ABC, a subclass without _get() cannot be created.
+    """
+
+    __slots__ = (
+        "run",
+        "id",
+        "type",
+        "severity",
+        "facility_id",
+        "med_id",
+        "batch_id",
+        "time",
+        "details_template",
+        "details_args",
+        "payload",
+        "is_active",
+        "extra",
+    )
+
+    KEYS = ()
+
+    def __init__(
+        self,
+        record_type: str,
+        severity: str,
+        facility_id: str | None,
+        med_id: str | None,
+        batch_id: str | None,
+        timestamp: datetime,
+        details: str,
+        details_args: tuple | None,
+        payload: Dict | None,
+    ):
+        self.run = run_id()
+        self.id = _record_ids.next()
+        self.type = record_type
+        self.severity = severity
+        self.facility_id = facility_id
+        self.med_id = med_id
+        self.batch_id = batch_id
+        self.time = timestamp
+        self.details_template = details
+        self.details_args = details_args
+        self.payload = payload or {}
+        self.is_active = True
+        self.extra = None  # keys set later, e.g. resolved_at
+
+    @property
+    def details(self) -> str:
+        if self.details_args is None:
+            return self.details_template
+        return self.details_template.format(*self.details_args)
+
+    @abstractmethod
+    def _get(self, key: str):
+        """value of key rendered from the stored fields, _MISSING if there is none."""
+
+    def __getitem__(self, key: str):
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        value = self._get(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value):
+        if key == "is_active":
+            self.is_active = value
+            return
+        if self.extra is None:
+            self.extra = {}
+        self.extra[key] = value
+
+    def __delitem__(self, key: str):
+        if self.extra is None or key not in self.extra:
+            raise KeyError(key)
+        del self.extra[key]
+
+    def __iter__(self):
+        yield from self.KEYS
+        if self.extra is not None:
+            yield from (key for key in self.extra if key not in self.KEYS)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict:
+        """plain dict with every field rendered."""
+        return dict(self.items())
+
+
+_MISSING = object()
+
+
+class Event(_Record):
+    """an event record, same keys as the event dicts of create_event."""
+
+    __slots__ = ("detected",)
+
+    KEYS = (
+        "event_id",
+        "event_type",
+        "severity",
+        "facility_id",
+        "med_id",
+        "batch_id",
+        "timestamp",
+        "detected_at",
+        "details",
+        "data",
+        "source",
+        "is_active",
+    )
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        # when the agent wakes up and detects the event, a float until read
+        self.detected = time.time()
+
+    def _get(self, key: str):
+        if key == "event_id":
+            return f"EVT_{self.run}_{self.id}"
+        if key == "event_type":
+            return self.type
+        if key == "severity":
+            return self.severity
+        if key == "facility_id":
+            return self.facility_id
+        if key == "med_id":
+            return self.med_id
+        if key == "batch_id":
+            return self.batch_id
+        if key == "timestamp":
+            return self.time.isoformat()  # when event occured
+        if key == "detected_at":
+            return datetime.fromtimestamp(self.detected).isoformat()
+        if key == "details":
+            return self.details
+        if key == "data":
+            return self.payload
+        if key == "source":
+            return "SIMULATION"
+        if key == "is_active":
+            return self.is_active
+        return _MISSING
+
+
+class Anomaly(_Record):
+    """an anomaly record, same keys as the anomaly dicts of create_anomaly."""
+
+    __slots__ = ()
+
+    KEYS = (
+        "anomaly_id",
+        "anomaly_type",
+        "severity",
+        "facility_id",
+        "med_id",
+        "batch_id",
+        "timestamp",
+        "details",
+        "evidence",
+        "source",
+        "is_active",
+    )
+
+    def _get(self, key: str):
+        if key == "anomaly_id":
+            return f"ANOM_{self.run}_{self.id}"
+        if key == "anomaly_type":
+            return self.type
+        if key == "severity":
+            return self.severity
+        if key == "facility_id":
+            return self.facility_id
+        if key == "med_id":
+            return self.med_id
+        if key == "batch_id":
+            return self.batch_id
+        if key == "timestamp":
+            return self.time.isoformat()
+        if key == "details":
+            return self.details
+        if key == "evidence":
+            return self.payload
+        if key == "source":
+            return "SIMULATION"
+        if key == "is_active":
+            return self.is_active
+        return _MISSING
@@ -0,0 +1,240 @@
+"""
+Scaling benchmarks.
+
+Builds synthetic networks (data/generators/network.py) with multiples of the
+seed network's facility count and times:
+
+- SimulationEngine.initialize / run  -> simulated hours/sec, movements/sec
+- generate_events / generate_anomalies over the run's final state
+- insert_movements / insert_events / insert_anomalies into a fresh database
+- get_facility_context on a sample of facilities
+
+Each scale runs in its own process so the reported peak memory (max RSS) is
+that scale's alone.
+
+    python -m medguard.scripts.benchmark --scales 1 10 100 --output bench.json
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+
+from medguard.context.facility_context import get_facility_context
+from medguard.db.database import (
+    init_database,
+    get_connection_to_db,
+    insert_medications,
+    insert_companies,
+    insert_facilities,
+    insert_brands,
+    insert_batches,
+    insert_inventory,
+    insert_movements,
+    insert_events,
+    insert_anomalies,
+)
+from medguard.data.generators.network import generate_network
+from medguard.data.seed.facilities_data import facilities_data
+from medguard.data.seed.medications_data import medications_data
+from medguard.detection.events import generate_events
+from medguard.detection.anomalies import generate_anomalies
+from medguard.simulation.engine import SimulationEngine, START_TIME, END_TIME
+
+DEFAULT_SCALES = [1, 10, 100]
+# movements written by the insert benchmark, the run itself can be much larger
+DB_INSERT_LIMIT = 200_000
+CONTEXT_SAMPLE = 20
+
+SEED_FACILITIES = len(facilities_data)
+SEED_MEDICATIONS = len(medications_data)
+
+
+def build_network(scale: int) -> Dict:
+    """synthetic network with scale times the seed facilities and the seed medication count."""
+    return generate_network(
+        n_facilities=SEED_FACILITIES * scale, n_medications=SEED_MEDICATIONS
+    )
+
+
+def timed(fn: Callable, *args, **kwargs):
+    """(result, seconds)"""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _per_second(count: float, seconds: float) -> float:
+    return count / seconds if seconds > 0 else float("inf")
+
+
+def _peak_memory_mb() -> float:
+    # ru_maxrss is KiB on linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def bench_engine(network: Dict, start_time: datetime, end_time: datetime) -> Dict:
+    engine = SimulationEngine(
+        inventory=network["inventory"],
+        medications=network["medications"],
+        facilities=network["facilities"],
+        batches=network["batches"],
+        start_time=start_time,
+        end_time=end_time,
+        vectorized=True,
+        seed=42,
+        verbose=False,
+    )
+    _, init_seconds = timed(engine.initialize)
+    result, run_seconds = timed(engine.run)
+
+    simulated_hours = (end_time - start_time).total_seconds() / 3600
+    movements = len(result["movements"])
+    return {
+        "engine": engine,
+        "result": result,
+        "stats": {
+            "initialize_s": init_seconds,
+            "run_s": run_seconds,
+            "movements": movements,
+            "events": len(result["events"]),
+            "anomalies": len(result["anomalies"]),
+            "sim_hours_per_s": _per_second(simulated_hours, run_seconds),
+            "movements_per_s": _per_second(movements, run_seconds),
+        },
+    }
+
+
+def bench_detectors(network: Dict, result: Dict, current_time: datetime) -> Dict:
+    events, events_seconds = timed(
+        generate_events,
+        inventory=result["final_inventory"],
+        movements=result["movements"],
+        medications=network["medications"],
+        current_time=current_time,
+    )
+    anomalies, anomalies_seconds = timed(
+        generate_anomalies,
+        inventory=result["final_inventory"],
+        movements=result["movements"],
+        events=events,
+        facilities=network["facilities"],
+        batches=network["batches"],
+        current_time=current_time,
+    )
+    return {
+        "generate_events_s": events_seconds,
+        "generate_events_found": len(events),
+        "generate_anomalies_s": anomalies_seconds,
+        "generate_anomalies_found": len(anomalies),
+    }
+
+
+def bench_database(network: Dict, result: Dict, db_path: Path) -> Dict:
+    init_database(db_path)
+    conn = get_connection_to_db(db_path)
+
+    insert_medications(network["medications"], conn)
+    insert_companies(network["companies"], conn)
+    insert_facilities(network["facilities"], conn)
+    insert_brands(network["brands"], conn)
+    insert_batches(network["batches"], conn)
+    _, inventory_seconds = timed(insert_inventory, network["inventory"], conn)
+    conn.commit()
+
+    movements = result["movements"].to_dicts(0, DB_INSERT_LIMIT)
+    _, movements_seconds = timed(insert_movements, movements, conn)
+    _, events_seconds = timed(insert_events, result["events"], conn)
+    _, anomalies_seconds = timed(insert_anomalies, result["anomalies"], conn)
+    conn.commit()
+    conn.close()
+
+    return {
+        "insert_inventory_rows_per_s": _per_second(
+            len(network["inventory"]), inventory_seconds
+        ),
+        "insert_movements_rows": len(movements),
+        "insert_movements_rows_per_s": _per_second(len(movements), movements_seconds),
+        "insert_events_rows_per_s": _per_second(len(result["events"]), events_seconds),
+        "insert_anomalies_rows_per_s": _per_second(
+            len(result["anomalies"]), anomalies_seconds
+        ),
+    }
+
+
+def bench_facility_context(network: Dict, db_path: Path) -> Dict:
+    facilities = network["facilities"]
+    step = max(1, len(facilities) // CONTEXT_SAMPLE)
+    sample = [f["facility_id"] for f in facilities[::step][:CONTEXT_SAMPLE]]
+
+    _, seconds = timed(lambda: [get_facility_context(fid, db_path) for fid in sample])
+    return {"facility_context_ms": 1000 * seconds / len(sample)}
+
+
+def run_scale(
+    scale: int,
+    start_time: datetime = START_TIME,
+    end_time: datetime = END_TIME,
+) -> Dict:
+    """every benchmark on one network size."""
+    network, build_seconds = timed(build_network, scale)
+    stats = {
+        "scale": scale,
+        "facilities": len(network["facilities"]),
+        "batches": len(network["batches"]),
+        "inventory_rows": len(network["inventory"]),
+        "build_network_s": build_seconds,
+    }
+
+    engine_run = bench_engine(network, start_time, end_time)
+    stats.update(engine_run["stats"])
+    stats.update(bench_detectors(network, engine_run["result"], end_time))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "benchmark.db"
+        stats.update(bench_database(network, engine_run["result"], db_path))
+        stats.update(bench_facility_context(network, db_path))
+
+    stats["peak_memory_mb"] = _peak_memory_mb()
+    return stats
+
+
+def run_benchmarks(
+    scales: List[int] = DEFAULT_SCALES,
+    start_time: datetime = START_TIME,
+    end_time: datetime = END_TIME,
+) -> List[Dict]:
+    results = []
+    for scale in scales:
+        # fresh process per scale so max RSS is not carried over
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            stats = pool.submit(run_scale, scale, start_time, end_time).result()
+        print_stats(stats)
+        results.append(stats)
+    return results
+
+
+def print_stats(stats: Dict):
+    print(f"--- scale {stats['scale']}x ---")
+    for key, value in stats.items():
+        if isinstance(value, float):
+            value = f"{value:,.2f}"
+        print(f"  {key:32} {value}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MedGuard scaling benchmarks")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES)
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
@@ -0,0 +1,109 @@
+"""
+Engine checkpoints.
+
+A checkpoint is the full state of a SimulationEngine between two events: clock,
+event queue heap, inventory rows (quantities and any rows added by transfers),
+restocked set, injections, both RNG streams, the detectors' running state and
+the columnar movement log still in memory. Caches derived from the facilities
+table (the anomaly engine's distance matrix and road travel times) are left out
+and rebuilt on load. It is pickled and zlib-compressed into one file, written
+atomically so a crash while saving keeps the previous checkpoint intact.
+
+The run id and the movement and record (event / anomaly) id counters are
+process-wide (utils/ids.py), they are saved with the engine and restored on load
+so resumed runs keep numbering where they stopped, in the same run.
+
+A SQLite sink is not part of the state; pass a new one to resume(). The engine
+flushes its sink before every checkpoint, so the database holds exactly the
+movements the checkpoint says were written.
+"""
+
+from pathlib import Path
+from typing import Dict, List
+import os
+import pickle
+import zlib
+
+import numpy as np
+
+from medguard.data.generators.movements import (
+    movement_id_position,
+    set_movement_id_start,
+)
+from medguard.detection.records import record_id_position, set_record_id_start
+from medguard.utils.ids import new_run, run_id
+
+CHECKPOINT_VERSION = 1
+
+
+def dumps(engine) -> bytes:
+    """engine -> compact bytes."""
+    state = {
+        "version": CHECKPOINT_VERSION,
+        "run_id": run_id(),
+        "movement_id": movement_id_position(),
+        "record_id": record_id_position(),
+        "engine": engine,
+    }
+    return zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def loads(data: bytes, restore_movement_ids: bool = True):
+    """bytes -> engine, without a sink."""
+    state = pickle.loads(zlib.decompress(data))
+    if state["version"] != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version {state['version']}")
+
+    if restore_movement_ids:
+        if state["run_id"] != run_id():
+            new_run(state["run_id"])
+        set_movement_id_start(max(state["movement_id"], movement_id_position()))
+        set_record_id_start(max(state["record_id"], record_id_position()))
+    return state["engine"]
+
+
+def save_checkpoint(engine, path: Path) -> Path:
+    """write a checkpoint of engine to path."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(dumps(engine))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint(path: Path, sink=None):
+    """
+    Load an engine from a checkpoint file.
+
+    Args:
+        sink: SQLiteSink to stream the rest of the run to
+    """
+    with open(path, "rb") as f:
+        engine = loads(f.read())
+    engine.sink = sink
+    return engine
+
+
+def resume(path: Path, sink=None) -> Dict:
+    """continue a checkpointed run to its end_time and return engine.run()'s result."""
+    engine = load_checkpoint(path, sink=sink)
+    return engine.run()
+
+
+def fork(engine, seeds: List[int | np.random.SeedSequence]) -> List:
+    """
+    Independent copies of a (warmed-up) engine, one per seed, for what-if branches.
+
+    Every branch gets its own RNG streams from its seed, so branches diverge from
+    the shared state instead of replaying the same draws.
+    """
+    data = dumps(engine)
+    branches = []
+    for seed in seeds:
+        branch = loads(data, restore_movement_ids=False)
+        branch.reseed(seed)
+        branches.append(branch)
+    return branches
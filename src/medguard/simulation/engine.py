@@ -3,17 +3,36 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Callable
 import random
 import heapq
+import time
 import numpy as np
 
-from medguard.data.generators.movements import dispense, expiry_withdraw, restock
+from medguard.data.generators.movements import (
+    DISPENSE_REFERENCE_PREFIX,
+    movement_id_prefix,
+    dispense,
+    bulk_dispense,
+    expiry_withdraw,
+    restock,
+)
 from medguard.data.generators.inventory import generate_inventory
 from medguard.data.generators.medications import generate_medications
 from medguard.data.generators.brands import generate_brands
 from medguard.data.generators.batches import generate_batches
 from medguard.data.generators.companies import generate_companies
 from medguard.data.generators.facilities import generate_facilities
-from medguard.detection.events import generate_events
-from medguard.detection.anomalies import generate_anomalies
+from medguard.detection.events import EventDetector
+from medguard.detection.anomalies import AnomalyEngine
+from medguard.simulation.inventory_state import InventoryArrays, ExpiryCalendar
+from medguard.simulation.movement_log import MovementLog, to_seconds
+from medguard.simulation.sink import SQLiteSink
+from medguard.simulation.checkpoint import save_checkpoint
+from medguard.simulation.metrics import SimulationMetrics
+from medguard.simulation.scenarios import (
+    DEMO_SCENARIOS,
+    counterfeit_batch_injection,
+    geographic_injection,
+    impossible_quantity_injection,
+)
 
 
 START_TIME = datetime(2026, 1, 3, 0, 0, 0)
@@ -24,8 +43,31 @@ FACILITY_OPEN_HOUR = 8
 FACILITY_CLOSE_HOUR = 18
 AGENT_CYCLE_HOURS = 4
 
+# teaching hospitals dispense more
+DISPENSE_MULTIPLIERS = {
+    "TEACHING_HOSPITAL": 2.0,
+    "GENERAL_HOSPITAL": 1.5,
+    "COMMUNITY_PHARMACY": 1.0,
+    "PRIMARY_HEALTH_CENTER": 0.5,
+}
+# expected hourly demand below this is treated as no demand
+MIN_EXPECTED_DISPENSE = 0.1
+
+# inventory fields copied onto every movement of a row
+INVENTORY_CODE_FIELDS = ["inventory_id", "facility_id", "batch_id", "med_id"]
+
 
 # event queue
+# same-time events run ticks first, then agent cycles, then everything else
+EVENT_PRIORITY = {
+    "FAST_FORWARD_STEP": 0,
+    "HOURLY_TICK": 0,
+    "EXPIRY_CHECK": 0,
+    "AGENT_CYCLE": 1,
+}
+DEFAULT_EVENT_PRIORITY = 2
+
+
 class EventQueue:
     """priority queue for simulation events."""
 
@@ -34,12 +76,13 @@ class EventQueue:
         self.counter = 0  # tie breaker for same timestamps
 
     def push(self, time: datetime, event_type: str, data: Dict):
-        heapq.heappush(self.heap, (time, self.counter, event_type, data))
+        priority = EVENT_PRIORITY.get(event_type, DEFAULT_EVENT_PRIORITY)
+        heapq.heappush(self.heap, (time, priority, self.counter, event_type, data))
         self.counter += 1
 
     def pop(self):
         if self.heap:
-            time, _, event_type, data = heapq.heappop(self.heap)
+            time, _, _, event_type, data = heapq.heappop(self.heap)
             return time, event_type, data
         return None
 
@@ -62,28 +105,48 @@ def is_facility_open(hour: int) -> bool:
     return FACILITY_OPEN_HOUR <= hour < FACILITY_CLOSE_HOUR
 
 
-def calculate_dispense_quantity(medication: Dict, facility_type: str) -> int:
+def next_tick_time(current: datetime, skip_closed_hours: bool = False) -> datetime:
     """
-    Calculate realistic dispense quantity based on:
-    - Medication base demand
-    - Facility type (teaching hospitals dispense more)
-    - Random variation (Poisson distribution)
+    Time of the tick after current. With skip_closed_hours the closed hours
+    collapse into a single tick at midnight, where expiry dates roll over.
+    Stock restocked onto expired rows inside a collapsed range gets its own
+    EXPIRY_CHECK, see SimulationEngine._rearm_expiry.
     """
+    following = current + TIME_STEP
+    if not skip_closed_hours or following.hour == 0 or is_facility_open(following.hour):
+        return following
+    if following.hour < FACILITY_OPEN_HOUR:
+        return following.replace(hour=FACILITY_OPEN_HOUR)
+    return following.replace(hour=0) + timedelta(days=1)
+
+
+def expected_hourly_dispense(medication: Dict, facility_type: str) -> float:
+    """expected units dispensed per open hour for a medication at a facility type."""
     base_demand = medication["base_demand"]
     # divide by 30 to get monthly and by 10 for 10 hour working period
     hourly_demand = base_demand / 30 / 10
 
-    multipliers = {
-        "TEACHING_HOSPITAL": 2.0,
-        "GENERAL_HOSPITAL": 1.5,
-        "COMMUNITY_PHARMACY": 1.0,
-        "PRIMARY_HEALTH_CENTER": 0.5,
-    }
-    multiplier = multipliers.get(facility_type, 1.0)
+    multiplier = DISPENSE_MULTIPLIERS.get(facility_type, 1.0)
+    return hourly_demand * multiplier
 
+
+def calculate_dispense_quantity(
+    medication: Dict,
+    facility_type: str,
+    generator: np.random.Generator | None = None,
+) -> int:
+    """
+    Calculate realistic dispense quantity based on:
+    - Medication base demand
+    - Facility type (teaching hospitals dispense more)
+    - Random variation (Poisson distribution)
+
+    generator defaults to the module level rng.
+    """
+    generator = generator or rng
     # poisson distribution for realistic variation
-    expected = hourly_demand * multiplier
-    return int(rng.poisson(expected)) if expected > 0.1 else 0
+    expected = expected_hourly_dispense(medication, facility_type)
+    return int(generator.poisson(expected)) if expected > MIN_EXPECTED_DISPENSE else 0
 
 
 def calculate_restock_quantity(inventory: Dict) -> int:
@@ -101,7 +164,40 @@ class SimulationEngine:
         batches: List[Dict],
         start_time: datetime,
         end_time: datetime,
+        vectorized: bool = False,
+        sink: SQLiteSink | None = None,
+        seed: int | np.random.SeedSequence | None = None,
+        verbose: bool = True,
+        checkpoint_path: str | None = None,
+        checkpoint_every: timedelta | None = None,
+        skip_closed_hours: bool = False,
+        metrics: SimulationMetrics | None = None,
+        fast_forward: timedelta | None = None,
+        consumption_every_tick: bool = False,
     ):
+        """
+        Args:
+            vectorized: keep inventory state in numpy columns and dispense a whole
+                tick with one batched poisson draw instead of one draw per row
+            sink: stream movements, events and anomalies to SQLite after every
+                agent cycle and keep only what the detectors still need in memory
+            seed: give the engine its own numpy and python RNG streams so several
+                engines can run independently; None shares the module level rng
+                and the global random module
+            verbose: print injections and detected anomalies
+            checkpoint_path: file to write checkpoints to, see simulation/checkpoint.py
+            checkpoint_every: simulated time between checkpoints
+            skip_closed_hours: replace the overnight ticks, which only check
+                expiry, with one expiry tick at midnight (plus an expiry check
+                an hour after a restock onto an expired row)
+            metrics: record handler and detector timings into this object
+            fast_forward: advance in steps of this size (e.g. a day) with one
+                aggregated dispense draw and one rolled-up movement per row and
+                one agent cycle per step; steps with a scheduled injection and
+                the step after it run hourly. Implies vectorized.
+            consumption_every_tick: check RAPID_CONSUMPTION after every open
+                hour's dispensing instead of only in the agent cycle
+        """
         self.inventory = inventory
         self.medications = medications
         self.facilities = facilities
@@ -109,30 +205,175 @@ class SimulationEngine:
         self.start_time = start_time
         self.end_time = end_time
         self.current_time = start_time
+        self.verbose = verbose
+        self.skip_closed_hours = skip_closed_hours
+        self.fast_forward = fast_forward
+        self.consumption_every_tick = consumption_every_tick
+        self.step_end = None  # end of the current fast-forward step
+        self.schedule_agent_cycles = True
+
+        # random streams
+        if seed is None:
+            self.rng = rng
+            self.random = random
+        else:
+            self.reseed(seed)
 
         # Lookups
         self.med_lookup = {m["med_id"]: m for m in medications}
         self.facility_lookup = {f["facility_id"]: f for f in facilities}
-        self.inventory_lookup = {inv["inventory_id"]: inv for inv in inventory}
+        # inventory indexes, rows in inventory order
+        self.inventory_lookup = {}
+        self.inventory_rows = {}  # inventory_id -> row index
+        self.inventory_by_facility = defaultdict(list)
         self.inventory_by_facility_med = defaultdict(list)
-        for inv in inventory:
-            key = (inv["facility_id"], inv["med_id"])
-            self.inventory_by_facility_med[key].append(inv)
+        self.inventory_by_batch = defaultdict(list)
+        for row, inv in enumerate(inventory):
+            self._index_inventory_row(row, inv)
+
+        # columnar inventory state for the vectorized mode
+        self.vectorized = vectorized or fast_forward is not None
+        self.inventory_arrays = None
+        if self.vectorized:
+            self.inventory_arrays = self._build_inventory_arrays()
+
+        # expiry dates parsed once, ticks only touch rows that expire or are rearmed
+        self.expiry_calendar = ExpiryCalendar(inventory)
 
         # Event queue
         self.event_queue = EventQueue()
 
         # Logs
-        self.movements_log: List[Dict] = []
+        self.movements_log = MovementLog()  # columnar, iterates as movement dicts
+        self.inventory_codes = None  # movement log codes per inventory row, built on first use
         self.events_log: List[Dict] = []
         self.anomalies_log: List[Dict] = []
+        self.resolved_events: List[Dict] = []  # resolved since the last sink write
+        self.new_batches: List[Dict] = []  # registered since the last sink write
+
+        # detectors keep running state between agent cycles
+        self.event_detector = EventDetector(medications)
+        self.anomaly_engine = AnomalyEngine(facilities, batches)
+
+        # optional instrumentation
+        self.metrics = metrics
+        self.event_detector.metrics = metrics
+        self.anomaly_engine.metrics = metrics
+
+        # streaming persistence
+        self.sink = sink
+        self.sink_position = 0  # movements already handed to the sink
 
         # Tracking
         self.restocked_inventory = set()  # Prevent duplicate restocks
         self.last_agent_cycle = None
+        self.injections: List[Dict] = []  # injected anomalies, for detection latency
+        self.last_injection_at = None  # time the latest injection event was handled
+
+        # periodic checkpoints
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.next_checkpoint = (
+            start_time + checkpoint_every if checkpoint_path and checkpoint_every else None
+        )
+
+    def reseed(self, seed: int | np.random.SeedSequence):
+        """give the engine its own numpy and python RNG streams from seed."""
+        seed_sequence = np.random.SeedSequence(seed) if isinstance(seed, int) else seed
+        self.rng = np.random.default_rng(seed_sequence)
+        self.random = random.Random(int(seed_sequence.generate_state(1)[0]))
+
+    def __getstate__(self):
+        # the sink holds a connection and self.random may be the random module,
+        # keep only the RNG states
+        state = dict(self.__dict__)
+        state["sink"] = None
+        state["rng"] = self.rng.bit_generator.state
+        state["random"] = self.random.getstate()
+        return state
+
+    def __setstate__(self, state):
+        rng_state = state.pop("rng")
+        random_state = state.pop("random")
+        self.__dict__.update(state)
+
+        # a restored engine always owns its streams, continuing from the saved state
+        self.rng = np.random.default_rng()
+        self.rng.bit_generator.state = rng_state
+        self.random = random.Random()
+        self.random.setstate(random_state)
+
+    def _build_inventory_arrays(self) -> InventoryArrays:
+        facility_types = {
+            f["facility_id"]: f["facility_type"] for f in self.facilities
+        }
+        hourly_demand = []
+        for inv in self.inventory:
+            med = self.med_lookup.get(inv["med_id"])
+            facility_type = facility_types.get(inv["facility_id"])
+            if not med or not facility_type:
+                hourly_demand.append(0.0)
+                continue
+            expected = expected_hourly_dispense(med, facility_type)
+            hourly_demand.append(expected if expected > MIN_EXPECTED_DISPENSE else 0.0)
+
+        return InventoryArrays(self.inventory, facility_types, hourly_demand)
+
+    def _index_inventory_row(self, row: int, inv: Dict):
+        self.inventory_lookup[inv["inventory_id"]] = inv
+        self.inventory_rows[inv["inventory_id"]] = row
+        self.inventory_by_facility[inv["facility_id"]].append(inv)
+        self.inventory_by_facility_med[(inv["facility_id"], inv["med_id"])].append(inv)
+        self.inventory_by_batch[inv["batch_id"]].append(inv)
+
+    def add_inventory_row(self, inv: Dict):
+        """start tracking a new inventory row, e.g. a batch transferred into a facility."""
+        self.inventory.append(inv)
+        self._index_inventory_row(len(self.inventory) - 1, inv)
+        self.expiry_calendar.add(len(self.inventory) - 1, inv.get("expiry_date"))
+        if self.inventory_arrays is not None:
+            self.inventory_arrays = self._build_inventory_arrays()
+        self.inventory_codes = None
+
+    def _sync_inventory(self, inv: Dict):
+        """mirror a quantity change on an inventory dict into the numpy columns."""
+        if self.inventory_arrays is not None:
+            self.inventory_arrays.sync(inv)
+
+    def _rearm_expiry(self, inv: Dict):
+        """stock was added to inv, have the next tick withdraw it again if the row has expired."""
+        calendar = self.expiry_calendar
+        first = not calendar.rearmed
+        if not calendar.rearm(self.inventory_rows[inv["inventory_id"]]) or not first:
+            return
 
-    def initialize(self):
-        """Set up initial state and schedule initial events."""
+        # with skip_closed_hours there is no tick in the next hour, check expiry
+        # then anyway so agent cycles before the morning tick see what the
+        # hourly ticks would leave
+        following = self.current_time + TIME_STEP
+        if (
+            self.skip_closed_hours
+            and following.hour != 0
+            and not is_facility_open(following.hour)
+        ):
+            self.event_queue.push(following, "EXPIRY_CHECK", {})
+
+    def initialize(
+        self,
+        schedule_agent_cycles: bool = True,
+        schedule_scenarios: bool = True,
+        scenarios: List[tuple] | None = None,
+    ):
+        """
+        Set up initial state and schedule initial events.
+
+        Args:
+            schedule_agent_cycles: schedule AGENT_CYCLE events, off when a
+                coordinator runs detection for several engines (sharded mode)
+            schedule_scenarios: schedule the injected demo anomalies
+            scenarios: (hours after start, event type, description) to inject,
+                defaults to DEMO_SCENARIOS
+        """
         # print("starting simulation...")
 
         # seed initial receipts
@@ -144,7 +385,7 @@ class SimulationEngine:
                 fac_id = inv["facility_id"]
 
             # 1% chance of skiping receipt to create ghost stock
-            if random.random() < 0.01:
+            if self.random.random() < 0.01:
                 continue  # no receipt, ghost stock
 
             # each facility gets receipts on a different day
@@ -162,62 +403,68 @@ class SimulationEngine:
                 timestamp=receipt_time,
                 source="INITIAL_SEED",
             )
+            self._sync_inventory(inv)
             self.movements_log.append(mov)
 
-        #  hourly ticks schedule
-        current = self.start_time
-        while current < self.end_time:
-            self.event_queue.push(current, "HOURLY_TICK", {})
-            current += timedelta(hours=1)
-
-        # agent cycles
-        current = self.start_time
-        while current < self.end_time:
-            self.event_queue.push(current, "AGENT_CYCLE", {})
-            current += timedelta(hours=AGENT_CYCLE_HOURS)
+        # recurring events: only the first tick and agent cycle are queued,
+        # each one schedules the next when it runs
+        self.schedule_agent_cycles = schedule_agent_cycles
+        if self.fast_forward:
+            self.event_queue.push(self.start_time, "FAST_FORWARD_STEP", {})
+        else:
+            self.event_queue.push(self.start_time, "HOURLY_TICK", {})
+            if schedule_agent_cycles:
+                self.event_queue.push(self.start_time, "AGENT_CYCLE", {})
 
         # 4. Schedule demo scenarios (injected anomalies)
-        self._schedule_demo_scenarios()
+        if schedule_scenarios:
+            self._schedule_demo_scenarios(DEMO_SCENARIOS if scenarios is None else scenarios)
 
         # print(f"Scheduled {self.event_queue.counter} events")
 
-    def _schedule_demo_scenarios(self):
+    def _schedule_demo_scenarios(self, scenarios: List[tuple]):
         """
         Inject specific scenarios at known times for demo purposes.
         """
-        # Scenario 1: geographic impossibility at hour 15
-        self.event_queue.push(
-            self.start_time + timedelta(hours=15),
-            "INJECT_GEOGRAPHIC_ANOMALY",
-            {"description": "Counterfeit batch appears in distant locations"},
-        )
-
-        # Scenario 2: geographic anomaly at hour 35
-        self.event_queue.push(
-            self.start_time + timedelta(hours=35),
-            "INJECT_GEOGRAPHIC_ANOMALY",
-            {"description": "Second counterfeit batch detected"},
-        )
-
-        # Scenario 3: impossible quantity at hour 50
-        self.event_queue.push(
-            self.start_time + timedelta(hours=50),
-            "INJECT_IMPOSSIBLE_QUANTITY",
-            {"description": "Batch dispensed more than existed"},
-        )
+        for hours, event_type, description in scenarios:
+            self.event_queue.push(
+                self.start_time + timedelta(hours=hours),
+                event_type,
+                {"description": description},
+            )
 
-    def run(self):
-        """Main simulation loop."""
+    def run_until(self, until: datetime):
+        """process every queued event before until (and before end_time)."""
+        until = min(until, self.end_time)
 
         while not self.event_queue.is_empty():
-            event_time, event_type, event_data = self.event_queue.pop()
-
-            if event_time >= self.end_time:
+            if self.event_queue.peek_time() >= until:
                 break
 
+            event_time, event_type, event_data = self.event_queue.pop()
             self.current_time = event_time
             self._process_event(event_type, event_data)
 
+            if self.next_checkpoint is not None and self.current_time >= self.next_checkpoint:
+                self.checkpoint()
+                while self.next_checkpoint <= self.current_time:
+                    self.next_checkpoint += self.checkpoint_every
+
+    def checkpoint(self, path: str | None = None):
+        """save the engine state between two events, flushing the sink first."""
+        if self.sink is not None:
+            self._drain_to_sink()
+            self.sink.flush()
+        return save_checkpoint(self, path or self.checkpoint_path)
+
+    def run(self):
+        """Main simulation loop."""
+        self.run_until(self.end_time)
+
+        if self.sink is not None:
+            self._drain_to_sink()
+            self.sink.flush()
+
         # print(f"Movements: {len(self.movements_log)}")
         # print(f"Events: {len(self.events_log)}")
         # print(f"Anomalies: {len(self.anomalies_log)}")
@@ -234,18 +481,91 @@ class SimulationEngine:
     def _process_event(self, event_type: str, event_data: Dict):
         """Route event to appropriate handler."""
         handlers = {
+            "FAST_FORWARD_STEP": self._handle_fast_forward_step,
             "HOURLY_TICK": self._handle_hourly_tick,
+            "EXPIRY_CHECK": self._handle_expiry_check,
             "AGENT_CYCLE": self._handle_agent_cycle,
             "INJECT_GEOGRAPHIC_ANOMALY": self._handle_inject_geographic,
             "INJECT_IMPOSSIBLE_QUANTITY": self._handle_inject_impossible_qty,
+            "INJECT_COUNTERFEIT_BATCH": self._handle_inject_counterfeit_batch,
         }
 
         handler = handlers.get(event_type)
-        if handler:
+        if not handler:
+            return
+
+        if self.metrics is None:
             handler(event_data)
+            return
+
+        movements_before = len(self.movements_log)
+        started = time.perf_counter()
+        handler(event_data)
+        self.metrics.record_event(
+            event_type,
+            time.perf_counter() - started,
+            len(self.movements_log) - movements_before,
+        )
+
+    def _schedule_next(self, event_type: str, time: datetime):
+        # in fast-forward mode recurring events stop at the end of their step
+        limit = self.end_time if self.step_end is None else self.step_end
+        if time < limit:
+            self.event_queue.push(time, event_type, {})
+
+    def _needs_hourly_step(self, step_start: datetime) -> bool:
+        """an injection scheduled in this step or handled in the previous one."""
+        if (
+            self.last_injection_at is not None
+            and self.last_injection_at >= step_start - self.fast_forward
+        ):
+            return True
+        step_end = step_start + self.fast_forward
+        return any(
+            step_start <= time < step_end
+            for time, _, _, event_type, _ in self.event_queue.heap
+            if event_type not in EVENT_PRIORITY
+        )
+
+    def _handle_fast_forward_step(self, data: Dict):
+        """
+        Advance one fast-forward step. Hourly ticks and regular agent cycles
+        when an injection is near, otherwise expiry, one agent cycle and a
+        single aggregated dispense for the open hours of the step.
+        """
+        step_start = self.current_time
+        self.step_end = min(step_start + self.fast_forward, self.end_time)
+        if self.step_end < self.end_time:
+            self.event_queue.push(self.step_end, "FAST_FORWARD_STEP", {})
+
+        if self._needs_hourly_step(step_start):
+            self.event_queue.push(step_start, "HOURLY_TICK", {})
+            if self.schedule_agent_cycles:
+                self.event_queue.push(step_start, "AGENT_CYCLE", {})
+            return
+
+        self._process_expiry()
+        if self.schedule_agent_cycles:
+            self._run_agent_cycle()
+
+        open_hours = [
+            hour
+            for hour in range(int((self.step_end - step_start) / TIME_STEP))
+            if is_facility_open((step_start + hour * TIME_STEP).hour)
+        ]
+        if open_hours:
+            # rolled-up movements are stamped at the last open hour of the step
+            self._process_dispensing_vectorized(
+                hours=len(open_hours),
+                timestamp=step_start + open_hours[-1] * TIME_STEP,
+                reason="AGGREGATED_DEMAND",
+            )
 
     def _handle_hourly_tick(self, data: Dict):
         """Process one hour of simulation."""
+        self._schedule_next(
+            "HOURLY_TICK", next_tick_time(self.current_time, self.skip_closed_hours)
+        )
         hour = self.current_time.hour
 
         # process expiry withdrawals
@@ -255,35 +575,49 @@ class SimulationEngine:
         if is_facility_open(hour):
             self._process_dispensing()
 
+            if self.consumption_every_tick:
+                self.events_log.extend(
+                    self.event_detector.detect_consumption(
+                        movements=self.movements_log, current_time=self.current_time
+                    )
+                )
+                self._collect_resolved()
+
+    def _handle_expiry_check(self, data: Dict):
+        """expiry withdrawal on its own, for a closed hour skipped by skip_closed_hours."""
+        self._process_expiry()
+
     def _process_expiry(self):
         """Remove expired stock from inventory."""
-        for inv in self.inventory:
+        for row in self.expiry_calendar.due(self.current_time):
+            inv = self.inventory[row]
             if inv["quantity"] <= 0:
                 continue
 
-            expiry_date = datetime.strptime(inv["expiry_date"], "%Y-%m-%d")
-            if self.current_time >= expiry_date:
-                mov = expiry_withdraw(
-                    inventory=inv,
-                    quantity=inv["quantity"],
-                    timestamp=self.current_time,
-                    source="SIMULATION",
-                )
-                self.movements_log.append(mov)
+            mov = expiry_withdraw(
+                inventory=inv,
+                quantity=inv["quantity"],
+                timestamp=self.current_time,
+                source="SIMULATION",
+            )
+            self._sync_inventory(inv)
+            self.movements_log.append(mov)
 
     def _process_dispensing(self):
         """
         Process dispensing for all facilities.
         Quantity varies by medication demand and facility type.
         """
+        if self.inventory_arrays is not None:
+            self._process_dispensing_vectorized()
+            return
+
         for facility in self.facilities:
             facility_id = facility["facility_id"]
             facility_type = facility["facility_type"]
 
             # all inventory for this facility
-            for inv in self.inventory:
-                if inv["facility_id"] != facility_id:
-                    continue
+            for inv in self.inventory_by_facility.get(facility_id, []):
                 if inv["quantity"] <= 0:
                     continue
 
@@ -293,7 +627,7 @@ class SimulationEngine:
                     continue
 
                 # calculate dispense quantity
-                qty = calculate_dispense_quantity(med, facility_type)
+                qty = calculate_dispense_quantity(med, facility_type, self.rng)
 
                 if qty <= 0:
                     continue
@@ -309,9 +643,53 @@ class SimulationEngine:
                     timestamp=self.current_time,
                     source="SIMULATION",
                     reason="PATIENT_DEMAND",
+                    generator=self.rng,
                 )
                 self.movements_log.append(mov)
 
+    def _process_dispensing_vectorized(
+        self,
+        hours: int = 1,
+        timestamp: datetime | None = None,
+        reason: str = "PATIENT_DEMAND",
+    ):
+        """
+        One batched poisson draw for every inventory row, clipped against stock.
+        hours > 1 draws the demand of that many open hours as one movement per row.
+        """
+        arrays = self.inventory_arrays
+        rows, quantities = arrays.draw_dispense(self.rng, hours)
+        if len(rows) == 0:
+            return
+
+        log = self.movements_log
+        columns = bulk_dispense(arrays.quantity[rows], quantities, self.rng)
+        arrays.apply_dispense(rows, quantities)
+
+        # the movements go straight into the log's columns, no dict per row
+        inventory_codes = self._inventory_codes()
+        for name in INVENTORY_CODE_FIELDS:
+            columns[name] = inventory_codes[name][rows]
+        log.append_columns(
+            len(rows),
+            movement_id=log.strings["movement_id"].code(movement_id_prefix()),
+            reference_id=log.strings["reference_id"].code(DISPENSE_REFERENCE_PREFIX),
+            movement_type=log.strings["movement_type"].code("DISPENSE"),
+            source=log.strings["source"].code("SIMULATION"),
+            reason=log.strings["reason"].code(reason),
+            timestamp=to_seconds(timestamp or self.current_time),
+            **columns,
+        )
+
+    def _inventory_codes(self) -> Dict[str, np.ndarray]:
+        """movement log codes of the id fields of every inventory row."""
+        if self.inventory_codes is None:
+            self.inventory_codes = {
+                name: self.movements_log.intern(name, [inv[name] for inv in self.inventory])
+                for name in INVENTORY_CODE_FIELDS
+            }
+        return self.inventory_codes
+
     def _handle_agent_cycle(self, data: Dict):
         """
         Agent wakes up to:
@@ -320,38 +698,91 @@ class SimulationEngine:
         3. Detect anomalies
         """
         # print(f"[Agent Cycle] {self.current_time}")
-
-        #  generate events
-        daily_events = generate_events(
-            inventory=self.inventory,
-            movements=self.movements_log,
-            medications=self.medications,
-            current_time=self.current_time,
-            existing_events=self.events_log,
+        self._schedule_next(
+            "AGENT_CYCLE", self.current_time + timedelta(hours=AGENT_CYCLE_HOURS)
         )
-        self.events_log.extend(daily_events)
+        self._run_agent_cycle()
 
-        # process restocks: response to low stock
-        self._process_restocks(daily_events)
+    def _run_agent_cycle(self):
+        """events and restocks, then anomalies, at current_time."""
+        self.run_event_cycle()
 
         # detect anomalies
-        new_anomalies = generate_anomalies(
+        new_anomalies = self.anomaly_engine.detect(
             inventory=self.inventory,
             movements=self.movements_log,
-            events=daily_events,
-            facilities=self.facilities,
-            batches=self.batches,
             current_time=self.current_time,
-            existing_anomalies=self.anomalies_log,
         )
         self.anomalies_log.extend(new_anomalies)
 
-        if new_anomalies:
+        if self.sink is not None:
+            self._drain_to_sink()
+
+        if new_anomalies and self.verbose:
             # replace print with actual agent logic
             print(f"Detected {len(new_anomalies)} new anomalies")
             for a in new_anomalies:
                 print(f"{a['anomaly_type']}: {a['details'][:50]}...")
 
+    def run_event_cycle(self) -> List[Dict]:
+        """detect events at current_time and restock in response to low stock."""
+        #  generate events
+        daily_events = self.event_detector.detect(
+            inventory=self.inventory,
+            movements=self.movements_log,
+            current_time=self.current_time,
+            arrays=self.inventory_arrays,
+        )
+        self.events_log.extend(daily_events)
+        self._collect_resolved()
+
+        # process restocks: response to low stock
+        self._process_restocks(daily_events)
+        return daily_events
+
+    def _collect_resolved(self):
+        """
+        resolved events are updated in place, the sink has to rewrite them. A
+        resolved LOW_STOCK event makes its row eligible for restocking again.
+        """
+        resolved = self.event_detector.take_resolved()
+        for event in resolved:
+            if event["event_type"] == "LOW_STOCK":
+                self.restocked_inventory.discard((event["facility_id"], event["med_id"]))
+        self.resolved_events.extend(resolved)
+
+    def _drain_to_sink(self):
+        """
+        Hand everything new to the sink and drop from memory the movements
+        both detectors have already consumed.
+        """
+        log = self.movements_log
+        pending = {e["event_id"] for e in self.events_log}
+        ledger = self.anomaly_engine.ledger
+        changed = ledger.take_dirty()
+        self.sink.write(
+            batches=self.new_batches,
+            movements=log.to_dicts(self.sink_position),
+            events=self.events_log
+            + [e for e in self.resolved_events if e["event_id"] not in pending],
+            anomalies=self.anomalies_log,
+            ledger=ledger.ledger_rows(changed),
+            stock=ledger.stock_rows(changed),
+        )
+        self.sink_position = len(log)
+        self.events_log = []
+        self.anomalies_log = []
+        self.resolved_events = []
+        self.new_batches = []
+
+        log.discard_before(
+            min(
+                self.sink_position,
+                self.event_detector.watermark,
+                self.anomaly_engine.watermark,
+            )
+        )
+
     def _process_restocks(self, events: List[Dict]):
         """Process restocks in response to low stock events."""
         low_stock_events = [e for e in events if e["event_type"] == "LOW_STOCK"]
@@ -363,15 +794,8 @@ class SimulationEngine:
                 continue
 
             # find inventory
-            inv = next(
-                (
-                    i
-                    for i in self.inventory
-                    if i["facility_id"] == event["facility_id"]
-                    and i["med_id"] == event["med_id"]
-                ),
-                None,
-            )
+            rows = self.inventory_by_facility_med.get(inv_key)
+            inv = rows[0] if rows else None
 
             if not inv or inv["quantity"] >= inv["reorder_point"]:
                 continue
@@ -391,128 +815,73 @@ class SimulationEngine:
                 timestamp=restock_time,
                 source="SIMULATION",
             )
+            self._sync_inventory(inv)
+            self._rearm_expiry(inv)
             self.movements_log.append(mov)
 
-    def _handle_inject_geographic(self, data: Dict):
-        """Inject a geographic impossibility anomaly."""
-        print(f"[Inject] Geographic anomaly at {self.current_time}")
-
-        # random batch that has inventory
-        batches_with_inventory = [
-            inv["batch_id"] for inv in self.inventory if inv["quantity"] > 0
-        ]
-        if not batches_with_inventory:
-            return
-
-        batch_id = random.choice(batches_with_inventory)
+    def _log(self, message: str):
+        if self.verbose:
+            print(message)
 
-        # which facility has the batch?
-        source_inv = next(
-            (
-                inv
-                for inv in self.inventory
-                if inv["batch_id"] == batch_id and inv["quantity"] > 0
-            ),
-            None,
+    def _record_injection(self, anomaly_type: str, batch_id: str):
+        self.injections.append(
+            {
+                "anomaly_type": anomaly_type,
+                "batch_id": batch_id,
+                "injected_at": self.current_time,
+            }
         )
-        if not source_inv:
-            return
-
-        source_facility = self.facility_lookup.get(source_inv["facility_id"])
-        if not source_facility:
-            return
-
-        # distant facility (different state)
-        distant_facilities = [
-            f for f in self.facilities if f["state"] != source_facility["state"]
-        ]
-        if not distant_facilities:
-            return
 
-        distant = random.choice(distant_facilities)
-
-        # create a restock at the source
-        mov1 = {
-            "movement_id": f"MOV_{random.randint(100000, 999999)}",
-            "inventory_id": source_inv["inventory_id"],
-            "facility_id": source_inv["facility_id"],
-            "batch_id": batch_id,
-            "med_id": source_inv["med_id"],
-            "movement_type": "RESTOCK",
-            "quantity_change": 50,
-            "quantity_after": source_inv["quantity"] + 50,
-            "timestamp": self.current_time.isoformat(),
-            "reference_id": "ANOMALY_INJECT",
-            "source": "SIMULATION_ANOMALY",
-            "reason": "GEOGRAPHIC_TEST",
-        }
-        self.movements_log.append(mov1)
-
-        # create a restock at distant facility 1-2 hours later
-        mov2 = {
-            "movement_id": f"MOV_{random.randint(100000, 999999)}",
-            "inventory_id": f"ANOMALY_{source_inv['inventory_id']}",
-            "facility_id": distant["facility_id"],
-            "batch_id": batch_id,  # same batch id
-            "med_id": source_inv["med_id"],
-            "movement_type": "RESTOCK",
-            "quantity_change": random.randint(50, 150),
-            "quantity_after": random.randint(50, 150),
-            "timestamp": (
-                self.current_time + timedelta(hours=random.randint(1, 2))
-            ).isoformat(),
-            "reference_id": "ANOMALY_INJECT",
-            "source": "SIMULATION_ANOMALY",
-            "reason": "GEOGRAPHIC_TEST",
-        }
-        self.movements_log.append(mov2)
-
-        print(
-            f"Injected: Batch {batch_id} at {source_facility['state']} and {distant['state']}"
+    def _handle_inject_geographic(self, data: Dict):
+        """Inject a geographic impossibility anomaly."""
+        self._log(f"[Inject] Geographic anomaly at {self.current_time}")
+        injection = geographic_injection(
+            self.inventory,
+            self.inventory_by_batch,
+            self.facilities,
+            self.facility_lookup,
+            self.random,
+            self.current_time,
         )
+        self._apply_injection(injection)
 
     def _handle_inject_impossible_qty(self, data: Dict):
         """Inject an impossible quantity anomaly."""
-        print(f"[Inject] Impossible quantity at {self.current_time}")
-
-        # pick a batch
-        if not self.batches:
-            return
+        self._log(f"[Inject] Impossible quantity at {self.current_time}")
+        injection = impossible_quantity_injection(
+            self.inventory_by_batch, self.batches, self.random, self.current_time
+        )
+        self._apply_injection(injection)
 
-        batch = random.choice(self.batches)
-        batch_id = batch["batch_id"]
-        initial_qty = batch["initial_quantity"]
+    def _handle_inject_counterfeit_batch(self, data: Dict):
+        """Inject a counterfeit batch reusing a genuine batch number."""
+        self._log(f"[Inject] Counterfeit batch at {self.current_time}")
+        injection = counterfeit_batch_injection(
+            self.batches, self.facilities, self.random, self.current_time
+        )
+        self._apply_injection(injection)
 
-        # which facility has the batch?
-        inv = next((i for i in self.inventory if i["batch_id"] == batch_id), None)
-        if not inv:
+    def register_batches(self, batches: List[Dict]):
+        """
+        Batches received during the run. The batch-level anomaly checks pick
+        them up on the next agent cycle and the sink writes them before any
+        movement or ledger row that references them.
+        """
+        if not batches:
             return
-
-        # Create dispenses that exceed initial quantity
-        excess_qty = initial_qty * 12
-
-        for i in range(5):
-            mov = {
-                "movement_id": f"MOV_{random.randint(100000, 999999)}",
-                "inventory_id": inv["inventory_id"],
-                "facility_id": inv["facility_id"],
-                "batch_id": batch_id,
-                "med_id": inv["med_id"],
-                "movement_type": "DISPENSE",
-                "quantity_change": -(excess_qty // 5),
-                "quantity_after": 0,
-                "timestamp": (
-                    self.current_time + timedelta(minutes=i * 10)
-                ).isoformat(),
-                "reference_id": "ANOMALY_INJECT",
-                "source": "SIMULATION_ANOMALY",
-                "reason": "IMPOSSIBLE_QTY_TEST",
-            }
-            self.movements_log.append(mov)
-
-        print(
-            f"Injected: Batch {batch_id} dispensed {excess_qty} (initial was {initial_qty})"
-        )
+        # new list, the caller's batches may be shared (Monte Carlo workers)
+        self.batches = self.batches + batches
+        self.anomaly_engine.add_batches(batches)
+        self.new_batches.extend(batches)
+
+    def _apply_injection(self, injection: Dict | None):
+        self.last_injection_at = self.current_time
+        if not injection:
+            return
+        self.register_batches(injection.get("batches", []))
+        self.movements_log.extend(injection["movements"])
+        self._record_injection(injection["anomaly_type"], injection["batch_id"])
+        self._log(injection["message"])
 
 
 if __name__ == "__main__":
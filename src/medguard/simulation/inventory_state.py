@@ -0,0 +1,153 @@
+"""
+Inventory-side state the simulation engine keeps next to the inventory list:
+a columnar (numpy) view for the vectorized mode and an expiry calendar.
+
+The inventory dicts stay the source of truth for everything outside the engine
+(detectors, db inserts, the agent), so every write to the arrays is mirrored
+onto the matching dict and every write to a dict is pulled back with sync().
+"""
+
+from datetime import datetime
+from typing import List, Dict
+import heapq
+import numpy as np
+
+from medguard.utils.expiry import NO_EXPIRY, expiry_ordinal
+
+
+class InventoryArrays:
+    """inventory quantities, reorder points, expiry, facility types and hourly demand as numpy columns."""
+
+    def __init__(
+        self,
+        inventory: List[Dict],
+        facility_types: Dict[str, str],
+        hourly_demand: List[float],
+    ):
+        """
+        Args:
+            inventory: inventory dicts, row i of every column belongs to inventory[i]
+            facility_types: facility_id -> facility_type
+            hourly_demand: expected dispense per open hour for each inventory row
+        """
+        self.rows = inventory
+        self.row_index = {inv["inventory_id"]: i for i, inv in enumerate(inventory)}
+
+        self.quantity = np.array([inv["quantity"] for inv in inventory], dtype=np.int64)
+        self.reorder_point = np.array(
+            [inv["reorder_point"] for inv in inventory], dtype=np.int64
+        )
+
+        # facility types as small integer codes
+        self.facility_type_names = sorted(set(facility_types.values()))
+        type_codes = {name: i for i, name in enumerate(self.facility_type_names)}
+        self.facility_type = np.array(
+            [type_codes.get(facility_types.get(inv["facility_id"]), -1) for inv in inventory],
+            dtype=np.int8,
+        )
+
+        self.hourly_demand = np.asarray(hourly_demand, dtype=np.float64)
+
+        # expiry dates parsed once, NO_EXPIRY where missing or unparseable
+        self.expiry = np.array(
+            [_or_no_expiry(expiry_ordinal(inv.get("expiry_date"))) for inv in inventory],
+            dtype=np.int64,
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    def sync(self, inv: Dict):
+        """pull the quantity of one inventory dict back into the arrays after it was changed outside."""
+        i = self.row_index.get(inv["inventory_id"])
+        if i is not None:
+            self.quantity[i] = inv["quantity"]
+
+    def sync_all(self):
+        """pull every quantity back into the arrays."""
+        self.quantity[:] = [inv["quantity"] for inv in self.rows]
+
+    def draw_dispense(self, generator: np.random.Generator, hours: int = 1):
+        """
+        One batched poisson draw for every row, clipped against stock on hand.
+
+        A sum of hourly poisson draws is poisson too, so hours > 1 draws the
+        total demand of that many open hours at once.
+
+        Returns:
+            (row indexes that dispense, quantities dispensed) as numpy arrays
+        """
+        demand = generator.poisson(
+            self.hourly_demand if hours == 1 else self.hourly_demand * hours
+        )
+        qty = np.minimum(demand, self.quantity)
+        rows = np.flatnonzero(qty > 0)
+        return rows, qty[rows]
+
+    def apply_dispense(self, rows: np.ndarray, quantities: np.ndarray):
+        """subtract dispensed quantities from the quantity column and mirror them onto the dicts."""
+        self.quantity[rows] -= quantities
+        for i, quantity in zip(rows.tolist(), self.quantity[rows].tolist()):
+            self.rows[i]["quantity"] = quantity
+
+
+def _or_no_expiry(ordinal: int | None) -> int:
+    return NO_EXPIRY if ordinal is None else ordinal
+
+
+class ExpiryCalendar:
+    """
+    Min-heap of inventory rows keyed on their pre-parsed expiry date ordinal.
+
+    Expiry dates never change, so each date is parsed once. A tick only gets the
+    rows whose expiry was reached since the last tick. Stock restocked onto a row
+    that has already expired is reported with rearm() and withdrawn on the next
+    tick.
+    """
+
+    def __init__(self, inventory: List[Dict]):
+        self.heap = []
+        for i, inv in enumerate(inventory):
+            ordinal = expiry_ordinal(inv.get("expiry_date"))
+            if ordinal is not None:
+                self.heap.append((ordinal, i))
+        heapq.heapify(self.heap)
+
+        self.expired = set()  # rows popped from the heap
+        self.rearmed = set()  # expired rows that received stock again
+
+    def add(self, row: int, expiry_date: str | None):
+        """schedule a row added to the inventory after the calendar was built."""
+        ordinal = expiry_ordinal(expiry_date)
+        if ordinal is not None:
+            heapq.heappush(self.heap, (ordinal, row))
+
+    def rearm(self, row: int) -> bool:
+        """
+        stock was added to row, withdraw it again on the next tick if the row has
+        expired. Returns whether it has.
+        """
+        if row not in self.expired:
+            return False
+        self.rearmed.add(row)
+        return True
+
+    def next_expiry_ordinal(self) -> int | None:
+        """ordinal of the next expiry date still in the future, if any."""
+        if self.heap:
+            return self.heap[0][0]
+        return None
+
+    def due(self, current_time: datetime) -> List[int]:
+        """
+        row indexes, in inventory order, whose expiry date was reached since the
+        last call, plus expired rows rearmed since then.
+        """
+        today = current_time.toordinal()
+        rows = self.rearmed
+        self.rearmed = set()
+        while self.heap and self.heap[0][0] <= today:
+            _, row = heapq.heappop(self.heap)
+            self.expired.add(row)
+            rows.add(row)
+        return sorted(rows)
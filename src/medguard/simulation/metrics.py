@@ -0,0 +1,100 @@
+"""
+Simulation metrics.
+
+Optional instrumentation for SimulationEngine: pass a SimulationMetrics as
+metrics= and the engine records, per event type, the wall time of every
+handler call and the movements it emitted; the detectors record their time
+split by detector. summary() aggregates (count, total, p50, p99), dump() writes
+it as JSON so runs can be compared and report() renders it as a table.
+"""
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict
+import json
+import time
+
+import numpy as np
+
+
+def _latency_summary(seconds) -> Dict:
+    values = np.asarray(seconds, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "total_s": float(values.sum()),
+        "mean_ms": float(values.mean() * 1000),
+        "p50_ms": float(np.percentile(values, 50) * 1000),
+        "p99_ms": float(np.percentile(values, 99) * 1000),
+        "max_ms": float(values.max() * 1000),
+    }
+
+
+class SimulationMetrics:
+    """per event type and per detector timings of one run."""
+
+    def __init__(self):
+        # event type -> one entry per handler call
+        self.event_seconds = defaultdict(list)
+        self.event_movements = defaultdict(list)
+
+        # detector name -> one entry per call
+        self.detector_seconds = defaultdict(list)
+
+    def record_event(self, event_type: str, seconds: float, movements: int) -> None:
+        self.event_seconds[event_type].append(seconds)
+        self.event_movements[event_type].append(movements)
+
+    def time_detector(self, name: str, detector: Callable, *args):
+        """call detector(*args), recording its wall time under name."""
+        started = time.perf_counter()
+        found = detector(*args)
+        self.detector_seconds[name].append(time.perf_counter() - started)
+        return found
+
+    def summary(self) -> Dict:
+        events = {}
+        for event_type, seconds in self.event_seconds.items():
+            stats = _latency_summary(seconds)
+            movements = np.asarray(self.event_movements[event_type])
+            stats["movements"] = int(movements.sum())
+            stats["movements_per_call_mean"] = float(movements.mean())
+            stats["movements_per_call_max"] = int(movements.max())
+            events[event_type] = stats
+
+        detectors = {
+            name: _latency_summary(seconds)
+            for name, seconds in self.detector_seconds.items()
+        }
+
+        return {"events": events, "detectors": detectors}
+
+    def dump(self, path: Path) -> Path:
+        """write summary() as JSON."""
+        path = Path(path)
+        path.write_text(json.dumps(self.summary(), indent=2))
+        return path
+
+    def report(self) -> str:
+        """summary() as a plain text table, slowest first."""
+        summary = self.summary()
+        header = f"{'':36} {'calls':>7} {'total s':>9} {'p50 ms':>9} {'p99 ms':>9}"
+
+        lines = [header + f" {'movements':>10}"]
+        for name, s in _slowest_first(summary["events"]):
+            lines.append(_report_line(name, s) + f" {s['movements']:>10}")
+
+        lines.append(header)
+        for name, s in _slowest_first(summary["detectors"]):
+            lines.append(_report_line(name, s))
+        return "\n".join(lines)
+
+
+def _slowest_first(stats: Dict):
+    return sorted(stats.items(), key=lambda item: -item[1]["total_s"])
+
+
+def _report_line(name: str, s: Dict) -> str:
+    return (
+        f"{name:36} {s['count']:>7} {s['total_s']:>9.3f} "
+        f"{s['p50_ms']:>9.3f} {s['p99_ms']:>9.3f}"
+    )
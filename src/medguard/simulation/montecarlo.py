@@ -0,0 +1,244 @@
+"""
+Monte Carlo scenario runner.
+
+Runs the same network under many random seeds, one SimulationEngine per seed,
+spread over a process pool. Every run gets its own numpy/python RNG streams
+spawned from one SeedSequence, so a sweep is reproducible from base_seed and
+does not depend on how runs are scheduled across workers. Each worker returns
+only a small summary (stockout hours, detection latency per injected anomaly,
+waste units) which are merged at the end.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
+from datetime import datetime
+from itertools import repeat
+from typing import List, Dict
+import numpy as np
+
+from medguard.data.generators.medications import generate_medications
+from medguard.data.generators.brands import generate_brands
+from medguard.data.generators.companies import generate_companies
+from medguard.data.generators.batches import generate_batches
+from medguard.data.generators.facilities import generate_facilities
+from medguard.data.generators.inventory import generate_inventory
+from medguard.simulation.engine import SimulationEngine, START_TIME, END_TIME
+from medguard.utils.movements import movement_rows
+
+# network shared by the runs of one worker process, set by _init_worker
+_network = None
+
+
+def build_seed_network() -> Dict:
+    """the reference network from data/seed."""
+    medications = generate_medications()
+    brands = generate_brands(medications)
+    companies = generate_companies()
+    batches = generate_batches(brands, companies)
+    facilities = generate_facilities()
+    inventory = generate_inventory(facilities, batches, medications, brands)
+    return {
+        "medications": medications,
+        "facilities": facilities,
+        "batches": batches,
+        "inventory": inventory,
+    }
+
+
+# per-run statistics
+def stockout_hours(movements, end_time: datetime) -> float:
+    """
+    Total hours inventory rows spent at zero stock, from the quantity_after of
+    their movements. Injected test movements are ignored.
+    """
+    timelines = defaultdict(list)
+    for inventory_id, quantity_after, source, ts in movement_rows(
+        movements, ("inventory_id", "quantity_after", "source", "timestamp")
+    ):
+        if source == "SIMULATION_ANOMALY" or quantity_after is None:
+            continue
+        timelines[inventory_id].append((ts, quantity_after))
+
+    total_seconds = 0.0
+    for timeline in timelines.values():
+        timeline.sort(key=lambda entry: entry[0])
+        out_since = None
+        for ts, quantity_after in timeline:
+            if quantity_after == 0 and out_since is None:
+                out_since = ts
+            elif quantity_after > 0 and out_since is not None:
+                total_seconds += (ts - out_since).total_seconds()
+                out_since = None
+        if out_since is not None and out_since < end_time:
+            total_seconds += (end_time - out_since).total_seconds()
+
+    return total_seconds / 3600
+
+
+def waste_units(movements) -> int:
+    """units withdrawn from shelves because they expired."""
+    return sum(
+        abs(quantity_change)
+        for (quantity_change,) in movement_rows(
+            movements, ("quantity_change",), movement_types=("EXPIRY_WITHDRAW",)
+        )
+    )
+
+
+def detection_latencies(injections: List[Dict], anomalies: List[Dict]) -> List[Dict]:
+    """hours from each injected anomaly to the first matching detection, None if missed."""
+    latencies = []
+    for injection in injections:
+        injected_at = injection["injected_at"]
+        detected = [
+            datetime.fromisoformat(a["timestamp"])
+            for a in anomalies
+            if a["anomaly_type"] == injection["anomaly_type"]
+            and a.get("batch_id") == injection["batch_id"]
+            and datetime.fromisoformat(a["timestamp"]) >= injected_at
+        ]
+        latency = (
+            (min(detected) - injected_at).total_seconds() / 3600 if detected else None
+        )
+        latencies.append(
+            {
+                "anomaly_type": injection["anomaly_type"],
+                "batch_id": injection["batch_id"],
+                "latency_hours": latency,
+            }
+        )
+    return latencies
+
+
+def summarize_run(engine: SimulationEngine, result: Dict) -> Dict:
+    movements = result["movements"]
+    return {
+        "stockout_hours": stockout_hours(movements, result["simulation_end"]),
+        "waste_units": waste_units(movements),
+        "detections": detection_latencies(engine.injections, result["anomalies"]),
+        "movements": len(movements),
+        "events": len(result["events"]),
+        "anomalies": len(result["anomalies"]),
+    }
+
+
+# workers
+def _init_worker(network: Dict):
+    global _network
+    _network = network
+
+
+def _run_one(
+    seed: np.random.SeedSequence,
+    start_time: datetime,
+    end_time: datetime,
+    vectorized: bool,
+) -> Dict:
+    network = _network
+    # the engine changes inventory quantities, every run starts from a fresh copy
+    inventory = [dict(inv) for inv in network["inventory"]]
+
+    engine = SimulationEngine(
+        inventory=inventory,
+        medications=network["medications"],
+        facilities=network["facilities"],
+        batches=network["batches"],
+        start_time=start_time,
+        end_time=end_time,
+        vectorized=vectorized,
+        seed=seed,
+        verbose=False,
+    )
+    engine.initialize()
+    result = engine.run()
+
+    summary = summarize_run(engine, result)
+    summary["spawn_key"] = list(seed.spawn_key)
+    return summary
+
+
+def _describe(values: List[float]) -> Dict:
+    if not values:
+        return {"count": 0}
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values.max()),
+    }
+
+
+def merge_summaries(runs: List[Dict]) -> Dict:
+    """distribution of every per-run statistic across runs."""
+    latencies = defaultdict(list)
+    injected = defaultdict(int)
+    for run in runs:
+        for detection in run["detections"]:
+            injected[detection["anomaly_type"]] += 1
+            if detection["latency_hours"] is not None:
+                latencies[detection["anomaly_type"]].append(detection["latency_hours"])
+
+    return {
+        "runs": len(runs),
+        "stockout_hours": _describe([r["stockout_hours"] for r in runs]),
+        "waste_units": _describe([r["waste_units"] for r in runs]),
+        "anomalies": _describe([r["anomalies"] for r in runs]),
+        "detection_latency_hours": {
+            anomaly_type: _describe(latencies[anomaly_type]) for anomaly_type in injected
+        },
+        "detection_rate": {
+            anomaly_type: len(latencies[anomaly_type]) / count
+            for anomaly_type, count in injected.items()
+        },
+    }
+
+
+def run_monte_carlo(
+    n_runs: int,
+    *,
+    base_seed: int = 42,
+    processes: int | None = None,
+    network: Dict | None = None,
+    start_time: datetime = START_TIME,
+    end_time: datetime = END_TIME,
+    vectorized: bool = True,
+) -> Dict:
+    """
+    Run n_runs independent simulations across a process pool.
+
+    Args:
+        n_runs: number of seeds to simulate
+        base_seed: root of the SeedSequence every run's RNG streams are spawned from
+        processes: worker processes, defaults to the number of CPUs
+        network: medications/facilities/batches/inventory, defaults to the seed network
+        vectorized: use the vectorized dispensing mode
+
+    Returns:
+        {"runs": per-run summaries in seed order, "summary": merged statistics}
+    """
+    network = network or build_seed_network()
+    seeds = np.random.SeedSequence(base_seed).spawn(n_runs)
+
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(network,)
+    ) as pool:
+        runs = list(
+            pool.map(
+                _run_one,
+                seeds,
+                repeat(start_time),
+                repeat(end_time),
+                repeat(vectorized),
+            )
+        )
+
+    return {"runs": runs, "summary": merge_summaries(runs)}
+
+
+if __name__ == "__main__":
+    result = run_monte_carlo(8)
+    print(result["summary"])
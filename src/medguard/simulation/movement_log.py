@@ -0,0 +1,396 @@
+"""
+Append-only columnar movement log.
+
+A movement dict carries 13 keys, most of them repeated id strings, which makes a
+list of dicts the biggest memory consumer of a long simulation. MovementLog keeps
+one typed numpy column per key instead: id strings are interned into small integer
+codes, timestamps are integer seconds and quantities are int64. Columns grow in
+chunks. Indexing or iterating the log gives back movement dicts, so code written
+for a list of movements keeps working, while detectors read the columns directly
+through rows() (see medguard.utils.movements.movement_rows).
+
+append() takes one movement dict and is meant for the occasional restock or
+injected movement. Bulk writers (the vectorized dispensing) code their values
+once with intern() and hand whole columns to append_columns().
+
+Row indexes are global: discard_before() drops old rows from memory (once they
+are persisted and consumed by the detectors) without shifting the index of the
+rows that are kept, so detector watermarks stay valid.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Sequence
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
+
+# stored for "no value" in integer columns
+MISSING = np.iinfo(np.int64).min
+
+# key order of movement records, see data/generators/movements.py
+MOVEMENT_FIELDS = [
+    "movement_id",
+    "inventory_id",
+    "facility_id",
+    "batch_id",
+    "med_id",
+    "movement_type",
+    "quantity_before",
+    "quantity_change",
+    "quantity_after",
+    "timestamp",
+    "reference_id",
+    "source",
+    "reason",
+]
+
+# repeated strings stored as a code into a StringTable
+INTERNED_FIELDS = [
+    "inventory_id",
+    "facility_id",
+    "batch_id",
+    "med_id",
+    "movement_type",
+    "source",
+    "reason",
+]
+
+# mostly unique ids like MOV_<run id>_17 or DIS_123456, stored as interned prefix + integer suffix
+NUMBERED_FIELDS = ["movement_id", "reference_id"]
+
+QUANTITY_FIELDS = ["quantity_before", "quantity_change", "quantity_after"]
+
+_FIELD_SET = set(MOVEMENT_FIELDS)
+
+CHUNK_SIZE = 65536
+
+
+def to_seconds(timestamp) -> int:
+    """datetime or ISO string -> integer seconds since EPOCH."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return (timestamp - EPOCH) // ONE_SECOND
+
+
+def from_seconds(seconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=int(seconds))
+
+
+class StringTable:
+    """interns strings into integer codes, -1 is None."""
+
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value: str | None) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value: str | None) -> int | None:
+        """code of a string already in the table, without adding it."""
+        if value is None:
+            return -1
+        return self.codes.get(value)
+
+    def value(self, code: int) -> str | None:
+        if code < 0:
+            return None
+        return self.values[code]
+
+
+def _split_number(value: str):
+    """'DIS_123456' -> ('DIS_', 123456), anything without a clean numeric suffix -> (value, MISSING)."""
+    head, sep, digits = value.rpartition("_")
+    if sep and digits.isdigit() and str(int(digits)) == digits:
+        return head + sep, int(digits)
+    return value, MISSING
+
+
+def _join_number(prefix: str | None, number: int) -> str | None:
+    if prefix is None or number == MISSING:
+        return prefix
+    return f"{prefix}{number}"
+
+
+class MovementLog:
+    """append-only columnar store of movement records."""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.size = 0  # rows ever appended
+        self.base = 0  # global index of the first row still in memory
+        self.capacity = 0
+
+        self.strings = {name: StringTable() for name in INTERNED_FIELDS + NUMBERED_FIELDS}
+        self.columns = {}
+        for name in INTERNED_FIELDS:
+            self.columns[name] = np.empty(0, dtype=np.int32)
+        for name in NUMBERED_FIELDS:
+            self.columns[name] = np.empty(0, dtype=np.int32)  # prefix code
+            self.columns[name + "_number"] = np.empty(0, dtype=np.int64)
+        for name in QUANTITY_FIELDS:
+            self.columns[name] = np.empty(0, dtype=np.int64)
+        self.columns["timestamp"] = np.empty(0, dtype=np.int64)
+
+        # keys outside MOVEMENT_FIELDS (e.g. transfer_id), by global row
+        self.extras: Dict[int, Dict] = {}
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        # pickle only the filled part of the columns
+        state = dict(self.__dict__)
+        state["columns"] = {
+            name: column[: self.in_memory].copy() for name, column in self.columns.items()
+        }
+        state["capacity"] = self.in_memory
+        return state
+
+    @property
+    def in_memory(self) -> int:
+        """number of rows currently held in memory."""
+        return self.size - self.base
+
+    def _grow(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity + max(self.chunk_size, self.capacity // 2))
+        for name, column in self.columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[: self.in_memory] = column[: self.in_memory]
+            self.columns[name] = grown
+        self.capacity = capacity
+
+    # writing
+    def append(self, movement: Dict) -> None:
+        """append one movement dict."""
+        self._grow(self.in_memory + 1)
+        row = self.in_memory
+        columns = self.columns
+
+        for name in INTERNED_FIELDS:
+            columns[name][row] = self.strings[name].code(movement.get(name))
+
+        for name in NUMBERED_FIELDS:
+            value = movement.get(name)
+            if value is None:
+                columns[name][row] = -1
+                columns[name + "_number"][row] = MISSING
+                continue
+            prefix, number = _split_number(value)
+            columns[name][row] = self.strings[name].code(prefix)
+            columns[name + "_number"][row] = number
+
+        for name in QUANTITY_FIELDS:
+            value = movement.get(name)
+            columns[name][row] = MISSING if value is None else value
+
+        columns["timestamp"][row] = to_seconds(movement["timestamp"])
+
+        extra = {k: v for k, v in movement.items() if k not in _FIELD_SET}
+        if extra:
+            self.extras[self.size] = extra
+
+        self.size += 1
+
+    def extend(self, movements: Iterable[Dict]) -> None:
+        for movement in movements:
+            self.append(movement)
+
+    def intern(self, name: str, values: Sequence[str | None]) -> np.ndarray:
+        """codes of values in the string table of an interned or numbered field, adding new ones."""
+        table = self.strings[name]
+        return np.array([table.code(v) for v in values], dtype=np.int32)
+
+    def append_columns(self, size: int, **columns) -> None:
+        """
+        append size rows given column-wise, with one slice assignment per column.
+
+        Keys are raw column names: codes from intern() for interned fields, a
+        prefix code plus <name>_number for numbered fields, integer seconds for
+        timestamp. A value is either an array of length size or a scalar for
+        every row. Columns left out are stored as missing.
+        """
+        unknown = set(columns) - set(self.columns)
+        if unknown:
+            raise KeyError(f"unknown movement columns: {sorted(unknown)}")
+        if size <= 0:
+            return
+
+        self._grow(self.in_memory + size)
+        start = self.in_memory
+        stop = start + size
+        for name, column in self.columns.items():
+            if name in columns:
+                column[start:stop] = columns[name]
+            else:
+                column[start:stop] = MISSING if column.dtype == np.int64 else -1
+
+        self.size += size
+
+    def string_sizes(self) -> Dict[str, int]:
+        """number of values in each string table."""
+        return {name: len(table) for name, table in self.strings.items()}
+
+    def export(self, start: int, string_sizes: Dict[str, int] | None = None) -> Dict:
+        """
+        raw columns of the rows from start on, to append_export() into another log,
+        e.g. across processes. string_sizes holds the string table sizes the
+        receiving side has already seen (from an earlier string_sizes()), only
+        values added after them are included.
+        """
+        string_sizes = string_sizes or {}
+        return {
+            "size": self.size - start,
+            "columns": {name: self.column(name, start).copy() for name in self.columns},
+            "strings": {
+                name: table.values[string_sizes.get(name, 0) :]
+                for name, table in self.strings.items()
+            },
+            "extras": {i - start: e for i, e in self.extras.items() if i >= start},
+        }
+
+    def append_export(self, export: Dict, codes: Dict[str, np.ndarray]) -> None:
+        """
+        append rows from another log's export(). codes maps that log's string
+        codes to this log's, per string table; it is extended in place with the
+        export's new strings and has to be passed again with that log's next export.
+        """
+        for name, values in export["strings"].items():
+            known = codes.get(name, np.empty(0, dtype=np.int32))
+            codes[name] = np.concatenate([known, self.intern(name, values)])
+
+        columns = dict(export["columns"])
+        for name, mapping in codes.items():
+            # a trailing -1 keeps None (-1) as None
+            columns[name] = np.append(mapping, -1)[columns[name]]
+
+        first = self.size
+        self.append_columns(export["size"], **columns)
+        for i, extra in export["extras"].items():
+            self.extras[first + i] = extra
+
+    def discard_before(self, index: int) -> None:
+        """drop rows with a global index below index from memory."""
+        index = min(max(index, self.base), self.size)
+        drop = index - self.base
+        if drop <= 0:
+            return
+
+        keep = self.in_memory - drop
+        for column in self.columns.values():
+            column[:keep] = column[drop : drop + keep]
+        self.extras = {i: e for i, e in self.extras.items() if i >= index}
+        self.base = index
+
+    def _local(self, start: int, stop: int | None) -> tuple:
+        """global [start, stop) -> in-memory positions, refusing discarded rows."""
+        stop = self.size if stop is None else min(stop, self.size)
+        if start < self.base and start < stop:
+            raise IndexError(f"movements before {self.base} were discarded from memory")
+        return start - self.base, stop - self.base
+
+    # reading
+    def column(self, name: str, start: int = 0, stop: int | None = None) -> np.ndarray:
+        """view of one raw column (codes for string fields, seconds for timestamp)."""
+        start, stop = self._local(start, stop)
+        return self.columns[name][start:stop]
+
+    def codes_for(self, name: str, values: Sequence[str]) -> List[int]:
+        """codes of known string values of an interned column, unknown values are left out."""
+        table = self.strings[name]
+        codes = (table.lookup(v) for v in values)
+        return [c for c in codes if c is not None]
+
+    def decode(self, name: str, index: np.ndarray) -> list:
+        """values of one field for the given in-memory positions as python objects."""
+        values = self.columns[name][index].tolist()
+        if name in INTERNED_FIELDS:
+            table = self.strings[name]
+            return [table.value(c) for c in values]
+        if name in NUMBERED_FIELDS:
+            table = self.strings[name]
+            numbers = self.columns[name + "_number"][index].tolist()
+            return [
+                _join_number(table.value(c), n) for c, n in zip(values, numbers)
+            ]
+        if name == "timestamp":
+            return [from_seconds(s) for s in values]
+        return [None if v == MISSING else v for v in values]
+
+    def row(self, index: int) -> Dict:
+        """dict view of one movement."""
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("movement index out of range")
+        extra = self.extras.get(index, {})
+        index, _ = self._local(index, index + 1)
+
+        columns = self.columns
+        movement = {}
+        for name in MOVEMENT_FIELDS:
+            if name in INTERNED_FIELDS:
+                movement[name] = self.strings[name].value(int(columns[name][index]))
+            elif name in NUMBERED_FIELDS:
+                movement[name] = _join_number(
+                    self.strings[name].value(int(columns[name][index])),
+                    int(columns[name + "_number"][index]),
+                )
+            elif name == "timestamp":
+                movement[name] = from_seconds(columns[name][index]).isoformat()
+            else:
+                value = int(columns[name][index])
+                if value == MISSING:
+                    continue  # key was absent on the original record
+                movement[name] = value
+
+        movement.update(extra)
+        return movement
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(self.size))]
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self.base, self.size):
+            yield self.row(i)
+
+    def to_dicts(self, start: int | None = None, stop: int | None = None) -> List[Dict]:
+        """export movements still in memory as the usual list of dicts."""
+        start = self.base if start is None else start
+        return self[start:stop]
+
+    def rows(
+        self,
+        fields: Sequence[str],
+        start: int = 0,
+        movement_types: Sequence[str] | None = None,
+    ) -> Iterator[tuple]:
+        """
+        tuples of the requested fields for rows from start on, decoded straight from
+        the columns. Rows already discarded from memory are skipped.
+        """
+        start, stop = self._local(max(start, self.base), None)
+        if movement_types is not None:
+            codes = self.codes_for("movement_type", movement_types)
+            mask = np.isin(self.columns["movement_type"][start:stop], codes)
+            index = np.flatnonzero(mask) + start
+        else:
+            index = np.arange(start, stop)
+
+        decoded = [self.decode(name, index) for name in fields]
+        return zip(*decoded)
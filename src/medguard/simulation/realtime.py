@@ -0,0 +1,204 @@
+"""
+Real-time / scaled-time simulation driven by asyncio.
+
+RealtimeSimulation paces an initialized SimulationEngine against the wall clock:
+simulated time advances at `speed` simulated hours per wall second, and after
+the events of each simulated timestamp are processed the new movements, events
+and anomalies are published to every subscriber as one message:
+
+    {"time": datetime, "batches": [...], "movements": [...], "events": [...],
+     "anomalies": [...]}
+
+batches are the ones registered during the run (injected counterfeits), a
+subscriber running its own AnomalyEngine passes them to add_batches() before
+consuming the movements.
+
+Subscribers are async iterators backed by an asyncio.Queue. A bounded queue
+(maxsize) applies backpressure: a slow consumer holds the clock back, and the
+lag behind the wall-clock schedule is reported in `max_lag_seconds`, which is
+what a soak test of a consumer wants to see.
+
+The engine must not stream to a sink, the sink drains the logs the publisher
+reads from; subscribe a consumer that writes to the database instead.
+"""
+
+from datetime import timedelta
+from typing import Dict, List
+import asyncio
+
+from medguard.simulation.engine import SimulationEngine
+
+# run_until is exclusive, this processes every event at one timestamp
+_INSTANT = timedelta(microseconds=1)
+
+
+class Subscription:
+    """async iterator over published messages, ends when the run ends."""
+
+    def __init__(self, maxsize: int = 0):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict:
+        message = await self.queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+
+class RealtimeSimulation:
+    """paces a SimulationEngine at speed simulated hours per wall second."""
+
+    def __init__(self, engine: SimulationEngine, speed: float = 1.0):
+        """
+        Args:
+            engine: initialized engine without a sink
+            speed: simulated hours per wall second, 1/3600 is real time
+        """
+        if engine.sink is not None:
+            raise ValueError("RealtimeSimulation needs an engine without a sink")
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+
+        self.engine = engine
+        self.speed = speed
+        self.subscriptions: List[Subscription] = []
+
+        # positions in the engine logs already published, the first message
+        # also carries what initialize() logged (initial receipts)
+        self.batches_position = len(engine.batches)
+        self.movements_position = 0
+        self.events_position = 0
+        self.anomalies_position = 0
+
+        self.published = 0
+        self.max_lag_seconds = 0.0
+
+    def subscribe(self, maxsize: int = 0) -> Subscription:
+        """new subscriber, maxsize > 0 bounds its queue (backpressure)."""
+        subscription = Subscription(maxsize)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    async def _publish(self, message: Dict | None):
+        for subscription in self.subscriptions:
+            await subscription.queue.put(message)
+
+    def _collect(self, time) -> Dict | None:
+        """everything the engine logged since the last message."""
+        engine = self.engine
+        batches = engine.batches[self.batches_position :]
+        movements = engine.movements_log.to_dicts(self.movements_position)
+        events = engine.events_log[self.events_position :]
+        anomalies = engine.anomalies_log[self.anomalies_position :]
+
+        self.batches_position = len(engine.batches)
+        self.movements_position = len(engine.movements_log)
+        self.events_position = len(engine.events_log)
+        self.anomalies_position = len(engine.anomalies_log)
+
+        if not (batches or movements or events or anomalies):
+            return None
+        return {
+            "time": time,
+            "batches": batches,
+            "movements": movements,
+            "events": events,
+            "anomalies": anomalies,
+        }
+
+    async def run(self) -> Dict:
+        """run to end_time on the wall-clock schedule, returns engine.run()'s result."""
+        engine = self.engine
+        queue = engine.event_queue
+        loop = asyncio.get_running_loop()
+        wall_start = loop.time()
+        sim_start = engine.current_time
+
+        try:
+            while not queue.is_empty() and queue.peek_time() < engine.end_time:
+                time = queue.peek_time()
+
+                # wall time this simulated timestamp is due
+                sim_hours = (time - sim_start).total_seconds() / 3600
+                delay = wall_start + sim_hours / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag_seconds = max(self.max_lag_seconds, -delay)
+                    # let consumers run even when behind schedule
+                    await asyncio.sleep(0)
+
+                engine.run_until(time + _INSTANT)
+
+                message = self._collect(time)
+                if message is not None:
+                    await self._publish(message)
+                    self.published += 1
+
+            return engine.run()
+        finally:
+            await self._publish(None)
+
+
+if __name__ == "__main__":
+    from medguard.detection.anomalies import AnomalyEngine
+    from medguard.simulation.engine import START_TIME, END_TIME
+    from medguard.simulation.montecarlo import build_seed_network
+    from medguard.simulation.movement_log import MovementLog
+
+    async def dashboard(subscription: Subscription):
+        async for message in subscription:
+            print(
+                f"[{message['time']}] {len(message['movements'])} movements, "
+                f"{len(message['events'])} events, {len(message['anomalies'])} anomalies"
+            )
+
+    async def detector(subscription: Subscription, network: Dict):
+        # an independent detector fed only by the published movements
+        log = MovementLog()
+        anomaly_engine = AnomalyEngine(network["facilities"], network["batches"])
+        found = 0
+        async for message in subscription:
+            anomaly_engine.add_batches(message["batches"])
+            log.extend(message["movements"])
+            found += len(
+                anomaly_engine.detect(
+                    inventory=network["inventory"],
+                    movements=log,
+                    current_time=message["time"],
+                )
+            )
+        print(f"subscriber detector found {found} anomalies")
+
+    async def main():
+        network = build_seed_network()
+        engine = SimulationEngine(
+            inventory=network["inventory"],
+            medications=network["medications"],
+            facilities=network["facilities"],
+            batches=network["batches"],
+            start_time=START_TIME,
+            end_time=END_TIME,
+            vectorized=True,
+            seed=42,
+            verbose=False,
+        )
+        engine.initialize()
+
+        # 96 simulated hours in about 4 seconds
+        simulation = RealtimeSimulation(engine, speed=24.0)
+        consumers = [
+            asyncio.create_task(dashboard(simulation.subscribe())),
+            asyncio.create_task(detector(simulation.subscribe(maxsize=8), network)),
+        ]
+        result = await simulation.run()
+        await asyncio.gather(*consumers)
+        print(
+            f"{len(result['movements'])} movements in {simulation.published} messages, "
+            f"max lag {simulation.max_lag_seconds:.3f}s"
+        )
+
+    asyncio.run(main())
@@ -0,0 +1,233 @@
+"""
+Injected test anomalies (demo scenarios).
+
+The builders only pick the batch/facilities and build the movement records (and
+any new batch records, which the caller registers before the movements); the
+caller appends them to its movement log. That way the single-process engine and
+the sharded coordinator inject exactly the same scenarios.
+"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Dict
+
+from medguard.data.generators.movements import next_movement_id
+
+# (hours after start, event type, description)
+DEMO_SCENARIOS = [
+    # Scenario 1: geographic impossibility at hour 15
+    (15, "INJECT_GEOGRAPHIC_ANOMALY", "Counterfeit batch appears in distant locations"),
+    # Scenario 2: geographic anomaly at hour 35
+    (35, "INJECT_GEOGRAPHIC_ANOMALY", "Second counterfeit batch detected"),
+    # Scenario 3: impossible quantity at hour 50
+    (50, "INJECT_IMPOSSIBLE_QUANTITY", "Batch dispensed more than existed"),
+]
+
+# opt-in, it adds a batch record to the run: pass
+# scenarios=DEMO_SCENARIOS + [COUNTERFEIT_BATCH_SCENARIO] to schedule it
+COUNTERFEIT_BATCH_SCENARIO = (
+    60,
+    "INJECT_COUNTERFEIT_BATCH",
+    "Counterfeit batch copies a genuine batch number",
+)
+
+
+def geographic_injection(
+    inventory: List[Dict],
+    inventory_by_batch: Dict[str, List[Dict]],
+    facilities: List[Dict],
+    facility_lookup: Dict,
+    rand,
+    current_time: datetime,
+) -> Dict | None:
+    """
+    Same batch restocked at two facilities in different states 1-2 hours apart.
+
+    Args:
+        inventory_by_batch: batch_id -> inventory rows, in inventory order
+        rand: random.Random (or the random module) to draw from
+
+    Returns:
+        {"anomaly_type", "batch_id", "movements", "message"} or None if nothing fits
+    """
+    # random batch that has inventory
+    batches_with_inventory = [
+        inv["batch_id"] for inv in inventory if inv["quantity"] > 0
+    ]
+    if not batches_with_inventory:
+        return None
+
+    batch_id = rand.choice(batches_with_inventory)
+
+    # which facility has the batch?
+    source_inv = next(
+        (inv for inv in inventory_by_batch.get(batch_id, []) if inv["quantity"] > 0),
+        None,
+    )
+    if not source_inv:
+        return None
+
+    source_facility = facility_lookup.get(source_inv["facility_id"])
+    if not source_facility:
+        return None
+
+    # distant facility (different state)
+    distant_facilities = [
+        f for f in facilities if f["state"] != source_facility["state"]
+    ]
+    if not distant_facilities:
+        return None
+
+    distant = rand.choice(distant_facilities)
+
+    # create a restock at the source
+    mov1 = {
+        "movement_id": next_movement_id(),
+        "inventory_id": source_inv["inventory_id"],
+        "facility_id": source_inv["facility_id"],
+        "batch_id": batch_id,
+        "med_id": source_inv["med_id"],
+        "movement_type": "RESTOCK",
+        "quantity_change": 50,
+        "quantity_after": source_inv["quantity"] + 50,
+        "timestamp": current_time.isoformat(),
+        "reference_id": "ANOMALY_INJECT",
+        "source": "SIMULATION_ANOMALY",
+        "reason": "GEOGRAPHIC_TEST",
+    }
+
+    # create a restock at distant facility 1-2 hours later
+    mov2 = {
+        "movement_id": next_movement_id(),
+        "inventory_id": f"ANOMALY_{source_inv['inventory_id']}",
+        "facility_id": distant["facility_id"],
+        "batch_id": batch_id,  # same batch id
+        "med_id": source_inv["med_id"],
+        "movement_type": "RESTOCK",
+        "quantity_change": rand.randint(50, 150),
+        "quantity_after": rand.randint(50, 150),
+        "timestamp": (current_time + timedelta(hours=rand.randint(1, 2))).isoformat(),
+        "reference_id": "ANOMALY_INJECT",
+        "source": "SIMULATION_ANOMALY",
+        "reason": "GEOGRAPHIC_TEST",
+    }
+
+    return {
+        "anomaly_type": "GEOGRAPHIC_IMPOSSIBILITY",
+        "batch_id": batch_id,
+        "movements": [mov1, mov2],
+        "message": f"Injected: Batch {batch_id} at {source_facility['state']} and {distant['state']}",
+    }
+
+
+def impossible_quantity_injection(
+    inventory_by_batch: Dict[str, List[Dict]],
+    batches: List[Dict],
+    rand,
+    current_time: datetime,
+) -> Dict | None:
+    """
+    Five dispenses of one batch adding up to 12x its initial quantity.
+
+    Args:
+        inventory_by_batch: batch_id -> inventory rows, in inventory order
+
+    Returns:
+        {"anomaly_type", "batch_id", "movements", "message"} or None if nothing fits
+    """
+    # pick a batch
+    if not batches:
+        return None
+
+    batch = rand.choice(batches)
+    batch_id = batch["batch_id"]
+    initial_qty = batch["initial_quantity"]
+
+    # which facility has the batch?
+    rows = inventory_by_batch.get(batch_id)
+    if not rows:
+        return None
+    inv = rows[0]
+
+    # Create dispenses that exceed initial quantity
+    excess_qty = initial_qty * 12
+
+    movements = []
+    for i in range(5):
+        movements.append(
+            {
+                "movement_id": next_movement_id(),
+                "inventory_id": inv["inventory_id"],
+                "facility_id": inv["facility_id"],
+                "batch_id": batch_id,
+                "med_id": inv["med_id"],
+                "movement_type": "DISPENSE",
+                "quantity_change": -(excess_qty // 5),
+                "quantity_after": 0,
+                "timestamp": (current_time + timedelta(minutes=i * 10)).isoformat(),
+                "reference_id": "ANOMALY_INJECT",
+                "source": "SIMULATION_ANOMALY",
+                "reason": "IMPOSSIBLE_QTY_TEST",
+            }
+        )
+
+    return {
+        "anomaly_type": "IMPOSSIBLE_QUANTITY",
+        "batch_id": batch_id,
+        "movements": movements,
+        "message": f"Injected: Batch {batch_id} dispensed {excess_qty} (initial was {initial_qty})",
+    }
+
+
+def counterfeit_batch_injection(
+    batches: List[Dict],
+    facilities: List[Dict],
+    rand,
+    current_time: datetime,
+) -> Dict | None:
+    """
+    New batch record copying a genuine batch (same batch number), received at a
+    random facility.
+
+    Returns:
+        {"anomaly_type", "batch_id", "batches", "movements", "message"} or None
+        if nothing fits. batch_id is the genuine batch, the one the duplicate
+        batch number anomaly reports.
+    """
+    # only copy batch numbers that are still unique
+    counts = Counter(b["batch_number"] for b in batches)
+    genuine_batches = [b for b in batches if counts[b["batch_number"]] == 1]
+    if not genuine_batches or not facilities:
+        return None
+
+    genuine = rand.choice(genuine_batches)
+    facility = rand.choice(facilities)
+
+    counterfeit = dict(genuine)
+    counterfeit["batch_id"] = f"{genuine['batch_id']}_CF"
+    counterfeit["is_verified"] = False
+
+    quantity = rand.randint(50, 150)
+    mov = {
+        "movement_id": next_movement_id(),
+        "inventory_id": f"ANOMALY_{counterfeit['batch_id']}",
+        "facility_id": facility["facility_id"],
+        "batch_id": counterfeit["batch_id"],
+        "med_id": counterfeit["med_id"],
+        "movement_type": "RESTOCK",
+        "quantity_change": quantity,
+        "quantity_after": quantity,
+        "timestamp": current_time.isoformat(),
+        "reference_id": "ANOMALY_INJECT",
+        "source": "SIMULATION_ANOMALY",
+        "reason": "COUNTERFEIT_BATCH_TEST",
+    }
+
+    return {
+        "anomaly_type": "DUPLICATE_BATCH_NUMBER",
+        "batch_id": genuine["batch_id"],
+        "batches": [counterfeit],
+        "movements": [mov],
+        "message": f"Injected: Batch {counterfeit['batch_id']} reuses batch number "
+        f"{genuine['batch_number']} at {facility['facility_id']}",
+    }
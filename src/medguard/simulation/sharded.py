@@ -0,0 +1,403 @@
+"""
+Region-sharded parallel simulation.
+
+Facilities are partitioned by state into shards. Every shard is a worker process
+running its own SimulationEngine (own event queue, inventory rows and RNG stream)
+for dispensing and expiry, which only ever touch one facility. A coordinator in
+the parent process owns everything that crosses shard boundaries:
+
+- agent cycles: shards detect events and restock locally, then ship the
+  movements recorded since the last cycle so the coordinator can run anomaly
+  detection over the whole network (geographic impossibility spans states)
+- injected anomalies: built on the coordinator and routed as movements to the
+  shard owning each facility; injected batches are registered on the
+  coordinator's anomaly engine
+
+Shards only wait for each other at those points: between two of them every
+shard runs its hourly ticks on its own. Movements travel as raw MovementLog
+columns (MovementLog.export / append_export) and shards drop them from memory
+once shipped and consumed by their event detector.
+
+Messages are (command, payload) tuples over a multiprocessing Pipe. Every shard
+numbers its movements, events and anomalies in its own run (utils/ids.py) so
+ids stay unique network-wide.
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import List, Dict
+import multiprocessing
+import os
+import random
+
+import numpy as np
+
+from medguard.detection.anomalies import AnomalyEngine
+from medguard.simulation.engine import (
+    SimulationEngine,
+    AGENT_CYCLE_HOURS,
+    TIME_STEP,
+)
+from medguard.simulation.movement_log import MovementLog
+from medguard.simulation.scenarios import (
+    DEMO_SCENARIOS,
+    counterfeit_batch_injection,
+    geographic_injection,
+    impossible_quantity_injection,
+)
+from medguard.utils.ids import new_run
+
+
+def partition_by_state(
+    facilities: List[Dict], inventory: List[Dict], n_shards: int
+) -> Dict[str, int]:
+    """
+    Assign every state to a shard, balancing inventory rows (the unit of work of a tick).
+
+    Returns:
+        facility_id -> shard index
+    """
+    state_of = {f["facility_id"]: f["state"] for f in facilities}
+    rows_per_state = Counter(state_of.get(inv["facility_id"]) for inv in inventory)
+    for state in state_of.values():
+        rows_per_state.setdefault(state, 0)
+
+    # largest state first onto the least loaded shard
+    load = [0] * n_shards
+    shard_of_state = {}
+    for state, rows in sorted(rows_per_state.items(), key=lambda item: -item[1]):
+        shard = load.index(min(load))
+        shard_of_state[state] = shard
+        load[shard] += rows
+
+    return {
+        facility_id: shard_of_state[state] for facility_id, state in state_of.items()
+    }
+
+
+# shard worker
+def _shard_main(conn, spec: Dict):
+    """worker loop of one shard."""
+    # own id namespace, whatever the start method
+    new_run()
+
+    engine = SimulationEngine(
+        inventory=spec["inventory"],
+        medications=spec["medications"],
+        facilities=spec["facilities"],
+        batches=spec["batches"],
+        start_time=spec["start_time"],
+        end_time=spec["end_time"],
+        vectorized=spec["vectorized"],
+        seed=spec["seed"],
+        verbose=False,
+    )
+    # the coordinator runs agent cycles and injections
+    engine.initialize(schedule_agent_cycles=False, schedule_scenarios=False)
+
+    log = engine.movements_log
+    synced_movements = 0
+    synced_strings = {}
+    synced_rows = len(engine.inventory)
+
+    while True:
+        command, payload = conn.recv()
+
+        if command == "advance":
+            engine.run_until(payload)
+            conn.send(None)
+
+        elif command == "event_cycle":
+            engine.current_time = payload
+            events = engine.run_event_cycle()
+            resolved = [(e["event_id"], e["resolved_at"]) for e in engine.resolved_events]
+            engine.resolved_events = []
+            conn.send((events, resolved))
+
+        elif command == "sync":
+            # new movements, current quantities and rows added since the last sync
+            movements = log.export(synced_movements, synced_strings)
+            quantities = [inv["quantity"] for inv in engine.inventory]
+            new_rows = engine.inventory[synced_rows:]
+            synced_movements = len(log)
+            synced_strings = log.string_sizes()
+            synced_rows = len(engine.inventory)
+            conn.send((movements, quantities, new_rows))
+            log.discard_before(min(synced_movements, engine.event_detector.watermark))
+
+        elif command == "append":
+            log.extend(payload)
+            conn.send(None)
+
+        elif command == "stop":
+            conn.send(None)
+            break
+
+
+# coordinator
+class ShardedSimulation:
+    """
+    Runs one SimulationEngine per region shard in worker processes and
+    coordinates clock, agent cycles and injections.
+    """
+
+    def __init__(
+        self,
+        inventory: List[Dict],
+        medications: List[Dict],
+        facilities: List[Dict],
+        batches: List[Dict],
+        start_time: datetime,
+        end_time: datetime,
+        n_shards: int | None = None,
+        seed: int = 42,
+        vectorized: bool = True,
+        verbose: bool = True,
+        scenarios: List[tuple] | None = None,
+    ):
+        """
+        Args:
+            n_shards: worker processes, defaults to min(CPUs, number of states)
+            seed: root of the SeedSequence every shard's RNG streams are spawned from
+            scenarios: (hours after start, event type, description) to inject,
+                defaults to DEMO_SCENARIOS
+        """
+        self.inventory = inventory
+        self.medications = medications
+        self.facilities = facilities
+        self.batches = batches
+        self.start_time = start_time
+        self.end_time = end_time
+        self.current_time = start_time
+        self.vectorized = vectorized
+        self.verbose = verbose
+        self.scenarios = DEMO_SCENARIOS if scenarios is None else scenarios
+
+        n_states = len({f["state"] for f in facilities})
+        self.n_shards = max(1, min(n_shards or os.cpu_count() or 1, n_states))
+        self.shard_of = partition_by_state(facilities, inventory, self.n_shards)
+        self.facility_lookup = {f["facility_id"]: f for f in facilities}
+
+        seeds = np.random.SeedSequence(seed).spawn(self.n_shards + 1)
+        self.shard_seeds = seeds[:-1]
+        self.random = random.Random(int(seeds[-1].generate_state(1)[0]))
+
+        # the coordinator's copy of each shard's inventory rows, in shard order
+        self.shard_rows: List[List[Dict]] = [[] for _ in range(self.n_shards)]
+        self.inventory_by_batch = defaultdict(list)
+        for inv in inventory:
+            self.shard_rows[self.shard_of[inv["facility_id"]]].append(inv)
+            self.inventory_by_batch[inv["batch_id"]].append(inv)
+
+        self.movements_log = MovementLog()
+        self.events_log: List[Dict] = []
+        self.open_events: Dict[str, Dict] = {}  # event_id -> still active event
+        self.anomalies_log: List[Dict] = []
+        self.anomaly_engine = AnomalyEngine(facilities, batches)
+        self.injections: List[Dict] = []
+        # per shard: that shard's movement log string codes -> ours
+        self.shard_codes: List[Dict[str, np.ndarray]] = [{} for _ in range(self.n_shards)]
+
+        self.connections = []
+        self.processes = []
+
+    # process management
+    def start(self):
+        for shard in range(self.n_shards):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            spec = {
+                "shard": shard,
+                # workers get copies, the coordinator keeps its own rows in sync
+                "inventory": [dict(inv) for inv in self.shard_rows[shard]],
+                "medications": self.medications,
+                "facilities": [
+                    f for f in self.facilities if self.shard_of[f["facility_id"]] == shard
+                ],
+                "batches": self.batches,
+                "start_time": self.start_time,
+                "end_time": self.end_time,
+                "vectorized": self.vectorized,
+                "seed": self.shard_seeds[shard],
+            }
+            process = multiprocessing.Process(
+                target=_shard_main, args=(child_conn, spec), daemon=True
+            )
+            process.start()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+        # initial receipts happen in initialize(), pick them up
+        self._sync()
+
+    def close(self):
+        for conn in self.connections:
+            conn.send(("stop", None))
+            conn.recv()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def _ask(self, shard: int, command: str, payload=None):
+        self.connections[shard].send((command, payload))
+        return self.connections[shard].recv()
+
+    def _broadcast(self, command: str, payload=None) -> list:
+        """send to every shard first, then collect, so shards work in parallel."""
+        for conn in self.connections:
+            conn.send((command, payload))
+        return [conn.recv() for conn in self.connections]
+
+    def _log(self, message: str):
+        if self.verbose:
+            print(message)
+
+    # simulation
+    def _sync(self):
+        """pull new movements, quantities and rows from every shard."""
+        for shard, (movements, quantities, new_rows) in enumerate(
+            self._broadcast("sync")
+        ):
+            rows = self.shard_rows[shard]
+            for inv in new_rows:
+                rows.append(inv)
+                self.inventory.append(inv)
+                self.inventory_by_batch[inv["batch_id"]].append(inv)
+            for inv, quantity in zip(rows, quantities):
+                inv["quantity"] = quantity
+            self.movements_log.append_export(movements, self.shard_codes[shard])
+
+    def _route(self, movements: List[Dict]):
+        """append movements on the shard that owns their facility."""
+        by_shard = {}
+        for mov in movements:
+            by_shard.setdefault(self.shard_of[mov["facility_id"]], []).append(mov)
+        for shard, shard_movements in by_shard.items():
+            self._ask(shard, "append", shard_movements)
+
+    def _agent_cycle(self):
+        for events, resolved in self._broadcast("event_cycle", self.current_time):
+            self.events_log.extend(events)
+            self.open_events.update((e["event_id"], e) for e in events)
+            # shards resolve their copies, mirror it on the coordinator's
+            for event_id, resolved_at in resolved:
+                event = self.open_events.pop(event_id)
+                event["is_active"] = False
+                event["resolved_at"] = resolved_at
+
+        self._sync()
+
+        new_anomalies = self.anomaly_engine.detect(
+            inventory=self.inventory,
+            movements=self.movements_log,
+            current_time=self.current_time,
+        )
+        self.anomalies_log.extend(new_anomalies)
+
+        if new_anomalies and self.verbose:
+            print(f"Detected {len(new_anomalies)} new anomalies")
+            for a in new_anomalies:
+                print(f"{a['anomaly_type']}: {a['details'][:50]}...")
+
+    def _inject(self, event_type: str):
+        if event_type == "INJECT_GEOGRAPHIC_ANOMALY":
+            self._log(f"[Inject] Geographic anomaly at {self.current_time}")
+            injection = geographic_injection(
+                self.inventory,
+                self.inventory_by_batch,
+                self.facilities,
+                self.facility_lookup,
+                self.random,
+                self.current_time,
+            )
+        elif event_type == "INJECT_IMPOSSIBLE_QUANTITY":
+            self._log(f"[Inject] Impossible quantity at {self.current_time}")
+            injection = impossible_quantity_injection(
+                self.inventory_by_batch, self.batches, self.random, self.current_time
+            )
+        elif event_type == "INJECT_COUNTERFEIT_BATCH":
+            self._log(f"[Inject] Counterfeit batch at {self.current_time}")
+            injection = counterfeit_batch_injection(
+                self.batches, self.facilities, self.random, self.current_time
+            )
+        else:
+            return
+
+        if not injection:
+            return
+        # batch checks run on the coordinator, shards only log the movements
+        new_batches = injection.get("batches", [])
+        if new_batches:
+            self.batches = self.batches + new_batches
+            self.anomaly_engine.add_batches(new_batches)
+        self._route(injection["movements"])
+        self.injections.append(
+            {
+                "anomaly_type": injection["anomaly_type"],
+                "batch_id": injection["batch_id"],
+                "injected_at": self.current_time,
+            }
+        )
+        self._log(injection["message"])
+
+    def run(self) -> Dict:
+        """Main loop: same result shape as SimulationEngine.run()."""
+        if not self.processes:
+            self.start()
+
+        # the points where shards have to be in step: agent cycles, then injections
+        sync_points = defaultdict(list)
+        agent_cycle = self.start_time
+        while agent_cycle < self.end_time:
+            sync_points[agent_cycle].append("AGENT_CYCLE")
+            agent_cycle += timedelta(hours=AGENT_CYCLE_HOURS)
+        for hours, event_type, _ in self.scenarios:
+            at = self.start_time + timedelta(hours=hours)
+            if at < self.end_time:
+                sync_points[at].append(event_type)
+
+        try:
+            for at in sorted(sync_points):
+                # shards run freely up to and including their tick at this time
+                self._broadcast("advance", min(at + TIME_STEP, self.end_time))
+                self.current_time = at
+                for event_type in sync_points[at]:
+                    if event_type == "AGENT_CYCLE":
+                        self._agent_cycle()
+                    else:
+                        self._inject(event_type)
+
+            self._broadcast("advance", self.end_time)
+            self.current_time = self.end_time
+            self._sync()
+        finally:
+            self.close()
+
+        return {
+            "final_inventory": self.inventory,
+            "movements": self.movements_log,
+            "events": self.events_log,
+            "anomalies": self.anomalies_log,
+            "simulation_start": self.start_time,
+            "simulation_end": self.end_time,
+        }
+
+
+if __name__ == "__main__":
+    from medguard.simulation.engine import START_TIME, END_TIME
+    from medguard.simulation.montecarlo import build_seed_network
+
+    network = build_seed_network()
+    simulation = ShardedSimulation(
+        inventory=network["inventory"],
+        medications=network["medications"],
+        facilities=network["facilities"],
+        batches=network["batches"],
+        start_time=START_TIME,
+        end_time=END_TIME,
+    )
+    result = simulation.run()
+    print(
+        f"{simulation.n_shards} shards: {len(result['movements'])} movements, "
+        f"{len(result['events'])} events, {len(result['anomalies'])} anomalies"
+    )
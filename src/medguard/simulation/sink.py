@@ -0,0 +1,118 @@
+"""
+Streaming persistence of simulation output.
+
+SQLiteSink buffers movements, events and anomalies handed over by the engine and
+writes them with insert_movements/insert_events/insert_anomalies once a buffer
+reaches batch_size (batch ledger rows go along with them to batch_ledger /
+batch_stock), so a long run goes to the operational tables in a few large
+transactions instead of being held in memory until the end.
+
+The reference tables (facilities, batches, ...) must already be seeded, see
+scripts/seed_db.py, because movements reference facilities. Batches registered
+during the run (injected counterfeits) are written first on every flush, the
+ledger rows reference them.
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from medguard.db.database import (
+    get_connection_to_db,
+    insert_movements,
+    insert_events,
+    insert_anomalies,
+    insert_batches,
+    insert_batch_ledger,
+    insert_batch_stock,
+)
+
+DEFAULT_BATCH_SIZE = 50_000
+
+
+class SQLiteSink:
+    """buffers simulation output and flushes it to SQLite in large batches."""
+
+    def __init__(
+        self,
+        conn: Optional[sqlite3.Connection] = None,
+        db_path: Optional[Path] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        """
+        Args:
+            conn: open connection to write to, otherwise one is opened on db_path
+            db_path: database file, defaults to the project database
+            batch_size: rows buffered per table before a flush
+        """
+        self.owns_connection = conn is None
+        self.conn = conn or get_connection_to_db(db_path)
+        self.batch_size = batch_size
+
+        self.batches: List[Dict] = []
+        self.movements: List[Dict] = []
+        self.events: List[Dict] = []
+        self.anomalies: List[Dict] = []
+        self.ledger: List[Dict] = []
+        self.stock: List[Dict] = []
+
+        self.written = {"movements": 0, "events": 0, "anomalies": 0}
+
+    def write(
+        self,
+        movements: Iterable[Dict] = (),
+        batches: Iterable[Dict] = (),
+        events: Iterable[Dict] = (),
+        anomalies: Iterable[Dict] = (),
+        ledger: Iterable[Dict] = (),
+        stock: Iterable[Dict] = (),
+    ) -> None:
+        """buffer new records, flushing when any buffer is full."""
+        self.batches.extend(batches)
+        self.movements.extend(movements)
+        self.events.extend(events)
+        self.anomalies.extend(anomalies)
+        self.ledger.extend(ledger)
+        self.stock.extend(stock)
+
+        if (
+            len(self.batches) >= self.batch_size
+            or len(self.movements) >= self.batch_size
+            or len(self.events) >= self.batch_size
+            or len(self.anomalies) >= self.batch_size
+            or len(self.ledger) >= self.batch_size
+            or len(self.stock) >= self.batch_size
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """write everything buffered, one transaction per table."""
+        insert_batches(self.batches, self.conn)
+        insert_movements(self.movements, self.conn)
+        insert_events(self.events, self.conn)
+        insert_anomalies(self.anomalies, self.conn)
+        # ledger rows are upserts of running totals, later rows of a batch win
+        insert_batch_ledger(self.ledger, self.conn)
+        insert_batch_stock(self.stock, self.conn)
+
+        self.written["movements"] += len(self.movements)
+        self.written["events"] += len(self.events)
+        self.written["anomalies"] += len(self.anomalies)
+
+        self.batches = []
+        self.movements = []
+        self.events = []
+        self.anomalies = []
+        self.ledger = []
+        self.stock = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.owns_connection:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,5 +1,26 @@
 """MedGuard utility functions."""
 
-from medguard.utils.geo import haversine_distance
+from medguard.utils.expiry import NO_EXPIRY, expiry_ordinal
+from medguard.utils.geo import (
+    FacilityDistances,
+    facility_distances,
+    haversine_distance,
+    haversine_distances,
+)
+from medguard.utils.ids import IdSequence, new_run, run_id
+from medguard.utils.movements import movement_rows
+from medguard.utils.spatial import FacilityIndex
 
-__all__ = ["haversine_distance"]
+__all__ = [
+    "NO_EXPIRY",
+    "FacilityDistances",
+    "FacilityIndex",
+    "IdSequence",
+    "expiry_ordinal",
+    "facility_distances",
+    "haversine_distance",
+    "haversine_distances",
+    "movement_rows",
+    "new_run",
+    "run_id",
+]
@@ -0,0 +1,20 @@
+"""
+Expiry dates as date ordinals.
+
+Inventory expiry dates are 'YYYY-MM-DD' strings. Code that compares them in bulk
+(the simulation's expiry calendar and inventory arrays, the event detectors)
+parses each one once into a date ordinal and stores NO_EXPIRY where a date is
+missing or unparseable.
+"""
+
+from datetime import datetime
+
+NO_EXPIRY = -1
+
+
+def expiry_ordinal(expiry_date: str | None) -> int | None:
+    """'YYYY-MM-DD' -> date ordinal, None if missing or unparseable."""
+    try:
+        return datetime.strptime(expiry_date, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return None
@@ -1,4 +1,7 @@
 import math
+from typing import Dict, List
+
+import numpy as np
 
 
 def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -23,3 +26,82 @@ def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
         + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
     )
     return 2 * R * math.asin(math.sqrt(a))
+
+
+def haversine_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    haversine_distance over numpy arrays, the arguments broadcast against each other.
+
+    Returns:
+        Distances in kilometers
+    """
+    R = 6371  # Earth's radius in km
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(x, dtype=np.float64)) for x in (lat1, lon1, lat2, lon2)
+    )
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+# rows of the distance matrix computed per block, bounds the float64 temporaries
+_MATRIX_BLOCK_ROWS = 512
+
+
+class FacilityDistances:
+    """facility x facility distances in km, indexed by integer facility code."""
+
+    def __init__(self, facilities: List[Dict]):
+        self.facility_ids = [f["facility_id"] for f in facilities]
+        self.codes = {facility_id: i for i, facility_id in enumerate(self.facility_ids)}
+
+        latitude = np.radians([f["latitude"] for f in facilities])
+        longitude = np.radians([f["longitude"] for f in facilities])
+        cos_latitude = np.cos(latitude)
+
+        # haversine_distances per block of rows, radians and cosines computed once
+        n = len(facilities)
+        self.matrix = np.empty((n, n), dtype=np.float32)
+        for start in range(0, n, _MATRIX_BLOCK_ROWS):
+            stop = min(start + _MATRIX_BLOCK_ROWS, n)
+            a = np.sin((latitude[None, :] - latitude[start:stop, None]) / 2)
+            a *= a
+            b = np.sin((longitude[None, :] - longitude[start:stop, None]) / 2)
+            b *= b
+            b *= cos_latitude[start:stop, None]
+            b *= cos_latitude[None, :]
+            a += b
+            np.sqrt(a, out=a)
+            np.arcsin(a, out=a)
+            a *= 2 * 6371  # Earth's radius in km
+            self.matrix[start:stop] = a
+
+    def __len__(self):
+        return len(self.facility_ids)
+
+    def code(self, facility_id: str) -> int | None:
+        return self.codes.get(facility_id)
+
+    def distance(self, from_facility_id: str, to_facility_id: str) -> float | None:
+        """km between two facilities, None if either is unknown."""
+        i = self.codes.get(from_facility_id)
+        j = self.codes.get(to_facility_id)
+        if i is None or j is None:
+            return None
+        return float(self.matrix[i, j])
+
+
+_distances_cache = {"key": None, "distances": None}
+
+
+def facility_distances(facilities: List[Dict]) -> FacilityDistances:
+    """
+    FacilityDistances of a facilities table, cached until the table changes
+    (facility ids or coordinates).
+    """
+    key = hash(tuple((f["facility_id"], f["latitude"], f["longitude"]) for f in facilities))
+    if _distances_cache["key"] != key:
+        _distances_cache["distances"] = FacilityDistances(facilities)
+        _distances_cache["key"] = key
+    return _distances_cache["distances"]
@@ -0,0 +1,73 @@
+"""
+Ids of simulation records.
+
+Simulation ids are primary keys in SQLite, and several runs, worker processes
+and shards can write to one database. An id is therefore a run id plus a
+sequence number, e.g. MOV_3f9c2a71d0be_17 or EVT_3f9c2a71d0be_4:
+
+- the run id is a random token, drawn when the process starts, again in every
+  forked child and by new_run()
+- sequences count from 1 within a run
+
+so ids never repeat across runs and nothing is derived from the clock.
+"""
+
+from typing import List
+import itertools
+import os
+import uuid
+
+
+def _token() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+_run_id = _token()
+_sequences: List["IdSequence"] = []
+
+
+class IdSequence:
+    """consecutive id numbers within the current run, back at 1 on new_run()."""
+
+    def __init__(self):
+        self.counter = itertools.count(1)
+        _sequences.append(self)
+
+    def next(self) -> int:
+        return next(self.counter)
+
+    def take(self, count: int) -> int:
+        """count consecutive numbers at once, returns the first."""
+        first = next(self.counter)
+        self.counter = itertools.count(first + count)
+        return first
+
+    def position(self) -> int:
+        """number the next id will get."""
+        position = next(self.counter)
+        self.counter = itertools.count(position)
+        return position
+
+    def set_position(self, position: int):
+        self.counter = itertools.count(position)
+
+
+def run_id() -> str:
+    return _run_id
+
+
+def new_run(run: str | None = None) -> str:
+    """
+    Start a new id namespace: a fresh run id (or run, to continue a saved one)
+    with every sequence back at 1. Returns the run id.
+    """
+    global _run_id
+    _run_id = run or _token()
+    for sequence in _sequences:
+        sequence.set_position(1)
+    return _run_id
+
+
+# a forked child must not continue the parent's run
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=new_run)
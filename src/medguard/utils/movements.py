@@ -0,0 +1,39 @@
+"""
+Field access over movement records, whatever holds them.
+
+Detectors run on the simulation's columnar MovementLog and on plain lists of
+movement dicts (db and context code). movement_rows() reads either one: an
+object with a rows(fields, start, movement_types) method is read through it,
+anything else is treated as a list of dicts.
+"""
+
+from datetime import datetime
+from typing import Iterator, Sequence
+
+
+def movement_rows(
+    movements,
+    fields: Sequence[str],
+    start: int = 0,
+    movement_types: Sequence[str] | None = None,
+) -> Iterator[tuple]:
+    """
+    Iterate (field, ...) tuples of movements from start on, optionally only of some
+    movement types. Works on a MovementLog (read from the columns) and on a plain
+    list of movement dicts. Timestamps always come back as datetime.
+    """
+    rows = getattr(movements, "rows", None)
+    if callable(rows):
+        return rows(fields, start, movement_types)
+    return _dict_rows(movements, fields, start, movement_types)
+
+
+def _dict_rows(movements, fields, start, movement_types) -> Iterator[tuple]:
+    types = set(movement_types) if movement_types is not None else None
+    for m in movements[start:]:
+        if types is not None and m["movement_type"] not in types:
+            continue
+        yield tuple(
+            datetime.fromisoformat(m[f]) if f == "timestamp" else m.get(f)
+            for f in fields
+        )
@@ -0,0 +1,180 @@
+"""
+Road travel times between facility cities.
+
+The road graph has one node per facility city and the edges of
+data/seed/roads_data.py weighted with typical travel hours. Dijkstra from every
+node gives an all-pairs minimum travel time table, which is cached on disk
+(keyed by a hash of the road data, so editing roads_data rebuilds it) and turns
+"how long does it take to drive from facility A to facility B" into one array
+lookup.
+
+The cache lives in $MEDGUARD_CACHE_DIR, or the user cache directory
+($XDG_CACHE_HOME/medguard, ~/.cache/medguard). Every process writes it under its
+own temporary name and renames it into place, and a cache that cannot be read
+is rebuilt, so parallel workers can start at the same time.
+
+    travel = facility_travel_times(facilities)
+    travel.hours("FAC_001", "FAC_017")
+    travel.eta("FAC_001", "FAC_017", departure)
+"""
+
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+import hashlib
+import heapq
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+
+from medguard.data.seed.roads_data import roads_data
+
+CACHE_FILE_NAME = "travel_times.npz"
+
+
+def default_cache_dir() -> Path:
+    """$MEDGUARD_CACHE_DIR, else medguard in the user cache directory."""
+    configured = os.environ.get("MEDGUARD_CACHE_DIR")
+    if configured:
+        return Path(configured)
+    user_cache = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(user_cache) / "medguard"
+
+
+DEFAULT_CACHE_PATH = default_cache_dir() / CACHE_FILE_NAME
+
+
+def _roads_key(roads: List[Tuple[str, str, float]]) -> str:
+    return hashlib.sha1(repr(sorted(roads)).encode()).hexdigest()
+
+
+def all_pairs_travel_hours(
+    roads: List[Tuple[str, str, float]],
+) -> Tuple[List[str], np.ndarray]:
+    """
+    Minimum travel hours between every pair of cities (Dijkstra from each city).
+
+    Returns:
+        (cities, hours) with hours[i, j] from cities[i] to cities[j], inf if unreachable
+    """
+    cities = sorted({city for a, b, _ in roads for city in (a, b)})
+    index = {city: i for i, city in enumerate(cities)}
+
+    adjacency = [[] for _ in cities]
+    for a, b, hours in roads:
+        adjacency[index[a]].append((index[b], hours))
+        adjacency[index[b]].append((index[a], hours))
+
+    n = len(cities)
+    table = np.full((n, n), np.inf, dtype=np.float32)
+    for source in range(n):
+        best = [float("inf")] * n
+        best[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            hours, node = heapq.heappop(heap)
+            if hours > best[node]:
+                continue
+            for neighbour, edge_hours in adjacency[node]:
+                candidate = hours + edge_hours
+                if candidate < best[neighbour]:
+                    best[neighbour] = candidate
+                    heapq.heappush(heap, (candidate, neighbour))
+        table[source] = best
+
+    return cities, table
+
+
+def load_travel_hours(
+    roads: List[Tuple[str, str, float]] = roads_data,
+    cache_path: Path | None = DEFAULT_CACHE_PATH,
+) -> Tuple[List[str], np.ndarray]:
+    """all_pairs_travel_hours, read from cache_path when it matches roads, else computed and cached."""
+    key = _roads_key(roads)
+    if cache_path is not None:
+        try:
+            with np.load(cache_path) as cached:
+                if str(cached["key"]) == key:
+                    return cached["cities"].tolist(), cached["hours"]
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            pass  # missing, truncated or from another format: rebuild it
+
+    cities, table = all_pairs_travel_hours(roads)
+    if cache_path is not None:
+        _write_cache(Path(cache_path), key, cities, table)
+    return cities, table
+
+
+def _write_cache(cache_path: Path, key: str, cities: List[str], table: np.ndarray):
+    """write under a name of this process's own and rename into place."""
+    tmp_path = None
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=cache_path.parent, prefix=cache_path.name, suffix=".tmp", delete=False
+        ) as f:
+            tmp_path = f.name
+            np.savez(f, key=key, cities=np.array(cities), hours=table)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # read-only cache directory, the table is cheap enough to rebuild
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+class TravelTimes:
+    """minimum road travel hours between facilities, one lookup per pair."""
+
+    def __init__(
+        self,
+        facilities: List[Dict],
+        roads: List[Tuple[str, str, float]] = roads_data,
+        cache_path: Path | None = DEFAULT_CACHE_PATH,
+    ):
+        cities, self.city_hours = load_travel_hours(roads, cache_path)
+        self.city_codes = {city: i for i, city in enumerate(cities)}
+
+        # facility -> city node, facilities in a city without roads are left out
+        self.facility_nodes = {
+            f["facility_id"]: self.city_codes[f["city"]]
+            for f in facilities
+            if f.get("city") in self.city_codes
+        }
+
+    def hours(self, from_facility_id: str, to_facility_id: str) -> float | None:
+        """typical hours by road, None if either facility is not on the road graph."""
+        i = self.facility_nodes.get(from_facility_id)
+        j = self.facility_nodes.get(to_facility_id)
+        if i is None or j is None:
+            return None
+        return float(self.city_hours[i, j])
+
+    def max_hours(self) -> float:
+        """longest finite road travel time between two facilities, 0 if there is none."""
+        nodes = sorted(set(self.facility_nodes.values()))
+        hours = self.city_hours[np.ix_(nodes, nodes)]
+        finite = hours[np.isfinite(hours)]
+        return float(finite.max()) if finite.size else 0.0
+
+    def eta(
+        self, from_facility_id: str, to_facility_id: str, departure: datetime
+    ) -> datetime | None:
+        """arrival time of a transfer leaving at departure."""
+        hours = self.hours(from_facility_id, to_facility_id)
+        if hours is None or hours == float("inf"):
+            return None
+        return departure + timedelta(hours=hours)
+
+
+_travel_cache = {"key": None, "travel": None}
+
+
+def facility_travel_times(facilities: List[Dict]) -> TravelTimes:
+    """TravelTimes of a facilities table, cached until facility ids or cities change."""
+    key = hash(tuple((f["facility_id"], f.get("city")) for f in facilities))
+    if _travel_cache["key"] != key:
+        _travel_cache["travel"] = TravelTimes(facilities)
+        _travel_cache["key"] = key
+    return _travel_cache["travel"]
@@ -0,0 +1,184 @@
+"""
+Spatial index over facilities.
+
+FacilityIndex buckets facilities into a latitude/longitude grid of roughly
+cell_km cells. A radius query only computes haversine distances for the
+facilities in the cells the circle overlaps, and a k-nearest query widens the
+radius until it holds k matches. Both take equality filters on any facility
+column (has_cold_storage=True, tier="TERTIARY", facility_type=[...]).
+
+    index = FacilityIndex.from_db()
+    index.within("FAC_001", 50, has_cold_storage=True)
+    index.nearest("FAC_001", 3, tier="TERTIARY")
+
+Build it again (FacilityIndex(facilities) / from_db) when the facilities table
+changes.
+"""
+
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import math
+
+import numpy as np
+
+from medguard.db.database import get_connection_to_db
+from medguard.utils.geo import haversine_distances
+
+KM_PER_DEGREE = 111.195  # along a meridian, Earth's radius 6371 km
+HALF_EARTH_KM = math.pi * 6371
+
+DEFAULT_CELL_KM = 5
+
+
+class FacilityIndex:
+    """grid index of facility coordinates for radius and k-nearest queries."""
+
+    def __init__(self, facilities: List[Dict], cell_km: float = DEFAULT_CELL_KM):
+        self.facilities = facilities
+        self.facility_ids = [f["facility_id"] for f in facilities]
+        self.codes = {facility_id: i for i, facility_id in enumerate(self.facility_ids)}
+        self.latitude = np.array([f["latitude"] for f in facilities], dtype=np.float64)
+        self.longitude = np.array([f["longitude"] for f in facilities], dtype=np.float64)
+
+        self.cell_degrees = cell_km / KM_PER_DEGREE
+        rows = np.floor(self.latitude / self.cell_degrees).astype(np.int64)
+        cols = np.floor(self.longitude / self.cell_degrees).astype(np.int64)
+
+        cells = defaultdict(list)
+        for code, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            cells[cell].append(code)
+        self.cells = {cell: np.array(codes, dtype=np.int64) for cell, codes in cells.items()}
+
+        self.columns: Dict[str, np.ndarray] = {}  # filter columns, built on first use
+
+    @classmethod
+    def from_db(
+        cls, db_path: Optional[Path] = None, cell_km: float = DEFAULT_CELL_KM
+    ) -> "FacilityIndex":
+        """index of the facilities table."""
+        conn = get_connection_to_db(db_path)
+        rows = conn.execute("SELECT * FROM facilities").fetchall()
+        conn.close()
+        return cls([dict(row) for row in rows], cell_km)
+
+    def __len__(self):
+        return len(self.facility_ids)
+
+    def _column(self, name: str) -> np.ndarray:
+        column = self.columns.get(name)
+        if column is None:
+            column = np.array([f.get(name) for f in self.facilities])
+            self.columns[name] = column
+        return column
+
+    def _matches(self, codes: np.ndarray, filters: Dict) -> np.ndarray:
+        keep = np.ones(len(codes), dtype=bool)
+        for name, value in filters.items():
+            column = self._column(name)[codes]
+            if isinstance(value, (list, tuple, set)):
+                keep &= np.logical_or.reduce([column == v for v in value])
+            else:
+                keep &= column == value
+        return keep
+
+    def _point(self, origin: str | Tuple[float, float]) -> Tuple[float, float, int | None]:
+        if isinstance(origin, str):
+            code = self.codes[origin]
+            return self.latitude[code], self.longitude[code], code
+        latitude, longitude = origin
+        return latitude, longitude, None
+
+    def _candidates(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """codes in the grid cells a circle of radius_km around the point overlaps."""
+        lat_span = radius_km / KM_PER_DEGREE
+        widest = min(abs(latitude) + lat_span, 89.9)
+        lon_span = lat_span / math.cos(math.radians(widest))
+
+        if radius_km >= HALF_EARTH_KM or abs(longitude) + lon_span >= 180:
+            return np.arange(len(self.facility_ids))  # whole globe or crosses 180
+
+        row_min = math.floor((latitude - lat_span) / self.cell_degrees)
+        row_max = math.floor((latitude + lat_span) / self.cell_degrees)
+        col_min = math.floor((longitude - lon_span) / self.cell_degrees)
+        col_max = math.floor((longitude + lon_span) / self.cell_degrees)
+
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            parts = [
+                codes
+                for (row, col), codes in self.cells.items()
+                if row_min <= row <= row_max and col_min <= col <= col_max
+            ]
+        else:
+            parts = [
+                self.cells[(row, col)]
+                for row in range(row_min, row_max + 1)
+                for col in range(col_min, col_max + 1)
+                if (row, col) in self.cells
+            ]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def _query(
+        self, origin: str | Tuple[float, float], radius_km: float, filters: Dict
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(codes, distances) within radius_km of origin, unordered."""
+        latitude, longitude, origin_code = self._point(origin)
+        codes = self._candidates(latitude, longitude, radius_km)
+
+        distances = haversine_distances(
+            latitude, longitude, self.latitude[codes], self.longitude[codes]
+        )
+        keep = distances <= radius_km
+        if origin_code is not None:
+            keep &= codes != origin_code
+        codes, distances = codes[keep], distances[keep]
+        if filters:
+            keep = self._matches(codes, filters)
+            codes, distances = codes[keep], distances[keep]
+        return codes, distances
+
+    def _ranked(self, codes: np.ndarray, distances: np.ndarray) -> List[Tuple[str, float]]:
+        order = np.argsort(distances, kind="stable")
+        return [
+            (self.facility_ids[code], distance)
+            for code, distance in zip(codes[order].tolist(), distances[order].tolist())
+        ]
+
+    def within(
+        self, origin: str | Tuple[float, float], radius_km: float, **filters
+    ) -> List[Tuple[str, float]]:
+        """
+        Facilities within radius_km of origin, nearest first.
+
+        Args:
+            origin: facility_id (excluded from the result) or a (latitude, longitude)
+            filters: facility column -> required value, or a list of allowed values
+
+        Returns:
+            [(facility_id, distance_km), ...]
+        """
+        return self._ranked(*self._query(origin, radius_km, filters))
+
+    def nearest(
+        self,
+        origin: str | Tuple[float, float],
+        k: int = 1,
+        max_km: float | None = None,
+        **filters,
+    ) -> List[Tuple[str, float]]:
+        """the k facilities nearest to origin (optionally within max_km), nearest first."""
+        limit = HALF_EARTH_KM if max_km is None else max_km
+        radius_km = min(self.cell_degrees * KM_PER_DEGREE, limit)
+        while True:
+            codes, distances = self._query(origin, radius_km, filters)
+            # everything outside the radius is further than what was found
+            if len(codes) >= k or radius_km >= limit:
+                break
+            radius_km = min(radius_km * 2, limit)
+
+        if len(codes) > k:
+            top = np.argpartition(distances, k - 1)[:k]
+            codes, distances = codes[top], distances[top]
+        return self._ranked(codes, distances)
@@ -0,0 +1,43 @@
+from datetime import timedelta
+from typing import List
+
+import pytest
+
+from medguard.data.generators.network import generate_network
+from medguard.simulation.engine import START_TIME, SimulationEngine
+
+
+@pytest.fixture
+def network():
+    """a small synthetic network, built per test because engines change its inventory rows."""
+    return generate_network(n_facilities=20, n_medications=15, seed=1)
+
+
+@pytest.fixture
+def make_engine(network):
+    """
+    initialized engine over a copy of the network's inventory rows, days long,
+    demo scenarios off unless asked for (True for the defaults, or a list of
+    scenarios).
+    """
+
+    def make(days: float = 2, scenarios: bool | List[tuple] = False, **kwargs):
+        kwargs.setdefault("vectorized", True)
+        kwargs.setdefault("seed", 1)
+        kwargs.setdefault("verbose", False)
+        engine = SimulationEngine(
+            inventory=[dict(inv) for inv in network["inventory"]],
+            medications=network["medications"],
+            facilities=network["facilities"],
+            batches=network["batches"],
+            start_time=START_TIME,
+            end_time=START_TIME + timedelta(days=days),
+            **kwargs,
+        )
+        if isinstance(scenarios, list):
+            engine.initialize(scenarios=scenarios)
+        else:
+            engine.initialize(schedule_scenarios=scenarios)
+        return engine
+
+    return make
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+import pytest
+
+from medguard.detection.anomalies import anomaly_signature, generate_anomalies
+from medguard.simulation.scenarios import COUNTERFEIT_BATCH_SCENARIO, DEMO_SCENARIOS
+
+SCENARIOS = DEMO_SCENARIOS + [(20,) + COUNTERFEIT_BATCH_SCENARIO[1:]]
+
+
+def _signatures(anomalies):
+    return sorted(anomaly_signature(anomaly) for anomaly in anomalies)
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"vectorized": False}, {"vectorized": True}, {"fast_forward": timedelta(days=1)}],
+    ids=["scalar", "vectorized", "fast-forward"],
+)
+def test_anomaly_engine_matches_a_full_rescan(network, make_engine, monkeypatch, options):
+    engine = make_engine(days=3, scenarios=SCENARIOS, **options)
+    anomaly_engine = engine.anomaly_engine
+    streaming_detect = anomaly_engine.detect
+
+    def detect(*, inventory, movements, current_time):
+        expected = generate_anomalies(
+            inventory=inventory,
+            movements=movements.to_dicts(),
+            events=engine.events_log,
+            facilities=network["facilities"],
+            batches=engine.batches,
+            current_time=current_time,
+            existing_anomalies=engine.anomalies_log,
+        )
+        detected = streaming_detect(
+            inventory=inventory, movements=movements, current_time=current_time
+        )
+        assert _signatures(detected) == _signatures(expected)
+        return detected
+
+    monkeypatch.setattr(anomaly_engine, "detect", detect)
+    engine.run()
+
+    assert {a["anomaly_type"] for a in engine.anomalies_log} >= {
+        "GEOGRAPHIC_IMPOSSIBILITY",
+        "IMPOSSIBLE_QUANTITY",
+        "DUPLICATE_BATCH_NUMBER",
+    }
@@ -0,0 +1,75 @@
+from datetime import timedelta
+import pickle
+
+import numpy as np
+import pytest
+
+from medguard.simulation.checkpoint import dumps, loads, resume
+
+# ids come from process-wide sequences, and restock / transfer references from
+# the random module, neither is part of a run's state
+MOVEMENT_IDS = ("movement_id", "transfer_id")
+RECORD_IDS = ("event_id", "anomaly_id", "detected_at")
+
+
+def _without(record, keys):
+    return {k: v for k, v in dict(record).items() if k not in keys}
+
+
+def _comparable(result):
+    movements = []
+    for m in result["movements"]:
+        m = _without(m, MOVEMENT_IDS)
+        if m["movement_type"] != "DISPENSE":
+            del m["reference_id"]
+        movements.append(m)
+    return {
+        "movements": movements,
+        "events": [_without(e, RECORD_IDS) for e in result["events"]],
+        "anomalies": [_without(a, RECORD_IDS) for a in result["anomalies"]],
+        "final_inventory": result["final_inventory"],
+    }
+
+
+def test_checkpoint_leaves_out_facility_caches(make_engine):
+    engine = make_engine(days=1)
+    engine.run_until(engine.start_time + (engine.end_time - engine.start_time) / 2)
+    anomaly_engine = engine.anomaly_engine
+
+    copy = pickle.loads(pickle.dumps(anomaly_engine))
+    assert "distances" not in anomaly_engine.__getstate__()
+    assert "travel" not in anomaly_engine.__getstate__()
+
+    # rebuilt from the facilities table
+    assert np.array_equal(copy.distances.matrix, anomaly_engine.distances.matrix)
+    assert copy.travel.max_hours() == anomaly_engine.travel.max_hours()
+
+    restored = loads(dumps(engine))
+    assert restored.anomaly_engine.distances is not None
+    assert restored.anomaly_engine.restock_horizon == anomaly_engine.restock_horizon
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"vectorized": False}, {"vectorized": True}, {"fast_forward": timedelta(hours=12)}],
+    ids=["scalar", "vectorized", "fast-forward"],
+)
+def test_resumed_run_matches_an_uninterrupted_one(tmp_path, make_engine, options):
+    uninterrupted = make_engine(days=3, scenarios=True, **options).run()
+
+    path = tmp_path / "sim.ckpt"
+    engine = make_engine(
+        days=3,
+        scenarios=True,
+        checkpoint_path=path,
+        checkpoint_every=timedelta(hours=30),
+        **options,
+    )
+    # stopped a while after the checkpoint, the work since then is lost
+    engine.run_until(engine.start_time + timedelta(hours=40))
+    assert path.exists()
+
+    resumed = resume(path)
+
+    assert resumed["simulation_end"] == uninterrupted["simulation_end"]
+    assert _comparable(resumed) == _comparable(uninterrupted)
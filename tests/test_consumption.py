@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+import random
+
+from medguard.detection.consumption import ConsumptionWindows, _hour
+
+T0 = datetime(2026, 1, 3)
+WINDOWS = (3, 24, 168)
+KEYS = [("FAC_1", "MED_1"), ("FAC_1", "MED_2"), ("FAC_2", "MED_1")]
+
+
+def _naive(dispenses, key, hours, current_time):
+    """dispenses of key from current_time - hours to current_time, at hour resolution."""
+    end = _hour(current_time)
+    return sum(
+        quantity
+        for k, ts, quantity in dispenses
+        if k == key and end - hours <= _hour(ts) <= end
+    )
+
+
+def test_windows_match_a_naive_sum():
+    rand = random.Random(7)
+    windows = ConsumptionWindows(WINDOWS)
+    dispenses = []
+    now = T0
+
+    for _ in range(500):
+        # mostly hourly steps, sometimes a gap longer than the largest window
+        step = rand.choice([0, 1, 1, 1, 2, 5, 30, 200])
+        now += timedelta(hours=step, minutes=rand.randrange(60) if step else 0)
+        windows.advance(now)
+
+        for _ in range(rand.randrange(4)):
+            key = rand.choice(KEYS)
+            # late arrivals up to just past the largest window
+            ts = now - timedelta(hours=rand.choice([0, 0, 0, 1, 23, 24, 25, 168, 169]))
+            quantity = rand.randint(1, 50)
+            windows.add(key, ts, quantity)
+            dispenses.append((key, ts, quantity))
+
+        for hours in WINDOWS:
+            expected = {key: _naive(dispenses, key, hours, now) for key in KEYS}
+            for key in KEYS:
+                assert windows.dispensed(key, hours) == expected[key]
+            assert windows.nonzero(hours) == {k: q for k, q in expected.items() if q}
+
+    assert windows.dispensed(("FAC_9", "MED_9"), 24) == 0
+
+
+def test_pairs_grow_past_the_initial_capacity():
+    windows = ConsumptionWindows((24,))
+    for i in range(1000):
+        windows.add(("FAC", i), T0, i + 1)
+
+    assert len(windows) == 1000
+    assert windows.dispensed(("FAC", 999), 24) == 1000
+    assert sum(windows.nonzero(24).values()) == sum(range(1, 1001))
+    windows.advance(T0 + timedelta(hours=25))
+    assert windows.nonzero(24) == {}
@@ -0,0 +1,50 @@
+import sqlite3
+
+from medguard.db.database import get_connection_to_db, init_database, insert_events
+
+# events table as created before resolved_at was added
+OLD_EVENTS_TABLE = """
+    CREATE TABLE events (
+        event_id TEXT PRIMARY KEY,
+        event_type TEXT,
+        severity TEXT,
+        facility_id TEXT,
+        batch_id TEXT,
+        timestamp TEXT,
+        detected_at TEXT,
+        details TEXT,
+        data TEXT,
+        source TEXT,
+        is_active INTEGER
+    )
+"""
+
+
+def test_init_database_adds_resolved_at_to_old_databases(tmp_path):
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(OLD_EVENTS_TABLE)
+    conn.execute("INSERT INTO events (event_id, event_type) VALUES ('EVT_OLD', 'LOW_STOCK')")
+    conn.commit()
+    conn.close()
+
+    init_database(db_path)
+    # running it again on an up to date database is a no-op
+    init_database(db_path)
+
+    conn = get_connection_to_db(db_path)
+    insert_events(
+        [
+            {
+                "event_id": "EVT_NEW",
+                "event_type": "LOW_STOCK",
+                "is_active": False,
+                "resolved_at": "2026-01-04T10:00:00",
+            }
+        ],
+        conn,
+    )
+    rows = dict(conn.execute("SELECT event_id, resolved_at FROM events").fetchall())
+    conn.close()
+
+    assert rows == {"EVT_OLD": None, "EVT_NEW": "2026-01-04T10:00:00"}
@@ -0,0 +1,16 @@
+import random
+
+
+def _dispense_references(movements):
+    return [m["reference_id"] for m in movements if m["movement_type"] == "DISPENSE"]
+
+
+def test_scalar_dispense_references_follow_the_engine_seed(make_engine):
+    first = make_engine(days=1, vectorized=False).run()
+
+    random.seed(99)  # the module-wide stream must not matter
+    second = make_engine(days=1, vectorized=False).run()
+
+    references = _dispense_references(first["movements"])
+    assert references
+    assert references == _dispense_references(second["movements"])
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from medguard.detection.events import create_event, event_signature, generate_events
+
+T0 = datetime(2026, 1, 3)
+
+
+def _signatures(events):
+    return sorted(event_signature(event) for event in events)
+
+
+def test_generate_events_leaves_existing_events_unchanged():
+    # the condition no longer holds: no inventory left to be low on stock
+    existing = [
+        create_event(
+            event_type="LOW_STOCK",
+            severity="MEDIUM",
+            facility_id="FAC_1",
+            med_id="MED_1",
+            batch_id="BAT_1",
+            timestamp=T0,
+            details="low",
+        ),
+        {
+            "event_type": "STOCKOUT",
+            "facility_id": "FAC_1",
+            "med_id": "MED_1",
+            "batch_id": "BAT_1",
+            "is_active": True,
+        },
+    ]
+    before = [dict(event) for event in existing]
+
+    new_events = generate_events(
+        inventory=[],
+        movements=[],
+        medications=[],
+        current_time=T0,
+        existing_events=existing,
+    )
+
+    assert new_events == []
+    assert [dict(event) for event in existing] == before
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"vectorized": False}, {"vectorized": True}, {"fast_forward": timedelta(days=1)}],
+    ids=["scalar", "vectorized", "fast-forward"],
+)
+def test_event_detector_matches_a_full_rescan(network, make_engine, monkeypatch, options):
+    engine = make_engine(days=3, scenarios=True, **options)
+    detector = engine.event_detector
+    streaming_detect = detector.detect
+    cycles = []
+
+    def detect(*, inventory, movements, current_time, arrays=None):
+        expected = generate_events(
+            inventory=inventory,
+            movements=movements.to_dicts(),
+            medications=network["medications"],
+            current_time=current_time,
+            existing_events=engine.events_log,
+        )
+        detected = streaming_detect(
+            inventory=inventory, movements=movements, current_time=current_time, arrays=arrays
+        )
+        assert _signatures(detected) == _signatures(expected)
+        cycles.append(len(detected))
+        return detected
+
+    monkeypatch.setattr(detector, "detect", detect)
+    engine.run()
+
+    assert len(cycles) > 1
+    assert sum(cycles) > 0
+    assert any(event["event_type"] == "RAPID_CONSUMPTION" for event in engine.events_log)
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from medguard.simulation.engine import START_TIME
+from medguard.simulation.inventory_state import ExpiryCalendar
+
+
+def _dispensed(movements):
+    return -sum(m["quantity_change"] for m in movements if m["movement_type"] == "DISPENSE")
+
+
+def _dispensing_rows(movements):
+    return {m["inventory_id"] for m in movements if m["movement_type"] == "DISPENSE"}
+
+
+def test_expiry_calendar_fires_on_the_expiry_date():
+    calendar = ExpiryCalendar(
+        [
+            {"expiry_date": "2026-01-05"},
+            {"expiry_date": "2026-01-04"},
+            {"expiry_date": None},
+            {"expiry_date": "not a date"},
+        ]
+    )
+
+    assert calendar.due(datetime(2026, 1, 3, 23)) == []
+    assert calendar.due(datetime(2026, 1, 4)) == [1]
+    assert calendar.due(datetime(2026, 1, 4, 23)) == []
+    assert calendar.due(datetime(2026, 1, 5)) == [0]
+    assert calendar.next_expiry_ordinal() is None
+
+    # stock received by an expired row is withdrawn on the next tick, once
+    assert calendar.rearm(1)
+    assert not calendar.rearm(2)
+    assert calendar.due(datetime(2026, 1, 5, 1)) == [1]
+    assert calendar.due(datetime(2026, 1, 5, 2)) == []
+
+    calendar.add(4, "2026-01-03")  # already past
+    assert calendar.due(datetime(2026, 1, 5, 3)) == [4]
+
+
+@pytest.mark.parametrize("skip_closed_hours", [False, True])
+def test_engine_withdraws_expired_stock_at_midnight_of_the_expiry_date(
+    network, make_engine, skip_closed_hours
+):
+    expiry = START_TIME.date() + timedelta(days=1)
+    expiring = {inv["inventory_id"] for inv in network["inventory"][::5]}
+    for inv in network["inventory"]:
+        if inv["inventory_id"] in expiring:
+            inv["expiry_date"] = expiry.isoformat()
+
+    result = make_engine(days=2, skip_closed_hours=skip_closed_hours).run()
+
+    first_withdrawal = {}
+    for m in result["movements"]:
+        if m["movement_type"] == "EXPIRY_WITHDRAW":
+            first_withdrawal.setdefault(m["inventory_id"], m["timestamp"])
+
+    midnight = datetime.combine(expiry, datetime.min.time()).isoformat()
+    withdrawn_at = {first_withdrawal[i] for i in expiring if i in first_withdrawal}
+    assert withdrawn_at == {midnight}
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"vectorized": False},
+        {"vectorized": True},
+        {"vectorized": True, "skip_closed_hours": True},
+        {"fast_forward": timedelta(days=1)},
+    ],
+    ids=["scalar", "vectorized", "skip-closed-hours", "fast-forward"],
+)
+def test_dispensing_keeps_stock_consistent(network, make_engine, options):
+    initial = {inv["inventory_id"]: inv["quantity"] for inv in network["inventory"]}
+    engine = make_engine(days=3, **options)
+    result = engine.run()
+
+    quantity = dict(initial)
+    for m in result["movements"]:
+        assert m["quantity_after"] >= 0
+        assert m["quantity_before"] + m["quantity_change"] == m["quantity_after"]
+        if m["movement_type"] == "DISPENSE":
+            assert m["quantity_change"] < 0
+        # each movement starts from where the row's previous one left it
+        expected = quantity.get(m["inventory_id"], m["quantity_before"])
+        assert m["quantity_before"] == expected
+        quantity[m["inventory_id"]] = m["quantity_after"]
+
+    for inv in result["final_inventory"]:
+        assert inv["quantity"] == quantity[inv["inventory_id"]]
+    if engine.inventory_arrays is not None:
+        assert engine.inventory_arrays.quantity.tolist() == [
+            inv["quantity"] for inv in result["final_inventory"]
+        ]
+
+
+def test_vectorized_and_scalar_dispense_alike(make_engine):
+    # same demand model, different draws: totals and the rows that dispense agree
+    scalar = make_engine(days=3, vectorized=False).run()
+    vectorized = make_engine(days=3, vectorized=True).run()
+
+    dispensed = _dispensed(scalar["movements"])
+    assert dispensed > 0
+    assert _dispensed(vectorized["movements"]) == pytest.approx(dispensed, rel=0.05)
+
+    rows = _dispensing_rows(scalar["movements"])
+    assert len(rows ^ _dispensing_rows(vectorized["movements"])) <= 0.02 * len(rows)
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+import random
+
+from medguard.detection.ledger import BatchLedger
+from medguard.simulation.engine import START_TIME, SimulationEngine
+from medguard.simulation.montecarlo import build_seed_network
+
+T0 = datetime(2026, 1, 3)
+
+
+def _movement(movement_type, quantity_change, source="SIMULATION", quantity_after=None):
+    movement = {
+        "batch_id": "BAT_1",
+        "facility_id": "FAC_1",
+        "movement_type": movement_type,
+        "quantity_change": quantity_change,
+        "source": source,
+        "timestamp": T0.isoformat(),
+    }
+    if quantity_after is not None:
+        movement["quantity_after"] = quantity_after
+    return movement
+
+
+def test_restocks_add_to_supply():
+    ledger = BatchLedger([{"batch_id": "BAT_1", "initial_quantity": 100}])
+    ledger.update(
+        [
+            _movement("RESTOCK", 100, source="INITIAL_SEED", quantity_after=100),
+            _movement("DISPENSE", -100),
+            _movement("RESTOCK", 50),
+            _movement("DISPENSE", -40),
+        ]
+    )
+    assert ledger.supply("BAT_1") == 150
+    assert ledger.over_supply() == []
+
+    ledger.update([_movement("DISPENSE", -20)], start=0)
+    assert ledger.over_supply() == ["BAT_1"]
+
+
+def test_opening_stock_above_initial_quantity():
+    # the seed receipt is booked on top of the opening quantity
+    ledger = BatchLedger([{"batch_id": "BAT_1", "initial_quantity": 100}])
+    ledger.update(
+        [
+            _movement("RESTOCK", 80, source="INITIAL_SEED", quantity_after=160),
+            _movement("DISPENSE", -150),
+        ]
+    )
+    assert ledger.supply("BAT_1") == 160
+    assert ledger.over_supply() == []
+
+
+def test_long_run_restocked_batches_not_flagged():
+    # the seed network opens some batches close to their initial_quantity
+    random.seed(1)
+    network = build_seed_network()
+    engine = SimulationEngine(
+        inventory=network["inventory"],
+        medications=network["medications"],
+        facilities=network["facilities"],
+        batches=network["batches"],
+        start_time=START_TIME,
+        end_time=START_TIME + timedelta(days=60),
+        seed=1,
+        verbose=False,
+        fast_forward=timedelta(days=1),
+    )
+    engine.initialize(schedule_scenarios=False)
+    result = engine.run()
+
+    # restocks go out under the batch of the inventory row
+    assert engine.anomaly_engine.ledger.restocked
+    assert not [
+        a for a in result["anomalies"] if a["anomaly_type"] == "IMPOSSIBLE_QUANTITY"
+    ]
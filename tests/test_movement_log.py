@@ -0,0 +1,126 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from medguard.data.generators.movements import (
+    dispense,
+    expiry_withdraw,
+    restock,
+    transfer_out,
+)
+from medguard.simulation.movement_log import MovementLog, to_seconds
+
+T0 = datetime(2026, 1, 3, 9)
+
+
+def _inventory():
+    return {
+        "inventory_id": "INV_1",
+        "facility_id": "FAC_1",
+        "batch_id": "BAT_1",
+        "med_id": "MED_1",
+        "quantity": 100,
+    }
+
+
+def _movements():
+    inv = _inventory()
+    movements = [
+        restock(inv, 50, T0, source="INITIAL_SEED"),
+        dispense(inv, 30, T0, source="SIMULATION", generator=np.random.default_rng(1)),
+        transfer_out(inv, 20, T0, "FAC_2", transfer_id="TXF_1"),
+        expiry_withdraw(inv, 500, T0),
+    ]
+    # ids that don't split into prefix + number, and a missing key
+    movements.append(dict(movements[1], reference_id="DIS_007", movement_id="MOV_X"))
+    movements.append(dict(movements[1], reference_id=None))
+    del movements[-1]["quantity_before"]
+    return movements
+
+
+def test_round_trip():
+    movements = _movements()
+    log = MovementLog(chunk_size=2)
+    log.extend(movements)
+
+    assert len(log) == len(movements)
+    assert log.to_dicts() == movements
+    assert list(log) == movements
+    assert log[-1] == movements[-1]
+    assert log[2]["transfer_id"] == "TXF_1"
+
+    with pytest.raises(IndexError):
+        log.row(len(movements))
+
+
+def test_append_columns_matches_append():
+    movements = _movements()[:2]
+    log = MovementLog()
+    log.extend(movements)
+
+    columnar = MovementLog()
+    columns = {
+        name: columnar.intern(name, [m[name] for m in movements])
+        for name in ("inventory_id", "facility_id", "batch_id", "med_id", "movement_type")
+    }
+    for name in ("movement_id", "reference_id"):
+        prefixes, numbers = zip(*(m[name].rsplit("_", 1) for m in movements))
+        columns[name] = columnar.intern(name, [p + "_" for p in prefixes])
+        columns[name + "_number"] = np.array([int(n) for n in numbers])
+    for name in ("quantity_before", "quantity_change", "quantity_after"):
+        columns[name] = np.array([m[name] for m in movements])
+    columns["source"] = columnar.intern("source", [m["source"] for m in movements])
+    columns["reason"] = columnar.intern("reason", [m["reason"] for m in movements])
+    columns["timestamp"] = to_seconds(T0)
+    columnar.append_columns(len(movements), **columns)
+
+    assert columnar.to_dicts() == log.to_dicts()
+
+    with pytest.raises(KeyError):
+        columnar.append_columns(1, quantity=np.zeros(1))
+
+
+def test_discard_before_keeps_global_indexes():
+    movements = _movements()
+    log = MovementLog(chunk_size=2)
+    log.extend(movements)
+
+    log.discard_before(3)
+    assert len(log) == len(movements)
+    assert log.in_memory == len(movements) - 3
+    assert log.to_dicts() == movements[3:]
+    assert log[3] == movements[3]
+    assert 2 not in log.extras  # the transfer's extra keys went with it
+    assert [r[0] for r in log.rows(["movement_id"])] == [m["movement_id"] for m in movements[3:]]
+    with pytest.raises(IndexError):
+        log.row(2)
+    with pytest.raises(IndexError):
+        log.column("quantity_change", 0)
+
+    # never moves back, and appends continue the global numbering
+    log.discard_before(1)
+    assert log.base == 3
+    log.append(movements[0])
+    assert log[len(movements)] == movements[0]
+
+    log.discard_before(len(log) + 10)
+    assert log.in_memory == 0
+    assert log.to_dicts() == []
+
+
+def test_export_into_another_log():
+    movements = _movements()
+    source = MovementLog()
+    source.extend(movements[:3])
+
+    target = MovementLog()
+    target.append(movements[3])  # different string codes on each side
+    codes = {}
+    target.append_export(source.export(0), codes)
+
+    sizes = source.string_sizes()
+    source.extend(movements[3:])
+    target.append_export(source.export(3, sizes), codes)
+
+    assert target.to_dicts() == movements[3:4] + movements
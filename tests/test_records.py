@@ -0,0 +1,74 @@
+from datetime import datetime
+import multiprocessing
+import time
+
+from medguard.detection.anomalies import create_anomaly
+from medguard.detection.events import create_event
+from medguard.utils.ids import new_run
+
+T0 = datetime(2026, 1, 3)
+
+
+def _event():
+    return create_event(
+        event_type="LOW_STOCK",
+        severity="MEDIUM",
+        facility_id="FAC_1",
+        med_id="MED_1",
+        timestamp=T0,
+        details="low",
+    )
+
+
+def _anomaly():
+    return create_anomaly(
+        anomaly_type="GHOST_STOCK",
+        severity="HIGH",
+        facility_id="FAC_1",
+        med_id="MED_1",
+        batch_id="BAT_1",
+        timestamp=T0,
+        details="ghost",
+    )
+
+
+def _run_part(record_id: str) -> str:
+    return record_id.rsplit("_", 1)[0].split("_", 1)[1]
+
+
+def _event_id_in_child(queue):
+    queue.put(_event()["event_id"])
+
+
+def test_events_and_anomalies_share_one_sequence_per_run():
+    run = new_run()
+    ids = [_event()["event_id"], _anomaly()["anomaly_id"], _event()["event_id"]]
+    assert ids == [f"EVT_{run}_1", f"ANOM_{run}_2", f"EVT_{run}_3"]
+
+    other = new_run()
+    assert other != run
+    assert _event()["event_id"] == f"EVT_{other}_1"
+
+
+def test_forked_process_numbers_records_in_its_own_run():
+    parent = _event()["event_id"]
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=_event_id_in_child, args=(queue,))
+    process.start()
+    child = queue.get(timeout=10)
+    process.join()
+
+    assert _run_part(child) != _run_part(parent)
+
+
+def test_detected_at_is_the_creation_time():
+    before = time.time()
+    event = _event()
+    after = time.time()
+    time.sleep(0.05)
+
+    # isoformat keeps microseconds
+    detected = datetime.fromisoformat(event["detected_at"]).timestamp()
+    assert before - 1e-6 <= detected <= after + 1e-6
@@ -0,0 +1,37 @@
+from medguard.simulation.scenarios import COUNTERFEIT_BATCH_SCENARIO, DEMO_SCENARIOS
+
+# the counterfeit batch scenario, an hour into the run
+COUNTERFEIT_AT_HOUR_1 = [(1,) + COUNTERFEIT_BATCH_SCENARIO[1:]]
+
+
+def _counterfeits(batches):
+    return [b for b in batches if b["batch_id"].endswith("_CF")]
+
+
+def test_default_scenarios_add_no_batches(network, make_engine):
+    assert COUNTERFEIT_BATCH_SCENARIO not in DEMO_SCENARIOS
+
+    engine = make_engine(days=3, scenarios=True)
+    engine.run()
+
+    assert engine.batches == network["batches"]
+    assert {i["anomaly_type"] for i in engine.injections} == {
+        "GEOGRAPHIC_IMPOSSIBILITY",
+        "IMPOSSIBLE_QUANTITY",
+    }
+
+
+def test_counterfeit_batch_is_registered_and_detected(network, make_engine):
+    n_batches = len(network["batches"])
+    engine = make_engine(days=1, scenarios=COUNTERFEIT_AT_HOUR_1)
+    result = engine.run()
+
+    [counterfeit] = _counterfeits(engine.batches)
+    # the engine's own list, not the caller's
+    assert len(network["batches"]) == n_batches
+    assert not _counterfeits(network["batches"])
+
+    duplicates = [a for a in result["anomalies"] if a["anomaly_type"] == "DUPLICATE_BATCH_NUMBER"]
+    assert any(
+        counterfeit["batch_id"] in a["evidence"]["duplicate_batch_ids"] for a in duplicates
+    )
@@ -0,0 +1,90 @@
+from collections import Counter
+from datetime import timedelta
+import multiprocessing
+
+from medguard.db.database import (
+    get_connection_to_db,
+    init_database,
+    insert_batches,
+    insert_brands,
+    insert_companies,
+    insert_facilities,
+    insert_inventory,
+    insert_medications,
+)
+from medguard.simulation.engine import START_TIME, SimulationEngine
+from medguard.simulation.scenarios import COUNTERFEIT_BATCH_SCENARIO
+from medguard.simulation.sink import SQLiteSink
+
+
+def _seed_database(db_path, network):
+    init_database(db_path)
+    conn = get_connection_to_db(db_path)
+    insert_medications(network["medications"], conn)
+    insert_companies(network["companies"], conn)
+    insert_facilities(network["facilities"], conn)
+    insert_brands(network["brands"], conn)
+    insert_batches(network["batches"], conn)
+    insert_inventory(network["inventory"], conn)
+    conn.commit()
+    conn.close()
+
+
+def _sink_run(db_path, network, scenarios=None):
+    conn = get_connection_to_db(db_path)
+    with SQLiteSink(conn=conn) as sink:
+        engine = SimulationEngine(
+            inventory=network["inventory"],
+            medications=network["medications"],
+            facilities=network["facilities"],
+            batches=network["batches"],
+            start_time=START_TIME,
+            end_time=START_TIME + timedelta(days=1),
+            vectorized=True,
+            seed=1,
+            verbose=False,
+            sink=sink,
+        )
+        engine.initialize(schedule_scenarios=scenarios is not None, scenarios=scenarios)
+        engine.run()
+    conn.close()
+
+
+def test_runs_into_one_database_keep_their_movements(tmp_path, network):
+    db_path = tmp_path / "runs.db"
+    _seed_database(db_path, network)
+
+    # two separate processes, the same run replayed
+    context = multiprocessing.get_context("fork")
+    for _ in range(2):
+        process = context.Process(target=_sink_run, args=(db_path, network))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+
+    conn = get_connection_to_db(db_path)
+    ids = [row[0] for row in conn.execute("SELECT movement_id FROM movements")]
+    conn.close()
+
+    runs = Counter(movement_id.rsplit("_", 1)[0] for movement_id in ids)
+    assert len(runs) == 2
+    first, second = runs.values()
+    assert first == second > 0
+
+
+def test_registered_batches_are_written_before_their_movements(tmp_path, network):
+    db_path = tmp_path / "counterfeit.db"
+    _seed_database(db_path, network)
+
+    _sink_run(db_path, network, scenarios=[(1,) + COUNTERFEIT_BATCH_SCENARIO[1:]])
+
+    conn = get_connection_to_db(db_path)
+    [(batch_id,)] = conn.execute(
+        "SELECT batch_id FROM batches WHERE batch_id LIKE '%_CF'"
+    ).fetchall()
+    movements = conn.execute(
+        "SELECT COUNT(*) FROM movements WHERE batch_id = ?", (batch_id,)
+    ).fetchone()[0]
+    conn.close()
+
+    assert movements > 0